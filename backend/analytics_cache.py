@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """
+    Interface for the analytics response cache.
+
+    Keys are (endpoint, start_iso, end_iso, user_id, version) tuples, version being the range's
+    write version the result was computed at. A shared implementation (e.g. Redis) can be
+    installed with server.configure_analytics_cache() as long as it honours invalidate_date():
+    every entry of the tenant whose [start, end] range contains the written day must be dropped.
+    """
+
+    def get(self, key):
+        """Return the cached value or None."""
+        raise NotImplementedError
+
+    def set(self, key, value, generation=None):
+        """
+        Store value. If generation is given and an invalidation happened since it was read
+        from current_generation(), the value may be stale and must not be stored.
+        """
+        raise NotImplementedError
+
+    def current_generation(self):
+        raise NotImplementedError
+
+    def invalidate_date(self, day, user_id=None):
+        """
+        Drop every entry whose range covers day (an ISO date string), only the tenant's if
+        user_id is given; return how many were dropped.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class InProcessCache(CacheBackend):
+    """Thread-safe LRU cache with a per-entry TTL, local to one worker process."""
+
+    def __init__(self, max_entries=256, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def current_generation(self):
+        with self._lock:
+            return self._generation
+
+    def invalidate_date(self, day, user_id=None):
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key for key in self._entries
+                if key[1] <= day <= key[2] and (user_id is None or key[3:4] == (user_id,))
+            ]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidations"] += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        stats["ttl"] = self.ttl
+        return stats
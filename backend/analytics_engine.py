@@ -0,0 +1,140 @@
+"""
+Vectorized analytics for POST /analytics/query, and the per-month category breakdown of
+POST /analytics/monthly (pure functions, so background jobs can run them in worker processes).
+
+The daily expense_rollups rows of a range are loaded once into NumPy arrays and scattered into a
+category x period matrix; every figure in the response (pivot, totals, shares, running totals,
+moving average, top categories) is derived from that matrix without per-row Python loops.
+"""
+import numpy as np
+import pandas as pd
+
+# granularity -> (pandas period frequency, label format)
+GRANULARITIES = {
+    "day": ("D", "%Y-%m-%d"),
+    "week": ("W-SUN", "%Y-%m-%d"),  # ISO weeks, labelled by their Monday
+    "month": ("M", "%Y-%m"),
+    "year": ("Y", "%Y"),
+}
+MAX_PERIODS = 5000
+
+
+def breakdown_from_rows(data):
+    """
+    Convert summary rows like [{"category": "Food", "total": 120.0}, ...] to:
+    { category: {"total": float, "percentage": float}, ... }
+    """
+    total_sum = sum(row.get("total", 0) or 0 for row in data)
+    breakdown = {}
+    for row in data:
+        cat = row.get("category", "Uncategorized")
+        total = float(row.get("total", 0) or 0)
+        percentage = round((total / float(total_sum)) * 100, 2) if total_sum != 0 else 0.0
+        breakdown[cat] = {"total": total, "percentage": percentage}
+    return breakdown
+
+
+def monthly_breakdown(rows, months):
+    """Rows of {"month", "category", "total"} as {month: breakdown}, with every label of months present."""
+    rows_by_month = {label: [] for label in months}
+    for row in rows:
+        rows_by_month[row["month"]].append(row)
+    return {label: breakdown_from_rows(month_rows) for label, month_rows in rows_by_month.items()}
+
+
+def monthly_columnar(rows, months):
+    """
+    The monthly breakdown as columns: categories sorted by name, and one list per category in
+    "totals" and "percentages" (of each month's total) aligned with "months". Category names
+    appear once instead of once per month.
+    """
+    if rows:
+        categories, category_index = np.unique(np.array([row["category"] for row in rows], dtype=object), return_inverse=True)
+        month_index = np.searchsorted(np.array(months), [row["month"] for row in rows])
+    else:
+        categories, category_index, month_index = np.array([], dtype=object), [], []
+    totals = np.zeros((len(categories), len(months)))
+    np.add.at(totals, (category_index, month_index), np.array([float(row["total"]) for row in rows]))
+
+    month_totals = totals.sum(axis=0)
+    percentages = np.divide(totals * 100, month_totals, out=np.zeros_like(totals), where=month_totals != 0)
+    return {
+        "months": list(months),
+        "categories": categories.tolist(),
+        "totals": totals.tolist(),
+        "percentages": _rounded(percentages),
+        "month_totals": month_totals.tolist(),
+    }
+
+
+def period_range(start_date, end_date, granularity):
+    frequency, _ = GRANULARITIES[granularity]
+    return pd.period_range(pd.Timestamp(start_date), pd.Timestamp(end_date), freq=frequency)
+
+
+def period_labels(periods, granularity):
+    _, label_format = GRANULARITIES[granularity]
+    if granularity == "week":
+        return list(periods.start_time.strftime(label_format))
+    return list(periods.strftime(label_format))
+
+
+def category_period_matrix(rows, periods, granularity):
+    """Sum rows of {"day", "category", "total"} into a (categories, matrix) pair, categories sorted by name."""
+    if not rows:
+        return np.array([], dtype=object), np.zeros((0, len(periods)))
+    frequency, _ = GRANULARITIES[granularity]
+    days = pd.DatetimeIndex([row["day"] for row in rows])
+    totals = np.array([row["total"] for row in rows], dtype=float)
+    categories, category_index = np.unique(np.array([row["category"] for row in rows], dtype=object), return_inverse=True)
+    period_index = days.to_period(frequency).asi8 - periods[0].ordinal
+
+    matrix = np.zeros((len(categories), len(periods)))
+    np.add.at(matrix, (category_index, period_index), totals)
+    return categories, matrix
+
+
+def moving_average(values, window):
+    """Trailing mean over up to `window` periods; the first periods average what is available."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+
+def _rounded(values):
+    return np.round(values, 2).tolist()
+
+
+def run_query(rows, start_date, end_date, granularity="month", moving_average_window=3, top_n=5):
+    """
+    Answer an analytics query over daily rollup rows as a columnar payload: one list per
+    measure, aligned with "periods" or "categories". Categories are ordered by total, largest first.
+    """
+    periods = period_range(start_date, end_date, granularity)
+    if len(periods) > MAX_PERIODS:
+        raise ValueError(f"range spans {len(periods)} {granularity} periods, at most {MAX_PERIODS} are allowed")
+
+    categories, matrix = category_period_matrix(rows, periods, granularity)
+    category_totals = matrix.sum(axis=1)
+    order = np.argsort(-category_totals, kind="stable")
+    categories, matrix, category_totals = categories[order], matrix[order], category_totals[order]
+
+    grand_total = category_totals.sum()
+    shares = category_totals / grand_total * 100 if grand_total else np.zeros_like(category_totals)
+    period_totals = matrix.sum(axis=0)
+
+    return {
+        "granularity": granularity,
+        "periods": period_labels(periods, granularity),
+        "categories": categories.tolist(),
+        "values": _rounded(matrix),
+        "category_totals": _rounded(category_totals),
+        "category_percentages": _rounded(shares),
+        "period_totals": _rounded(period_totals),
+        "running_totals": _rounded(np.cumsum(period_totals)),
+        "moving_average": _rounded(moving_average(period_totals, moving_average_window)),
+        "moving_average_window": moving_average_window,
+        "top_categories": categories[:top_n].tolist(),
+        "total": round(float(grand_total), 2),
+    }
@@ -0,0 +1,239 @@
+"""
+Non-blocking counterpart of db_helper for the FastAPI endpoints.
+
+Uses aiomysql with its own pool so a single worker can keep hundreds of queries in flight
+instead of being capped by the threadpool that runs sync endpoints. The SQL is shared with
+db_helper; only the driver differs.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+import aiomysql
+import db_helper
+import replicas
+from db_hooks import AsyncTimedCursor, notify_connection_wait
+from logging_setup import setup_logger
+
+logger = setup_logger('async_db_helper')
+
+POOL_MIN_SIZE = int(os.getenv("EXPENSE_DB_ASYNC_POOL_MIN_SIZE", "1"))
+POOL_SIZE = int(os.getenv("EXPENSE_DB_ASYNC_POOL_SIZE", "20"))
+POOL_RECYCLE = int(os.getenv("EXPENSE_DB_ASYNC_POOL_RECYCLE", "3600"))
+
+_pool = None
+_pool_lock = asyncio.Lock()
+_replicas = None  # (ReplicaSet, [aiomysql pool per replica host])
+_stats = {"checkouts": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+def _create_pool(host):
+    return aiomysql.create_pool(
+        host=host,
+        user=db_helper.DB_CONFIG["user"],
+        password=db_helper.DB_CONFIG["password"],
+        db=db_helper.DB_CONFIG["database"],
+        minsize=POOL_MIN_SIZE,
+        maxsize=POOL_SIZE,
+        pool_recycle=POOL_RECYCLE,
+        autocommit=False,
+    )
+
+async def get_pool():
+    """Return the aiomysql pool of the running event loop, creating it on first use."""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await _create_pool(db_helper.DB_CONFIG["host"])
+    return _pool
+
+async def get_replicas():
+    """Return (ReplicaSet, pools) for the EXPENSE_DB_REPLICAS hosts, creating them on first use."""
+    global _replicas
+    if _replicas is None:
+        async with _pool_lock:
+            if _replicas is None:
+                hosts = replicas.targets("mysql")
+                _replicas = (replicas.ReplicaSet(len(hosts)), [await _create_pool(host) for host in hosts])
+    return _replicas
+
+async def read_pool(user_id=db_helper.DEFAULT_USER_ID):
+    """Async version of db_helper.read_pool."""
+    replica_set, pools = await get_replicas()
+    if not pools:
+        return await get_pool()
+    await _check_replicas(replica_set, pools)
+    index = replica_set.choose(user_id)
+    return await get_pool() if index is None else pools[index]
+
+async def _check_replicas(replica_set, pools):
+    """Async version of db_helper._check_replicas."""
+    for index in replica_set.claim_checks():
+        try:
+            async with get_db_cursor(pool=pools[index]) as cursor:
+                await cursor.execute(replicas.FETCH_BEAT_SQL)
+                rows = await cursor.fetchall()
+            lag = replicas.lag_from_beats(replica_set.primary_beat(), rows[0]["beat_at"] if rows else None, time.time())
+        except Exception:
+            logger.warning("replica %s is unreachable", index, exc_info=True)
+            lag = float("inf")
+        replica_set.record(index, lag)
+    beat_at = replica_set.claim_beat()
+    if beat_at is not None:
+        try:
+            async with get_db_cursor(commit=True) as cursor:
+                await cursor.execute(replicas.BEAT_SQL, (beat_at,))
+        except Exception:
+            logger.warning("could not stamp the replication heartbeat on the primary", exc_info=True)
+
+async def close_pool():
+    global _pool, _replicas
+    pools = ([_pool] if _pool is not None else []) + (_replicas[1] if _replicas is not None else [])
+    for pool in pools:
+        pool.close()
+        await pool.wait_closed()
+    _pool = _replicas = None
+
+def pool_stats():
+    stats = dict(_stats)
+    if _pool is not None:
+        stats.update(size=_pool.size, idle=_pool.freesize, max_size=_pool.maxsize)
+    if _replicas is not None and _replicas[0].count:
+        stats["replication"] = _replicas[0].stats()
+    return stats
+
+@asynccontextmanager
+async def get_db_cursor(commit = False, pool = None):
+    pool = pool or await get_pool()
+    started = time.perf_counter()
+    async with pool.acquire() as connection:
+        waited = time.perf_counter() - started
+        _stats["checkouts"] += 1
+        _stats["wait_seconds_total"] += waited
+        _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+        notify_connection_wait(waited)
+
+        async with connection.cursor(aiomysql.DictCursor) as raw_cursor:
+            cursor = AsyncTimedCursor(raw_cursor)
+            try:
+                yield cursor
+                if commit:
+                    await connection.commit()
+                else:
+                    # end the read transaction so the pooled connection does not keep a stale snapshot
+                    await connection.rollback()
+            except Exception:
+                await connection.rollback()
+                raise
+            finally:
+                cursor.finish()
+
+async def fetch_expenses_for_date(expense_date, user_id=db_helper.DEFAULT_USER_ID):
+    logger.debug("fetch_expenses_for_date: %s, user_id : %s", expense_date, user_id)
+    async with get_db_cursor(pool=await read_pool(user_id)) as cursor:
+        await cursor.execute(db_helper.FETCH_EXPENSES_FOR_DATE_SQL, (user_id, expense_date))
+        return await cursor.fetchall()
+
+async def replace_expenses_for_date(expense_date, rows, user_id=db_helper.DEFAULT_USER_ID):
+    """Async version of db_helper.replace_expenses_for_date: one transaction, one batched insert."""
+    rows = [(user_id, expense_date, amount, category, notes) for amount, category, notes in rows]
+    logger.debug("replace_expenses_for_date called with user_id : %s, date : %s, rows : %s", user_id, expense_date, len(rows))
+    async with get_db_cursor(commit=True) as cursor:
+        await cursor.execute(db_helper.DELETE_EXPENSES_FOR_DATE_SQL, (user_id, expense_date))
+        if rows:
+            await cursor.executemany(db_helper.INSERT_EXPENSE_SQL, rows)
+        await cursor.execute(db_helper.DELETE_ROLLUPS_FOR_DATE_SQL, (user_id, expense_date))
+        await cursor.execute(db_helper.INSERT_ROLLUPS_FOR_DATE_SQL, (user_id, expense_date))
+        await _bump_versions(cursor, [expense_date], user_id)
+
+async def insert_expenses(rows, user_id=db_helper.DEFAULT_USER_ID):
+    """Async version of db_helper.insert_expenses: batched append plus rollup refresh of the touched days."""
+    rows = [(user_id,) + tuple(row) for row in rows]
+    logger.debug("insert_expenses called with user_id : %s, rows : %s", user_id, len(rows))
+    if not rows:
+        return
+    async with get_db_cursor(commit=True) as cursor:
+        # pymysql turns this into multi-row INSERT statements bounded by max_allowed_packet
+        await cursor.executemany(db_helper.INSERT_EXPENSE_SQL, rows)
+        await _refresh_rollups_for_dates(cursor, {row[1] for row in rows}, user_id)
+        await _bump_versions(cursor, {row[1] for row in rows}, user_id)
+
+async def replace_expenses_for_dates(days, user_id=db_helper.DEFAULT_USER_ID):
+    """Async version of db_helper.replace_expenses_for_dates: every day replaced in one transaction."""
+    rows = [(user_id, day, amount, category, notes) for day, day_rows in days.items() for amount, category, notes in day_rows]
+    logger.debug("replace_expenses_for_dates called with user_id : %s, dates : %s, rows : %s", user_id, len(days), len(rows))
+    if not days:
+        return None
+    async with get_db_cursor(commit=True) as cursor:
+        for dates in db_helper.date_groups(days):
+            await cursor.execute(db_helper.dates_placeholders(db_helper.DELETE_EXPENSES_FOR_DATES_SQL, len(dates)), [user_id] + dates)
+        if rows:
+            await cursor.executemany(db_helper.INSERT_EXPENSE_SQL, rows)
+        await _refresh_rollups_for_dates(cursor, days, user_id)
+        return await _bump_versions(cursor, days, user_id)
+
+async def _refresh_rollups_for_dates(cursor, dates, user_id=db_helper.DEFAULT_USER_ID):
+    for group in db_helper.date_groups(dates):
+        await cursor.execute(db_helper.dates_placeholders(db_helper.DELETE_ROLLUPS_FOR_DATES_SQL, len(group)), [user_id] + group)
+        await cursor.execute(db_helper.dates_placeholders(db_helper.INSERT_ROLLUPS_FOR_DATES_SQL, len(group)), [user_id] + group)
+
+async def _bump_versions(cursor, dates, user_id=db_helper.DEFAULT_USER_ID):
+    """Async version of db_helper._bump_versions."""
+    modified_at = time.time()
+    await cursor.execute(db_helper.BUMP_TENANT_VERSION_SQL["mysql"], (user_id, modified_at))
+    await cursor.execute(db_helper.FETCH_TENANT_VERSION_SQL, (user_id,))
+    version = (await cursor.fetchall())[0]["version"]
+    await cursor.executemany(db_helper.SET_DATE_VERSION_SQL, db_helper.version_rows(dates, version, modified_at, user_id))
+    return version
+
+async def fetch_version(start_date, end_date, user_id=db_helper.DEFAULT_USER_ID):
+    async with get_db_cursor(pool=await read_pool(user_id)) as cursor:
+        await cursor.execute(db_helper.FETCH_RANGE_VERSION_SQL, (user_id, str(start_date), str(end_date)))
+        return (await cursor.fetchall())[0]
+
+async def list_expenses(start_date=None, end_date=None, category=None, q=None, after=None, limit=50, user_id=db_helper.DEFAULT_USER_ID):
+    logger.debug("list_expenses called with user_id : %s, start_date : %s, end_date : %s, category : %s, after : %s", user_id, start_date, end_date, category, after)
+    sql, params = db_helper.list_expenses_query("mysql", start_date, end_date, category, q, after, limit + 1, user_id)
+    async with get_db_cursor(pool=await read_pool(user_id)) as cursor:
+        await cursor.execute(sql, params)
+        return db_helper.keyset_page(await cursor.fetchall(), limit)
+
+async def iter_expenses(start_date, end_date, batch_size=db_helper.EXPORT_BATCH_SIZE, user_id=db_helper.DEFAULT_USER_ID):
+    """Async version of db_helper.iter_expenses on an unbuffered server-side cursor (SSDictCursor)."""
+    logger.debug("iter_expenses called with user_id : %s, start_date : %s, end_date : %s", user_id, start_date, end_date)
+    pool = await read_pool(user_id)
+    started = time.perf_counter()
+    async with pool.acquire() as connection:
+        notify_connection_wait(time.perf_counter() - started)
+        cursor = AsyncTimedCursor(await connection.cursor(aiomysql.SSDictCursor))
+        await cursor.execute(db_helper.EXPORT_EXPENSES_SQL, (user_id, start_date, end_date))
+        try:
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        except BaseException:
+            # closing an SSCursor would drain the rest of the result set; drop the connection instead
+            connection.close()
+            raise
+        await cursor.close()
+        await connection.rollback()
+
+async def fetch_expense_summary(start_date, end_date, user_id=db_helper.DEFAULT_USER_ID):
+    logger.debug("fetch_expense_summary called with user_id : %s, start_date : %s, end_date : %s", user_id, start_date, end_date)
+    async with get_db_cursor(pool=await read_pool(user_id)) as cursor:
+        await cursor.execute(db_helper.EXPENSE_SUMMARY_SQL, (user_id, start_date, end_date))
+        return await cursor.fetchall()
+
+async def fetch_monthly_expense_summary(start_date, end_date, user_id=db_helper.DEFAULT_USER_ID):
+    logger.debug("fetch_monthly_expense_summary called with user_id : %s, start_date : %s, end_date : %s", user_id, start_date, end_date)
+    async with get_db_cursor(pool=await read_pool(user_id)) as cursor:
+        await cursor.execute(db_helper.MONTHLY_EXPENSE_SUMMARY_SQL, (db_helper.MONTH_FORMAT, user_id, start_date, end_date))
+        return await cursor.fetchall()
+
+async def fetch_daily_category_totals(start_date, end_date, user_id=db_helper.DEFAULT_USER_ID):
+    logger.debug("fetch_daily_category_totals called with user_id : %s, start_date : %s, end_date : %s", user_id, start_date, end_date)
+    async with get_db_cursor(pool=await read_pool(user_id)) as cursor:
+        await cursor.execute(db_helper.DAILY_CATEGORY_TOTALS_SQL, (user_id, start_date, end_date))
+        return await cursor.fetchall()
@@ -1,73 +1,423 @@
-import mysql.connector
+import os
+import re
+import threading
+import time
 from contextlib import contextmanager
 from logging_setup import setup_logger
+from db_pool import ConnectionPool
+from db_hooks import TimedCursor, notify_connection_wait
+import replicas
 
 logger = setup_logger('db_helper')
 
-@contextmanager
-def get_db_cursor(commit = False):
-    connection = mysql.connector.connect(
-        host = "localhost",
-        user = "root",
-        password = "root",
-        database = "expense_manager"
+# "mysql" (default) or "sqlite" for the embedded single-node engine
+STORAGE_BACKEND = os.getenv("EXPENSE_STORAGE", "mysql")
+SQLITE_PATH = os.getenv("EXPENSE_SQLITE_PATH", "expense_manager.sqlite3")
+DB_CONFIG = {
+    "host": os.getenv("EXPENSE_DB_HOST", "localhost"),
+    "user": os.getenv("EXPENSE_DB_USER", "root"),
+    "password": os.getenv("EXPENSE_DB_PASSWORD", "root"),
+    "database": os.getenv("EXPENSE_DB_NAME", "expense_manager"),
+}
+POOL_SIZE = int(os.getenv("EXPENSE_DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.getenv("EXPENSE_DB_POOL_TIMEOUT", "10"))
+POOL_PING_AFTER = float(os.getenv("EXPENSE_DB_POOL_PING_AFTER", "5"))
+# tenant of callers that do not name one; rows that predate user_id belong to tenant 1
+DEFAULT_USER_ID = int(os.getenv("EXPENSE_DEFAULT_USER_ID", "1"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_replicas = None  # (ReplicaSet, [ConnectionPool per replica])
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connection_factory(),
+                    size=POOL_SIZE,
+                    timeout=POOL_TIMEOUT,
+                    ping_after=POOL_PING_AFTER,
+                )
+    return _pool
+
+def _connection_factory(target=None):
+    """Connections to the primary, or to the replica `target` (a MySQL host or SQLite path)."""
+    if STORAGE_BACKEND == "sqlite":
+        import sqlite_backend
+        return lambda: sqlite_backend.connect(target or SQLITE_PATH)
+    if STORAGE_BACKEND == "mysql":
+        import mysql.connector
+        config = dict(DB_CONFIG, host=target) if target else DB_CONFIG
+        return lambda: mysql.connector.connect(**config)
+    raise ValueError(f"Unknown EXPENSE_STORAGE backend: {STORAGE_BACKEND}")
+
+def _replica_pools(factories):
+    return (
+        replicas.ReplicaSet(len(factories)),
+        [ConnectionPool(factory, size=POOL_SIZE, timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER) for factory in factories],
     )
-    cursor = connection.cursor(dictionary=True)
-    yield cursor
 
-    if commit:
-        connection.commit()
+def configure_replicas(factories):
+    """Route reads to one pool per connection factory (none: every read on the primary)."""
+    global _replicas
+    with _pool_lock:
+        if _replicas is not None:
+            for pool in _replicas[1]:
+                pool.close_all()
+        _replicas = _replica_pools(factories)
+
+def get_replicas():
+    """Return (ReplicaSet, pools) of the replicas configured by replicas.targets(), creating them on first use."""
+    global _replicas
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = _replica_pools([_connection_factory(target) for target in replicas.targets(STORAGE_BACKEND)])
+    return _replicas
+
+def read_pool(user_id=DEFAULT_USER_ID):
+    """The pool for a tenant's read-only queries: its healthy replica, else the primary."""
+    replica_set, pools = get_replicas()
+    if not pools:
+        return get_pool()
+    _check_replicas(replica_set, pools)
+    index = replica_set.choose(user_id)
+    return get_pool() if index is None else pools[index]
+
+def _check_replicas(replica_set, pools):
+    # compare against the previous stamp before writing the next one, so a replica that keeps
+    # up is current even when the last check was long ago
+    for index in replica_set.claim_checks():
+        try:
+            with get_db_cursor(pool=pools[index]) as cursor:
+                cursor.execute(replicas.FETCH_BEAT_SQL)
+                rows = cursor.fetchall()
+            lag = replicas.lag_from_beats(replica_set.primary_beat(), rows[0]["beat_at"] if rows else None, time.time())
+        except Exception:
+            logger.warning("replica %s is unreachable", index, exc_info=True)
+            lag = float("inf")
+        replica_set.record(index, lag)
+    beat_at = replica_set.claim_beat()
+    if beat_at is not None:
+        try:
+            with get_db_cursor(commit=True) as cursor:
+                cursor.execute(replicas.BEAT_SQL, (beat_at,))
+        except Exception:
+            logger.warning("could not stamp the replication heartbeat on the primary", exc_info=True)
+
+def pool_stats():
+    stats = get_pool().stats()
+    replica_set, _ = get_replicas()
+    if replica_set.count:
+        stats["replication"] = replica_set.stats()
+    return stats
+
+@contextmanager
+def get_db_cursor(commit = False, pool = None):
+    started = time.perf_counter()
+    with (pool or get_pool()).connection() as connection:
+        notify_connection_wait(time.perf_counter() - started)
+        cursor = TimedCursor(connection.cursor(dictionary=True))
+        try:
+            yield cursor
+            if commit:
+                connection.commit()
+            else:
+                # end the read transaction so the pooled connection does not keep a stale snapshot
+                connection.rollback()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+# SQL shared with async_db_helper so both data-access paths run identical statements.
+# Every statement is scoped to one tenant (user_id) and led by it, so each query is a range on a
+# (user_id, expense_date, ...) index and its cost does not grow with the other tenants' rows.
+FETCH_EXPENSES_FOR_DATE_SQL = "select * from expenses where user_id = %s and expense_date = %s"
+INSERT_EXPENSE_SQL = "insert into expenses (user_id, expense_date, amount, category, notes) values (%s, %s, %s, %s, %s)"
+DELETE_EXPENSES_FOR_DATE_SQL = "delete from expenses where user_id = %s and expense_date = %s"
+DELETE_ROLLUPS_FOR_DATE_SQL = "delete from expense_rollups where user_id = %s and day = %s"
+INSERT_ROLLUPS_FOR_DATE_SQL = '''insert into expense_rollups (user_id, day, category, total, expense_count)
+        SELECT user_id, expense_date, category, sum(amount), count(*)
+        FROM expenses
+        WHERE user_id = %s and expense_date = %s
+        GROUP BY user_id, expense_date, category'''
+EXPENSE_SUMMARY_SQL = '''SELECT category, sum(total) as total
+            FROM expense_rollups
+            WHERE user_id = %s and day
+            BETWEEN %s and %s
+            GROUP BY category '''
+MONTHLY_EXPENSE_SUMMARY_SQL = '''SELECT DATE_FORMAT(day, %s) as month, category, sum(total) as total
+            FROM expense_rollups
+            WHERE user_id = %s and day
+            BETWEEN %s and %s
+            GROUP BY month, category
+            ORDER BY month, category '''
+MONTH_FORMAT = "%Y-%m"
+DAILY_CATEGORY_TOTALS_SQL = '''SELECT day, category, total
+            FROM expense_rollups
+            WHERE user_id = %s and day
+            BETWEEN %s and %s
+            ORDER BY day, category '''
+# multi-day variants; fill {dates} with dates_placeholders()
+DELETE_EXPENSES_FOR_DATES_SQL = "delete from expenses where user_id = %s and expense_date in ({dates})"
+DELETE_ROLLUPS_FOR_DATES_SQL = "delete from expense_rollups where user_id = %s and day in ({dates})"
+INSERT_ROLLUPS_FOR_DATES_SQL = '''insert into expense_rollups (user_id, day, category, total, expense_count)
+        SELECT user_id, expense_date, category, sum(amount), count(*)
+        FROM expenses
+        WHERE user_id = %s and expense_date in ({dates})
+        GROUP BY user_id, expense_date, category'''
+MAX_DATES_PER_STATEMENT = 500
+EXPORT_EXPENSES_SQL = '''select id, expense_date, amount, category, notes
+        from expenses
+        where user_id = %s and expense_date between %s and %s
+        order by expense_date'''
+EXPORT_BATCH_SIZE = 5000
+# GET /expenses: keyset pages ordered by (expense_date, id); the notes search is dialect specific
+LIST_EXPENSES_SQL = "select id, expense_date, amount, category, notes from expenses"
+SEARCH_CONDITIONS = {
+    "mysql": "match(notes) against (%s in boolean mode)",
+    "sqlite": "id in (select rowid from expenses_fts where expenses_fts match %s)",
+}
+# conditional GET: each write takes the tenant's next version (its 'all' row) and stamps it on
+# every date it touched, so max(version) over a range changes exactly when that range changes.
+# The counter is per tenant so writers of different households never wait on the same row lock.
+BUMP_TENANT_VERSION_SQL = {
+    "mysql": '''insert into expense_versions (user_id, scope, version, modified_at) values (%s, 'all', 1, %s)
+        on duplicate key update version = version + 1, modified_at = values(modified_at)''',
+    "sqlite": '''insert into expense_versions (user_id, scope, version, modified_at) values (%s, 'all', 1, %s)
+        on conflict (user_id, scope) do update set version = version + 1, modified_at = excluded.modified_at''',
+}
+FETCH_TENANT_VERSION_SQL = "select version from expense_versions where user_id = %s and scope = 'all'"
+SET_DATE_VERSION_SQL = "replace into expense_versions (user_id, scope, version, modified_at) values (%s, %s, %s, %s)"
+FETCH_RANGE_VERSION_SQL = '''select coalesce(max(version), 0) as version, max(modified_at) as modified_at
+        from expense_versions
+        where user_id = %s and scope between %s and %s'''
+
+def dates_placeholders(sql, count):
+    return sql.format(dates=", ".join(["%s"] * count))
+
+def date_groups(dates):
+    """Split dates into groups small enough for one IN (...) list."""
+    dates = sorted(set(dates))
+    return [dates[i:i + MAX_DATES_PER_STATEMENT] for i in range(0, len(dates), MAX_DATES_PER_STATEMENT)]
+
+def search_expression(q, dialect):
+    """Turn free text into a query matching notes that contain every word (as a prefix)."""
+    words = re.findall(r"\w+", q)
+    if dialect == "mysql":
+        return " ".join(f"+{word}*" for word in words)
+    return " ".join(f'"{word}"*' for word in words)
+
+def list_expenses_query(dialect, start_date=None, end_date=None, category=None, q=None, after=None, limit=50, user_id=DEFAULT_USER_ID):
+    """
+    Build one keyset page: the tenant's rows after the (expense_date, id) key `after`, in that
+    order. The key condition is a range on the (user_id, expense_date, id) index, so page 10,000
+    reads as few index entries as page 1, unlike OFFSET.
+    """
+    conditions, params = ["user_id = %s"], [user_id]
+    lower_bound = start_date
+    if after is not None and (lower_bound is None or str(after[0]) >= str(lower_bound)):
+        # seek straight to the cursor's day: a single lower bound is what both engines turn
+        # into an index range (given two, SQLite may range on the other one and scan)
+        lower_bound = after[0]
+    if lower_bound is not None:
+        conditions.append("expense_date >= %s")
+        params.append(lower_bound)
+    if end_date is not None:
+        conditions.append("expense_date <= %s")
+        params.append(end_date)
+    if category is not None:
+        conditions.append("category = %s")
+        params.append(category)
+    if q:
+        expression = search_expression(q, dialect)
+        if expression:
+            conditions.append(SEARCH_CONDITIONS[dialect])
+            params.append(expression)
+    if after is not None:
+        # only the rows of the cursor's own day that were on earlier pages are filtered out here
+        conditions.append("(expense_date > %s or id > %s)")
+        params.extend([after[0], after[1]])
+
+    sql = LIST_EXPENSES_SQL + " where " + " and ".join(conditions)
+    sql += " order by expense_date, id limit %s"
+    params.append(limit)
+    return sql, params
 
-    cursor.close()
-    connection.close()
+def keyset_page(rows, limit):
+    """Trim a limit + 1 fetch to (rows, key of the last row if another page follows, else None)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1]["expense_date"], rows[-1]["id"])
 
-def fetch_all_record():
+def list_expenses(start_date=None, end_date=None, category=None, q=None, after=None, limit=50, user_id=DEFAULT_USER_ID):
+    logger.debug("list_expenses called with user_id : %s, start_date : %s, end_date : %s, category : %s, after : %s", user_id, start_date, end_date, category, after)
+    sql, params = list_expenses_query(STORAGE_BACKEND, start_date, end_date, category, q, after, limit + 1, user_id)
+    with get_db_cursor(pool=read_pool(user_id)) as cursor:
+        cursor.execute(sql, params)
+        return keyset_page(cursor.fetchall(), limit)
+
+def fetch_all_record(user_id=DEFAULT_USER_ID):
     with get_db_cursor() as cursor:
-        cursor.execute("select * from expenses")
-        expenses = cursor.fetchall() # give result in tuple format
-        for expense in expenses:
-            print(expense)
+        cursor.execute("select * from expenses where user_id = %s", (user_id,))
+        expenses = cursor.fetchall()
         return expenses
 
-def fetch_expenses_for_date(expense_date):
-    logger.info(f"fetch_expenses_for_date: {expense_date}")
-    with get_db_cursor() as cursor:
-        cursor.execute("select * from expenses where expense_date = %s", (expense_date,))
-        expenses = cursor.fetchall()  # give result in tuple format
-        for expense in expenses:
-            print(expense)
+def iter_expenses(start_date, end_date, batch_size=EXPORT_BATCH_SIZE, user_id=DEFAULT_USER_ID):
+    """
+    Yield lists of at most batch_size expense rows between the two dates, in date order.
+    Rows are streamed from an unbuffered cursor, so the result set is never held in memory;
+    the pooled connection stays checked out until the generator is exhausted or closed.
+    """
+    logger.debug("iter_expenses called with user_id : %s, start_date : %s, end_date : %s", user_id, start_date, end_date)
+    started = time.perf_counter()
+    with read_pool(user_id).connection() as connection:
+        notify_connection_wait(time.perf_counter() - started)
+        cursor = TimedCursor(connection.cursor(dictionary=True))
+        cursor.execute(EXPORT_EXPENSES_SQL, (user_id, start_date, end_date))
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        except BaseException:
+            # abandoned mid-stream: the unread result set leaves the connection unusable, so the
+            # pool discards it instead of draining millions of rows
+            connection.close()
+            raise
+        cursor.close()
+        connection.rollback()
+
+def fetch_expenses_for_date(expense_date, user_id=DEFAULT_USER_ID):
+    logger.debug("fetch_expenses_for_date: %s, user_id : %s", expense_date, user_id)
+    with get_db_cursor(pool=read_pool(user_id)) as cursor:
+        cursor.execute(FETCH_EXPENSES_FOR_DATE_SQL, (user_id, expense_date))
+        expenses = cursor.fetchall()
         return expenses
 
-def insert_expense(expense_date, amount, category, notes):
-    logger.info(f"insert_expense called with date : {expense_date}, amount : {amount}, category : {category}, notes : {notes}")
+def insert_expense(expense_date, amount, category, notes, user_id=DEFAULT_USER_ID):
+    logger.debug("insert_expense called with user_id : %s, date : %s, amount : %s, category : %s", user_id, expense_date, amount, category)
     with get_db_cursor(commit=True) as cursor:
-        cursor.execute(
-            "insert into expenses (expense_date, amount, category, notes) values (%s, %s, %s, %s)",
-            (expense_date, amount, category, notes)
-        )
+        cursor.execute(INSERT_EXPENSE_SQL, (user_id, expense_date, amount, category, notes))
+        _refresh_rollups_for_date(cursor, expense_date, user_id)
+        _bump_versions(cursor, [expense_date], user_id)
 
-def delete_expenses_for_date(expense_date):
-    logger.info(f"fetch_expenses_for_date: {expense_date}")
+def delete_expenses_for_date(expense_date, user_id=DEFAULT_USER_ID):
+    logger.debug("delete_expenses_for_date: %s, user_id : %s", expense_date, user_id)
     with get_db_cursor(commit=True) as cursor:
-        cursor.execute(
-            "delete from expenses where expense_date = %s", (expense_date,)
-        )
-        print("Expenses deleted successfully")
+        cursor.execute(DELETE_EXPENSES_FOR_DATE_SQL, (user_id, expense_date))
+        cursor.execute(DELETE_ROLLUPS_FOR_DATE_SQL, (user_id, expense_date))
+        _bump_versions(cursor, [expense_date], user_id)
 
-def fetch_expense_summary(start_date, end_date):
-    logger.info(f"fetch_expense_summary called with start_date : {start_date}, end_date : {end_date}")
-    with get_db_cursor() as cursor:
-        cursor.execute(
-            '''SELECT category, sum(amount) as total
-            FROM expenses
-            WHERE expense_date
-            BETWEEN %s and %s
-            GROUP BY category ''',
-            (start_date, end_date)
-        )
+def replace_expenses_for_date(expense_date, rows, user_id=DEFAULT_USER_ID):
+    """
+    Replace every expense of expense_date with rows, a sequence of (amount, category, notes)
+    tuples, using one transaction and a single batched insert.
+    """
+    rows = [(user_id, expense_date, amount, category, notes) for amount, category, notes in rows]
+    logger.debug("replace_expenses_for_date called with user_id : %s, date : %s, rows : %s", user_id, expense_date, len(rows))
+    with get_db_cursor(commit=True) as cursor:
+        cursor.execute(DELETE_EXPENSES_FOR_DATE_SQL, (user_id, expense_date))
+        if rows:
+            cursor.executemany(INSERT_EXPENSE_SQL, rows)
+        _refresh_rollups_for_date(cursor, expense_date, user_id)
+        _bump_versions(cursor, [expense_date], user_id)
+
+def insert_expenses(rows, user_id=DEFAULT_USER_ID):
+    """
+    Append rows of (expense_date, amount, category, notes) with one batched insert and refresh
+    the rollups of every day they touch, all in one transaction.
+    """
+    rows = [(user_id,) + tuple(row) for row in rows]
+    logger.debug("insert_expenses called with user_id : %s, rows : %s", user_id, len(rows))
+    if not rows:
+        return
+    with get_db_cursor(commit=True) as cursor:
+        cursor.executemany(INSERT_EXPENSE_SQL, rows)
+        _refresh_rollups_for_dates(cursor, {row[1] for row in rows}, user_id)
+        _bump_versions(cursor, {row[1] for row in rows}, user_id)
+
+def replace_expenses_for_dates(days, user_id=DEFAULT_USER_ID):
+    """
+    Replace several days at once: days maps expense_date to rows of (amount, category, notes).
+    One transaction deletes every day with grouped IN (...) statements, inserts all the rows in
+    one batch and refreshes the rollups the same way, so the cost follows the row count rather
+    than the number of days. Returns the version every day was stamped with.
+    """
+    rows = [(user_id, day, amount, category, notes) for day, day_rows in days.items() for amount, category, notes in day_rows]
+    logger.debug("replace_expenses_for_dates called with user_id : %s, dates : %s, rows : %s", user_id, len(days), len(rows))
+    if not days:
+        return None
+    with get_db_cursor(commit=True) as cursor:
+        for dates in date_groups(days):
+            cursor.execute(dates_placeholders(DELETE_EXPENSES_FOR_DATES_SQL, len(dates)), [user_id] + dates)
+        if rows:
+            cursor.executemany(INSERT_EXPENSE_SQL, rows)
+        _refresh_rollups_for_dates(cursor, days, user_id)
+        return _bump_versions(cursor, days, user_id)
+
+def _refresh_rollups_for_date(cursor, expense_date, user_id=DEFAULT_USER_ID):
+    """Recompute the expense_rollups rows of one day from the raw table, inside the caller's transaction."""
+    cursor.execute(DELETE_ROLLUPS_FOR_DATE_SQL, (user_id, expense_date))
+    cursor.execute(INSERT_ROLLUPS_FOR_DATE_SQL, (user_id, expense_date))
+
+def _refresh_rollups_for_dates(cursor, dates, user_id=DEFAULT_USER_ID):
+    """_refresh_rollups_for_date for many days, MAX_DATES_PER_STATEMENT days per statement."""
+    for group in date_groups(dates):
+        cursor.execute(dates_placeholders(DELETE_ROLLUPS_FOR_DATES_SQL, len(group)), [user_id] + group)
+        cursor.execute(dates_placeholders(INSERT_ROLLUPS_FOR_DATES_SQL, len(group)), [user_id] + group)
+
+def version_rows(dates, version, modified_at, user_id=DEFAULT_USER_ID):
+    return [(user_id, str(day), version, modified_at) for day in sorted(set(dates), key=str)]
+
+def _bump_versions(cursor, dates, user_id=DEFAULT_USER_ID):
+    """Stamp dates with the tenant's next version, inside the caller's transaction; returns the version."""
+    # the 'all' row lock also orders the tenant's concurrent writers, so versions never go backwards
+    modified_at = time.time()
+    cursor.execute(BUMP_TENANT_VERSION_SQL[STORAGE_BACKEND], (user_id, modified_at))
+    cursor.execute(FETCH_TENANT_VERSION_SQL, (user_id,))
+    version = cursor.fetchall()[0]["version"]
+    cursor.executemany(SET_DATE_VERSION_SQL, version_rows(dates, version, modified_at, user_id))
+    return version
+
+def fetch_version(start_date, end_date, user_id=DEFAULT_USER_ID):
+    """Return {"version", "modified_at"} of the tenant's latest write to any date in the range (0 and None if none)."""
+    with get_db_cursor(pool=read_pool(user_id)) as cursor:
+        cursor.execute(FETCH_RANGE_VERSION_SQL, (user_id, str(start_date), str(end_date)))
+        return cursor.fetchall()[0]
+
+def fetch_expense_summary(start_date, end_date, user_id=DEFAULT_USER_ID):
+    logger.debug("fetch_expense_summary called with user_id : %s, start_date : %s, end_date : %s", user_id, start_date, end_date)
+    with get_db_cursor(pool=read_pool(user_id)) as cursor:
+        cursor.execute(EXPENSE_SUMMARY_SQL, (user_id, start_date, end_date))
         data = cursor.fetchall()
         return data
 
+def fetch_monthly_expense_summary(start_date, end_date, user_id=DEFAULT_USER_ID):
+    """
+    Return one row per (month, category) with month formatted as YYYY-MM, in a single query.
+    Month totals are derived from the daily expense_rollups rows.
+    """
+    logger.debug("fetch_monthly_expense_summary called with user_id : %s, start_date : %s, end_date : %s", user_id, start_date, end_date)
+    with get_db_cursor(pool=read_pool(user_id)) as cursor:
+        cursor.execute(MONTHLY_EXPENSE_SUMMARY_SQL, (MONTH_FORMAT, user_id, start_date, end_date))
+        data = cursor.fetchall()
+        return data
+
+def fetch_daily_category_totals(start_date, end_date, user_id=DEFAULT_USER_ID):
+    """Return the expense_rollups rows (day, category, total) of the range; the input of analytics_engine."""
+    logger.debug("fetch_daily_category_totals called with user_id : %s, start_date : %s, end_date : %s", user_id, start_date, end_date)
+    with get_db_cursor(pool=read_pool(user_id)) as cursor:
+        cursor.execute(DAILY_CATEGORY_TOTALS_SQL, (user_id, start_date, end_date))
+        return cursor.fetchall()
+
 if __name__ == "__main__":
     # fetch_all_record()
 
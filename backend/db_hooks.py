@@ -0,0 +1,141 @@
+"""
+Instrumentation hooks for the data-access layer.
+
+db_helper and async_db_helper wrap their cursors in TimedCursor / AsyncTimedCursor and report
+connection checkouts through notify_connection_wait(). Anything that wants to observe database
+activity (metrics, the slow-query log) registers a callable:
+
+    add_query_hook(hook)       hook(statement, seconds, rows) once per statement, when the
+                               next statement starts or the cursor closes; seconds covers the
+                               execute and every fetch of its result
+    add_connection_hook(hook)  hook(seconds) for every pool checkout
+"""
+import re
+import time
+
+_query_hooks = []
+_connection_hooks = []
+
+
+def add_query_hook(hook):
+    _query_hooks.append(hook)
+
+
+def add_connection_hook(hook):
+    _connection_hooks.append(hook)
+
+
+def statement_label(statement):
+    """Collapse whitespace and IN (...) lists so every call of one statement shares a label."""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return re.sub(r"\((?:%s, )+%s\)", "(%s, ...)", statement)
+
+
+def notify_query(statement, seconds, rows):
+    for hook in _query_hooks:
+        hook(statement, seconds, rows)
+
+
+def notify_connection_wait(seconds):
+    for hook in _connection_hooks:
+        hook(seconds)
+
+
+class TimedCursor:
+    """DB-API cursor proxy that reports each statement's time and row count to the query hooks."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._statement = None
+        self._seconds = 0.0
+        self._rows = 0
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._seconds += time.perf_counter() - started
+
+    def _start(self, statement):
+        self.finish()
+        self._statement, self._seconds, self._rows = statement, 0.0, 0
+
+    def finish(self):
+        if self._statement is not None:
+            notify_query(self._statement, self._seconds, self._rows)
+            self._statement = None
+
+    def execute(self, statement, params=()):
+        self._start(statement)
+        return self._timed(self._cursor.execute, statement, params)
+
+    def executemany(self, statement, seq_params):
+        seq_params = list(seq_params)
+        self._start(statement)
+        result = self._timed(self._cursor.executemany, statement, seq_params)
+        self._rows = len(seq_params)
+        return result
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        self._rows += row is not None
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(self._cursor.fetchmany, *([size] if size is not None else []))
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def close(self):
+        self.finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class AsyncTimedCursor(TimedCursor):
+    """TimedCursor for aiomysql, whose execute and fetch methods are awaitable."""
+
+    async def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return await method(*args)
+        finally:
+            self._seconds += time.perf_counter() - started
+
+    async def execute(self, statement, params=()):
+        self._start(statement)
+        return await self._timed(self._cursor.execute, statement, params)
+
+    async def executemany(self, statement, seq_params):
+        seq_params = list(seq_params)
+        self._start(statement)
+        result = await self._timed(self._cursor.executemany, statement, seq_params)
+        self._rows = len(seq_params)
+        return result
+
+    async def fetchone(self):
+        row = await self._timed(self._cursor.fetchone)
+        self._rows += row is not None
+        return row
+
+    async def fetchmany(self, size=None):
+        rows = await self._timed(self._cursor.fetchmany, *([size] if size is not None else []))
+        self._rows += len(rows)
+        return rows
+
+    async def fetchall(self):
+        rows = await self._timed(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    async def close(self):
+        self.finish()
+        await self._cursor.close()
@@ -0,0 +1,141 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of DB-API connections that lives for the whole process.
+
+    At most `size` connections exist at any time (checked out + idle). Idle
+    connections are health-checked before being handed out again if they have
+    been sitting in the pool for longer than `ping_after` seconds.
+    """
+
+    def __init__(self, factory, size=5, timeout=10.0, ping_after=5.0, is_healthy=None):
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._factory = factory
+        self._is_healthy = is_healthy or (lambda connection: connection.is_connected())
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "checkout_seconds_total": 0.0,
+            "checkout_seconds_max": 0.0,
+        }
+
+    def _checkout(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeoutError(f"no connection available after {self.timeout}s (pool size {self.size})")
+        waited = time.perf_counter() - started
+
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = self._factory()
+                with self._lock:
+                    self._stats["created"] += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        return connection
+
+    def _take_idle(self):
+        """Return a healthy idle connection, or None if a new one must be opened."""
+        while True:
+            try:
+                connection, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - returned_at < self.ping_after:
+                return connection
+            try:
+                if self._is_healthy(connection):
+                    return connection
+            except Exception:
+                pass
+            self._discard(connection)
+
+    def _discard(self, connection):
+        with self._lock:
+            self._stats["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _checkin(self, connection, held, broken=False):
+        with self._lock:
+            self._in_use -= 1
+            self._stats["checkout_seconds_total"] += held
+            self._stats["checkout_seconds_max"] = max(self._stats["checkout_seconds_max"], held)
+        if broken:
+            self._discard(connection)
+        else:
+            self._idle.put_nowait((connection, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        connection = self._checkout()
+        checked_out = time.perf_counter()
+        broken = False
+        try:
+            yield connection
+        except BaseException:
+            # also covers GeneratorExit from an abandoned streaming generator
+            broken = not self._safe_is_healthy(connection)
+            raise
+        finally:
+            self._checkin(connection, time.perf_counter() - checked_out, broken)
+
+    def _safe_is_healthy(self, connection):
+        try:
+            return self._is_healthy(connection)
+        except Exception:
+            return False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_use"] = self._in_use
+        stats["size"] = self.size
+        stats["idle"] = self._idle.qsize()
+        return stats
+
+    def close_all(self):
+        """Close every idle connection. Checked-out connections are closed when returned broken."""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                connection.close()
+            except Exception:
+                pass
@@ -0,0 +1,105 @@
+"""
+Encoders for GET /expenses/export.
+
+Each encoder turns an async iterator of row batches into an async iterator of bytes, one chunk
+per batch. StreamingResponse only pulls the next batch from the database once the previous
+chunk was sent, so memory stays constant and slow clients apply backpressure to the query.
+"""
+import csv
+import io
+import json
+
+COLUMNS = ["id", "expense_date", "amount", "category", "notes"]
+
+
+def _plain(row):
+    return {
+        "id": row["id"],
+        "expense_date": row["expense_date"].isoformat(),
+        "amount": float(row["amount"]),
+        "category": row["category"],
+        "notes": row["notes"],
+    }
+
+
+async def ndjson_chunks(batches):
+    async for rows in batches:
+        yield "".join(json.dumps(_plain(row)) + "\n" for row in rows).encode()
+
+
+async def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    async for rows in batches:
+        writer.writerows([_plain(row)[column] for column in COLUMNS] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands whatever was written so far back to the caller."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def parquet_chunks(batches):
+    """Write one Parquet row group per batch; needs the optional pyarrow dependency."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("expense_date", pa.date32()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+        ("notes", pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        async for rows in batches:
+            columns = {column: [row[column] for row in rows] for column in COLUMNS}
+            columns["amount"] = [float(amount) for amount in columns["amount"]]
+            writer.write_table(pa.table(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# format -> (media type, file extension, encoder)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson", ndjson_chunks),
+    "csv": ("text/csv", "csv", csv_chunks),
+    "parquet": ("application/vnd.apache.parquet", "parquet", parquet_chunks),
+}
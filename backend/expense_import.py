@@ -0,0 +1,221 @@
+"""
+Streaming parser for POST /expenses/import.
+
+The request body is read chunk by chunk, split into CSV records or NDJSON lines, validated and
+written in batches of BATCH_SIZE rows. Each batch is awaited before more of the body is read,
+so memory stays flat whatever the size of the upload.
+
+Each batch is its own transaction, so an import is not all-or-nothing: one transaction over a
+whole upload would hold its locks and undo log for as long as the upload takes. If the body or
+a write fails part way, ImportInterrupted carries what was committed, and through which line, so
+the client can resend the rest of the file.
+"""
+import csv
+import json
+import time
+from collections import deque
+from logging_setup import setup_logger
+
+logger = setup_logger('expense_import')
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+CSV_COLUMNS = ("expense_date", "amount", "category", "notes")
+MAX_RECORD_LINES = 100  # physical lines one quoted CSV record may span
+
+
+class ImportInterrupted(Exception):
+    """Reading the body or writing a batch failed; report says what was committed before that."""
+
+    def __init__(self, report):
+        super().__init__(report["error"])
+        self.report = report
+
+
+def _decode(line, encoding):
+    try:
+        return line.rstrip(b"\r").decode(encoding)
+    except UnicodeDecodeError as e:
+        return ValueError(f"line is not valid {encoding}: {e.reason} at byte {e.start}")
+
+
+async def iter_line_batches(chunks, encoding="utf-8"):
+    """
+    Yield lists of text lines (without line endings), one list per chunk of the body. A line
+    that does not decode is yielded as a ValueError, so it is rejected on its own.
+    """
+    pending = b""
+    async for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b"\n")
+        if lines:
+            yield [_decode(line, encoding) for line in lines]
+    if pending:
+        yield [_decode(pending, encoding)]
+
+
+def _opens_quoted_field(line):
+    # only a quote at the start of a field quotes it; elsewhere (6" ruler) it is a literal
+    return line.startswith('"') or ',"' in line
+
+
+def _parse_csv_record(text):
+    try:
+        return next(csv.reader([text]))
+    except csv.Error as e:
+        return ValueError(str(e))
+
+
+async def iter_csv_records(line_batches, max_record_lines=MAX_RECORD_LINES):
+    """
+    Yield lists of (line_number, dict or error) CSV records; the first record is the header.
+    A record with a quoted field may span physical lines until its quotes balance, for at most
+    max_record_lines lines. A record that never closes is rejected at its first line and the
+    lines after it are read again as records of their own, so one stray quote costs one row.
+    """
+    header = None
+    record = []  # (line_number, text) of a quoted record still open
+    pending = deque()
+    records = []  # (line_number, text of a complete record, or the error rejecting that line)
+
+    def abandon(reason):
+        (first_line, _), rest = record[0], record[1:]
+        record.clear()
+        records.append((first_line, ValueError(reason)))
+        pending.extendleft(reversed(rest))
+
+    def take():
+        while pending:
+            number, line = pending.popleft()
+            if isinstance(line, Exception):
+                if record:
+                    pending.appendleft((number, line))
+                    abandon("unterminated quoted field")
+                else:
+                    records.append((number, line))
+                continue
+            if not record and not _opens_quoted_field(line):
+                if line.strip():
+                    records.append((number, line))
+                continue
+            record.append((number, line))
+            text = "\n".join(text for _, text in record)
+            if text.count('"') % 2 == 0:
+                records.append((record[0][0], text))
+                record.clear()
+            elif len(record) >= max_record_lines:
+                abandon(f"quoted field not closed within {max_record_lines} lines")
+
+    def complete():
+        nonlocal header
+        batch = records[:]
+        records.clear()
+        if header is None:
+            for i, (_, text) in enumerate(batch):
+                if isinstance(text, str):
+                    header = [name.strip().lstrip("\ufeff") for name in next(csv.reader([text]))]
+                    del batch[i]
+                    break
+        if all(isinstance(text, str) for _, text in batch):
+            try:
+                # one reader over the whole batch; every text is a complete record
+                rows = csv.reader([text for _, text in batch])
+                return [(number, dict(zip(header, values))) for (number, _), values in zip(batch, rows)]
+            except csv.Error:
+                pass
+        result = []
+        for number, text in batch:
+            values = text if isinstance(text, Exception) else _parse_csv_record(text)
+            result.append((number, values if isinstance(values, Exception) else dict(zip(header, values))))
+        return result
+
+    line_number = 0
+    async for lines in line_batches:
+        for line in lines:
+            line_number += 1
+            if not record and line.__class__ is str and '"' not in line:
+                # fast path: the common unquoted single-line record
+                if line.strip():
+                    records.append((line_number, line))
+                continue
+            pending.append((line_number, line))
+            take()
+        yield complete()
+    while record:
+        abandon("unterminated quoted field")
+        take()
+    if records:
+        yield complete()
+
+
+async def iter_ndjson_records(line_batches):
+    """Yield lists of (line_number, decoded JSON or the decoding error)."""
+    line_number = 0
+    async for lines in line_batches:
+        parsed = []
+        for line in lines:
+            line_number += 1
+            if isinstance(line, Exception):
+                parsed.append((line_number, line))
+                continue
+            if not line.strip():
+                continue
+            try:
+                parsed.append((line_number, json.loads(line)))
+            except ValueError as e:
+                parsed.append((line_number, e))
+        yield parsed
+
+
+async def import_expenses(chunks, fmt, validate, write_batch, batch_size=BATCH_SIZE):
+    """
+    Parse chunks as fmt ("csv" or "ndjson"), validate each record with validate(dict) -> row
+    and pass lists of rows to `await write_batch(rows)`. Returns an import report; raises
+    ImportInterrupted with the report so far if reading or writing fails part way.
+    """
+    line_batches = iter_line_batches(chunks)
+    record_batches = iter_csv_records(line_batches) if fmt == "csv" else iter_ndjson_records(line_batches)
+
+    started = time.perf_counter()
+    imported, rejected, errors = 0, 0, []
+    batch = []
+    # every line up to read_through is in batch or rejected; up to committed_through, written too
+    read_through, committed_through = None, None
+
+    def report():
+        elapsed = time.perf_counter() - started
+        return {
+            "rows_imported": imported,
+            "rows_rejected": rejected,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(imported / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    try:
+        async for records in record_batches:
+            for line_number, record in records:
+                read_through = line_number
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    batch.append(validate(record))
+                except ValueError as e:
+                    # pydantic's ValidationError is a ValueError too
+                    rejected += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({"line": line_number, "error": str(e)})
+            if len(batch) >= batch_size:
+                await write_batch(batch)
+                imported += len(batch)
+                batch, committed_through = [], read_through
+        if batch:
+            await write_batch(batch)
+            imported += len(batch)
+    except Exception as e:
+        logger.warning("import stopped after %s rows (through line %s)", imported, committed_through, exc_info=True)
+        raise ImportInterrupted({
+            **report(),
+            "error": f"import stopped: {e or type(e).__name__}",
+            "last_committed_line": committed_through,
+        }) from e
+    return report()
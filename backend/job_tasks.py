@@ -0,0 +1,51 @@
+"""
+The CPU-heavy steps of background jobs, run in the job process pool.
+
+Everything here is a top-level function of plain, picklable arguments returning the result bytes,
+and imports nothing from the API (no storage, no logging queue), so a pool process stays cheap to
+start.
+"""
+import io
+import json
+
+import analytics_engine
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def excel_available():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def monthly_analytics_json(rows, months):
+    """The body POST /analytics/monthly would return for the same rows."""
+    return json.dumps(analytics_engine.monthly_breakdown(rows, months)).encode()
+
+
+def monthly_excel(rows, months, percent=False):
+    """
+    The monthly breakdown as an .xlsx workbook: categories as rows, months ("Aug 2024") as
+    columns, totals or each month's percentages rounded to cents. Needs the optional openpyxl.
+    """
+    import pandas as pd
+
+    breakdown = analytics_engine.monthly_breakdown(rows, months)
+    df = (
+        pd.DataFrame.from_dict(breakdown, orient="columns")
+        .map(lambda cell: cell["total"] if isinstance(cell, dict) else 0.0)
+        .astype(float)
+        .sort_index()
+    )
+    df.columns = pd.to_datetime(df.columns, format="%Y-%m").strftime("%b %Y")
+    df.index.name = "Category"
+    if percent:
+        df = df.div(df.sum(axis=0), axis=1).fillna(0) * 100
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.round(2).to_excel(writer, sheet_name="Monthly Breakdown")
+    return output.getvalue()
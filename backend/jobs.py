@@ -0,0 +1,333 @@
+"""
+Background jobs for work too slow to finish inside one request: monthly analytics over long
+ranges and the Excel export of a monthly breakdown.
+
+POST /jobs answers at once with a job id. The client polls GET /jobs/{id} for status and progress
+and downloads GET /jobs/{id}/result once the job is done. CPU-heavy steps run in a bounded process
+pool (see job_tasks), so they block neither the event loop nor a worker thread. Results are files
+named after the job's parameters, including the data version of its range, so repeating a job
+whose range has not been written to since is answered from disk without running it again.
+
+Polling doubles as the client's heartbeat: a job nobody has polled for ABANDON_SECONDS has lost
+its client (tab closed, page left) and is cancelled. Cancelling stops the job between steps; a
+step already running in the pool finishes and its result is dropped.
+
+    EXPENSE_JOB_WORKERS          processes in the pool (2)
+    EXPENSE_JOB_MAX_ACTIVE       jobs queued or running at once before submissions get 429 (32)
+    EXPENSE_JOB_CACHE_DIR        directory of result files (<tmp>/expense_jobs)
+    EXPENSE_JOB_CACHE_MAX_FILES  result files kept, least recently used deleted first (256)
+    EXPENSE_JOB_ABANDON_SECONDS  cancel a job after this long without a poll (30)
+    EXPENSE_JOB_KEEP_SECONDS     finished jobs stay pollable this long (600)
+
+A job runs in the API worker that accepted it, but its state is a file under
+EXPENSE_JOB_CACHE_DIR/jobs, so behind several workers (gunicorn) any of them answers a poll:
+
+    <id>.json    status and progress, rewritten by the owning worker as they change and at
+                 every watchdog tick while the job is active
+    <id>.poll    touched by a worker that is polled for a job it does not own (the heartbeat)
+    <id>.cancel  left by a worker asked to cancel a job it does not own; the owner cancels the job
+                 at its next watchdog tick
+
+An active job whose state file has not been rewritten for ABANDON_SECONDS lost its worker and is
+reported failed. State files are removed KEEP_SECONDS after their last write.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from logging_setup import setup_logger
+
+logger = setup_logger('jobs')
+
+WORKERS = int(os.getenv("EXPENSE_JOB_WORKERS", "2"))
+MAX_ACTIVE = int(os.getenv("EXPENSE_JOB_MAX_ACTIVE", "32"))
+CACHE_DIR = os.getenv("EXPENSE_JOB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "expense_jobs"))
+CACHE_MAX_FILES = int(os.getenv("EXPENSE_JOB_CACHE_MAX_FILES", "256"))
+ABANDON_SECONDS = float(os.getenv("EXPENSE_JOB_ABANDON_SECONDS", "30"))
+KEEP_SECONDS = float(os.getenv("EXPENSE_JOB_KEEP_SECONDS", "600"))
+
+ACTIVE = ("queued", "running")
+
+
+class TooManyJobsError(Exception):
+    """MAX_ACTIVE jobs are already queued or running."""
+
+
+def cache_key(**params):
+    """Stable name for a job's result: a hash of its parameters."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Job:
+    def __init__(self, kind, user_id, key, path, media_type, state_dir=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.key = key
+        self.path = path
+        self.media_type = media_type
+        self.status = "queued"
+        self.progress = 0.0
+        self.error = None
+        self.cached = False
+        # wall-clock times: they are compared with the mtimes of other workers' files
+        self.polled_at = time.time()
+        self.finished_at = None
+        self.task = None
+        self.state_dir = state_dir  # None for a copy loaded from another worker's state file
+
+    def state_file(self, suffix):
+        return os.path.join(self.state_dir, f"{self.id}.{suffix}")
+
+    def save(self):
+        """Write the job's state for the other workers; a no-op on a loaded copy."""
+        if self.state_dir is None:
+            return
+        state = {name: getattr(self, name) for name in ("id", "kind", "user_id", "key", "path", "media_type")}
+        state.update(self.describe())
+        partial = self.state_file(f"{uuid.uuid4().hex}.part")
+        with open(partial, "w") as f:
+            json.dump(state, f)
+        os.replace(partial, self.state_file("json"))
+
+    @classmethod
+    def load(cls, state):
+        job = cls(state["kind"], state["user_id"], state["key"], state["path"], state["media_type"])
+        job.id = state["id"]
+        job.status = state["status"]
+        job.progress = state["progress"]
+        job.cached = state["cached"]
+        job.error = state["error"]
+        return job
+
+    def report(self, progress):
+        """Called by the job as it goes: the fraction done, 0 to 1."""
+        self.progress = min(max(progress, 0.0), 1.0)
+        self.save()
+
+    def start(self):
+        self.status = "running"
+        self.save()
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        if status == "done":
+            self.progress = 1.0
+        self.save()
+
+    def describe(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "cached": self.cached,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Jobs of one API process, their process pool and their result files; polls for jobs of
+    the other processes sharing cache_dir are answered from their state files."""
+
+    def __init__(self, cache_dir=CACHE_DIR, workers=WORKERS, max_active=MAX_ACTIVE,
+                 cache_max_files=CACHE_MAX_FILES, abandon_seconds=ABANDON_SECONDS, keep_seconds=KEEP_SECONDS):
+        self.cache_dir = cache_dir
+        self.state_dir = os.path.join(cache_dir, "jobs")
+        self.workers = workers
+        self.max_active = max_active
+        self.cache_max_files = cache_max_files
+        self.abandon_seconds = abandon_seconds
+        self.keep_seconds = keep_seconds
+        self._jobs = {}  # id -> Job of this process
+        self._executor = None
+        self._watchdog = None
+        self._counts = {"submitted": 0, "cache_hits": 0, "done": 0, "failed": 0, "cancelled": 0}
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn, not fork: the API process has threads (pools, log listener) whose locks a fork would copy
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def run_cpu(self, function, *args):
+        """Run function(*args) in the process pool; it must be a picklable top-level function."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), function, *args)
+
+    def _active(self):
+        return [job for job in self._jobs.values() if job.status in ACTIVE]
+
+    def submit(self, kind, user_id, key, suffix, media_type, run):
+        """
+        Start run(job), a coroutine function returning the result bytes, unless the result file
+        for key already exists or the same job is already under way (that job is returned then).
+        """
+        self._reap()
+        path = os.path.join(self.cache_dir, f"{key}.{suffix}")
+        for job in self._active():
+            if job.key == key and job.user_id == user_id:
+                job.polled_at = time.time()
+                return job
+
+        os.makedirs(self.state_dir, exist_ok=True)
+        job = Job(kind, user_id, key, path, media_type, self.state_dir)
+        if os.path.exists(path):
+            os.utime(path)  # keeps the file at the young end of the LRU
+            job.cached = True
+            job.finish("done")
+            self._counts["cache_hits"] += 1
+        else:
+            if len(self._active()) >= self.max_active:
+                raise TooManyJobsError(f"{self.max_active} jobs are already queued or running")
+            job.save()
+            job.task = asyncio.create_task(self._run(job, run))
+            self._counts["submitted"] += 1
+            if self._watchdog is None or self._watchdog.done():
+                self._watchdog = asyncio.create_task(self._watch())
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id, user_id):
+        """The tenant's job, of this process or another one, or None; counts as a poll."""
+        self._reap()
+        job = self._jobs.get(job_id) or self._load(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        job.polled_at = time.time()
+        return job
+
+    def _load(self, job_id):
+        """Another worker's job from its state file; touches the job's heartbeat file."""
+        if not job_id.isalnum():
+            return None
+        path = os.path.join(self.state_dir, f"{job_id}.json")
+        try:
+            with open(path) as f:
+                job = Job.load(json.load(f))
+            saved_at = os.path.getmtime(path)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        if job.status in ACTIVE and time.time() - saved_at > self.abandon_seconds:
+            # the owner rewrites the state of its active jobs at every watchdog tick
+            job.status, job.error = "failed", "The worker running the job exited"
+        else:
+            heartbeat = os.path.join(self.state_dir, f"{job_id}.poll")
+            with open(heartbeat, "a"):
+                pass
+            os.utime(heartbeat)
+        return job
+
+    def cancel(self, job):
+        if job.status not in ACTIVE:
+            return
+        if job.id not in self._jobs:
+            # another worker's job: ask the owner, and answer this request as cancelled already
+            with open(os.path.join(self.state_dir, f"{job.id}.cancel"), "w"):
+                pass
+            job.status = "cancelled"
+            return
+        job.finish("cancelled")
+        self._counts["cancelled"] += 1
+        if job.task is not None:
+            job.task.cancel()
+
+    async def _run(self, job, run):
+        job.start()
+        try:
+            data = await run(job)
+            await asyncio.to_thread(self._store, job.path, data)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            logger.warning("job %s (%s) failed", job.id, job.kind, exc_info=True)
+            if job.status in ACTIVE:
+                job.finish("failed", getattr(e, "detail", None) or str(e))
+                self._counts["failed"] += 1
+            return
+        if job.status in ACTIVE:
+            job.finish("done")
+            self._counts["done"] += 1
+
+    def _store(self, path, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+
+        files = [
+            os.path.join(self.cache_dir, entry.name) for entry in os.scandir(self.cache_dir)
+            if entry.is_file() and not entry.name.endswith(".part")
+        ]
+        if len(files) > self.cache_max_files:
+            files.sort(key=os.path.getmtime)
+            for stale in files[:len(files) - self.cache_max_files]:
+                _remove(stale)
+
+        # state files of every worker's long-finished jobs (and of workers that died)
+        expired = time.time() - self.keep_seconds
+        for entry in os.scandir(self.state_dir):
+            if entry.stat().st_mtime < expired:
+                _remove(entry.path)
+
+    def _last_poll(self, job):
+        try:
+            return max(job.polled_at, os.path.getmtime(job.state_file("poll")))
+        except FileNotFoundError:
+            return job.polled_at
+
+    def _reap(self):
+        """Cancel jobs nobody polls any more and forget finished ones after keep_seconds."""
+        now = time.time()
+        for job in list(self._jobs.values()):
+            if job.status in ACTIVE and os.path.exists(job.state_file("cancel")):
+                logger.info("cancelling job %s (%s): cancelled through another worker", job.id, job.kind)
+                self.cancel(job)
+            elif job.status in ACTIVE and now - self._last_poll(job) > self.abandon_seconds:
+                logger.info("cancelling job %s (%s): not polled for %.0fs", job.id, job.kind, now - self._last_poll(job))
+                self.cancel(job)
+            elif job.finished_at is not None and now - job.finished_at > self.keep_seconds:
+                del self._jobs[job.id]
+                for suffix in ("json", "poll", "cancel"):
+                    _remove(job.state_file(suffix))
+
+    async def _watch(self):
+        # only while jobs run: with nothing active there is nothing to abandon
+        while self._active():
+            await asyncio.sleep(min(self.abandon_seconds / 4, 5.0))
+            self._reap()
+            for job in self._active():
+                job.save()  # tells the other workers this one is still alive
+
+    def stats(self):
+        active = self._active()
+        return {
+            "queued": sum(job.status == "queued" for job in active),
+            "running": sum(job.status == "running" for job in active),
+            **self._counts,
+        }
+
+    async def close(self):
+        for job in self._active():
+            self.cancel(job)
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,12 +1,121 @@
+"""
+Logging for the backend modules.
+
+setup_logger() gives a logger whose records go through a queue: the calling thread only enqueues
+the record (message and %-style args unformatted), and one background QueueListener per log file
+formats it as a JSON line and writes it to a size-rotated file. DEBUG records are sampled at
+EXPENSE_LOG_DEBUG_SAMPLE_RATE before they are enqueued.
+
+    EXPENSE_LOG_LEVEL              default INFO
+    EXPENSE_LOG_MAX_BYTES          rotate after this many bytes (default 10 MiB)
+    EXPENSE_LOG_BACKUPS            rotated files to keep (default 5)
+    EXPENSE_LOG_DEBUG_SAMPLE_RATE  fraction of DEBUG records kept (default 0.1)
+    EXPENSE_LOG_FILE               write every logger here instead: "-" for stderr, or a path
+                                   where {pid} is replaced by the process id
+
+RotatingFileHandler is only safe with one process per file. With several worker processes, log
+to stderr and let the process manager collect it (deploy/gunicorn.conf.py does), or give each
+worker its own file with {pid}; such files are not rotated, leave that to logrotate or the platform.
+"""
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_LEVEL = os.getenv("EXPENSE_LOG_LEVEL", "INFO").upper()
+MAX_BYTES = int(os.getenv("EXPENSE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+BACKUP_COUNT = int(os.getenv("EXPENSE_LOG_BACKUPS", "5"))
+DEBUG_SAMPLE_RATE = float(os.getenv("EXPENSE_LOG_DEBUG_SAMPLE_RATE", "0.1"))
+LOG_FILE = os.getenv("EXPENSE_LOG_FILE")
+
+_handlers = {}  # log file -> QueueHandler shared by every logger writing to it
+_listeners = []
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Keep every record above DEBUG and a random `rate` fraction of DEBUG records."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
 
-def setup_logger(name, log_file = 'server.log', level=logging.DEBUG):
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler.prepare() formats the message on the calling thread. The backend only logs
+    immutable arguments (dates, numbers, strings), so the record is passed on as is and
+    getMessage() runs on the listener thread instead.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _queue_handler(log_file):
+    with _lock:
+        handler = _handlers.get(log_file)
+        if handler is None:
+            if log_file == "-":
+                file_handler = logging.StreamHandler(sys.stderr)
+            elif "{pid}" in log_file:
+                file_handler = logging.FileHandler(log_file.format(pid=os.getpid()), encoding="utf-8")
+            else:
+                file_handler = RotatingFileHandler(log_file, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8")
+            file_handler.setFormatter(JsonFormatter())
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+            listener.start()
+            _listeners.append(listener)
+
+            handler = DeferredQueueHandler(log_queue)
+            handler.addFilter(DebugSampler(DEBUG_SAMPLE_RATE))
+            _handlers[log_file] = handler
+        return handler
+
+
+def setup_logger(name, log_file = 'server.log', level=None):
     logger = logging.getLogger(name)
+    logger.setLevel(level or LOG_LEVEL)
+
+    handler = _queue_handler(LOG_FILE or log_file)
+    # calling setup_logger again (module reloads, the same name from two modules) must not
+    # attach a second handler and duplicate every line
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    return logger
 
-    logger.setLevel(level)
-    file_handler = logging.FileHandler(log_file)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
-    return logger
\ No newline at end of file
+@atexit.register
+def stop_listeners():
+    """Flush queued records to disk; runs at interpreter exit."""
+    while _listeners:
+        _listeners.pop().stop()
@@ -0,0 +1,184 @@
+"""
+Process-local metrics in the Prometheus text exposition format, served by GET /metrics.
+
+    http_requests_total{method,route,status}          counter
+    http_request_duration_seconds{method,route}       histogram
+    http_requests_in_flight                           gauge
+    db_query_duration_seconds{statement}              histogram, fed by db_hooks
+    db_query_rows_total{statement}                    counter
+    db_connection_wait_seconds                        histogram of pool checkout waits
+
+Queries slower than EXPENSE_SLOW_QUERY_SECONDS (unset = off) are also logged with their row count.
+Each worker process keeps its own numbers; Prometheus sums them across scrape targets.
+"""
+import os
+import threading
+import time
+import db_hooks
+from logging_setup import setup_logger
+
+logger = setup_logger('slow_queries')
+
+SLOW_QUERY_SECONDS = float(os.getenv("EXPENSE_SLOW_QUERY_SECONDS", "0")) or None
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # per-bucket (non-cumulative) counts, then sum and count
+                series = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in self._values.items())
+        lines = self._header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+http_requests = Counter("http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds", "HTTP request latency, until the last body chunk was sent.", ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+db_duration = Histogram("db_query_duration_seconds", "Time spent executing a statement and fetching its rows.", ("statement",))
+db_rows = Counter("db_query_rows_total", "Rows returned (or written, for executemany) by a statement.", ("statement",))
+db_wait = Histogram("db_connection_wait_seconds", "Time spent waiting for a pooled database connection.")
+
+REGISTRY = [http_requests, http_duration, http_in_flight, db_duration, db_rows, db_wait]
+
+
+def observe_query(statement, seconds, rows):
+    label = db_hooks.statement_label(statement)
+    db_duration.observe(seconds, label)
+    db_rows.inc(label, amount=rows)
+    if SLOW_QUERY_SECONDS is not None and seconds >= SLOW_QUERY_SECONDS:
+        logger.warning("slow query: %.3fs, %s rows: %s", seconds, rows, label)
+
+
+db_hooks.add_query_hook(observe_query)
+db_hooks.add_connection_hook(db_wait.observe)
+
+
+def gauge_lines(prefix, stats):
+    """Render a stats() dict (pool, cache) as untyped gauges; non-numeric entries are skipped."""
+    lines = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {_format_value(value)}")
+    return lines
+
+
+def render(extra_lines=()):
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight requests per route template
+    (/expenses/{expense_date}, not the concrete path, to keep label cardinality bounded).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+        http_in_flight.inc()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.dec()
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            http_duration.observe(time.perf_counter() - started, scope["method"], route)
+            http_requests.inc(scope["method"], route, str(status))
@@ -0,0 +1,202 @@
+"""
+Versioned schema migrations for the expense_manager database.
+
+Apply every pending migration with:
+
+    python backend/migrations.py
+
+Each migration runs once and is recorded in the schema_migrations table. MySQL commits DDL
+implicitly, so a migration is not atomic: keep each one to statements that are safe to re-run
+by hand if the runner dies half way through.
+"""
+import argparse
+import db_helper
+from logging_setup import setup_logger
+
+logger = setup_logger('migrations')
+
+LOCK_NAME = "expense_manager_migrations"
+LOCK_TIMEOUT = 30
+
+# (version, description, statements) in the order they must be applied
+MIGRATIONS = [
+    (
+        1,
+        "store amount as DECIMAL so sums are exact",
+        [
+            "ALTER TABLE expenses MODIFY amount DECIMAL(12, 2) NOT NULL",
+        ],
+    ),
+    (
+        2,
+        "covering index for date lookups and range summaries",
+        [
+            # expense_date is the leftmost column, so this also serves `WHERE expense_date = %s`
+            "CREATE INDEX idx_expenses_date_category_amount ON expenses (expense_date, category, amount)",
+        ],
+    ),
+    (
+        3,
+        "daily per-category rollups maintained by db_helper write paths",
+        [
+            '''CREATE TABLE IF NOT EXISTS expense_rollups (
+                day date NOT NULL,
+                category varchar(255) NOT NULL,
+                total DECIMAL(14, 2) NOT NULL,
+                expense_count int NOT NULL,
+                PRIMARY KEY (day, category)
+            )''',
+            "DELETE FROM expense_rollups",
+            '''INSERT INTO expense_rollups (day, category, total, expense_count)
+            SELECT expense_date, category, sum(amount), count(*)
+            FROM expenses
+            GROUP BY expense_date, category''',
+        ],
+    ),
+    (
+        4,
+        "per-date write versions for ETags ('all' holds the global counter)",
+        [
+            '''CREATE TABLE IF NOT EXISTS expense_versions (
+                scope varchar(10) NOT NULL,
+                version bigint NOT NULL,
+                modified_at double NOT NULL,
+                PRIMARY KEY (scope)
+            )''',
+            "INSERT IGNORE INTO expense_versions (scope, version, modified_at) VALUES ('all', 0, 0)",
+        ],
+    ),
+    (
+        5,
+        "keyset pagination indexes and full-text search on notes",
+        [
+            # InnoDB appends the primary key to secondary indexes; naming id makes the order explicit
+            "CREATE INDEX idx_expenses_date_id ON expenses (expense_date, id)",
+            "CREATE INDEX idx_expenses_category_date_id ON expenses (category, expense_date, id)",
+            "CREATE FULLTEXT INDEX idx_expenses_notes ON expenses (notes)",
+        ],
+    ),
+    (
+        6,
+        "user_id tenant column on every table, indexes led by (user_id, expense_date)",
+        [
+            # existing rows belong to tenant 1, which is also db_helper's default tenant
+            "ALTER TABLE expenses ADD COLUMN user_id int NOT NULL DEFAULT 1 AFTER id",
+            "CREATE INDEX idx_expenses_user_date_category_amount ON expenses (user_id, expense_date, category, amount)",
+            "CREATE INDEX idx_expenses_user_date_id ON expenses (user_id, expense_date, id)",
+            "CREATE INDEX idx_expenses_user_category_date_id ON expenses (user_id, category, expense_date, id)",
+            "DROP INDEX idx_expenses_date_category_amount ON expenses",
+            "DROP INDEX idx_expenses_date_id ON expenses",
+            "DROP INDEX idx_expenses_category_date_id ON expenses",
+            '''ALTER TABLE expense_rollups
+                ADD COLUMN user_id int NOT NULL DEFAULT 1 FIRST,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (user_id, day, category)''',
+            # the 'all' row becomes tenant 1's write counter; other tenants get theirs on first write
+            '''ALTER TABLE expense_versions
+                ADD COLUMN user_id int NOT NULL DEFAULT 1 FIRST,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (user_id, scope)''',
+        ],
+    ),
+    (
+        7,
+        "heartbeat row for measuring read-replica lag",
+        [
+            '''CREATE TABLE IF NOT EXISTS replication_heartbeat (
+                id int NOT NULL,
+                beat_at double NOT NULL,
+                PRIMARY KEY (id)
+            )''',
+        ],
+    ),
+    (
+        8,
+        "version every date that has rows but no expense_versions row",
+        [
+            # rows from before migration 4 (or loaded around db_helper) have no version, so their
+            # ranges kept ETag "0" and answered 304 whatever happened to them; stamping them with
+            # a fresh version per tenant changes those ETags once. Safe to re-run.
+            "INSERT IGNORE INTO expense_versions (user_id, scope, version, modified_at) SELECT DISTINCT user_id, 'all', 0, 0 FROM expenses",
+            "UPDATE expense_versions SET version = version + 1, modified_at = UNIX_TIMESTAMP() WHERE scope = 'all'",
+            '''INSERT IGNORE INTO expense_versions (user_id, scope, version, modified_at)
+            SELECT d.user_id, d.day, v.version, v.modified_at
+            FROM (SELECT DISTINCT user_id, CAST(expense_date AS CHAR) AS day FROM expenses) d
+            JOIN expense_versions v ON v.scope = 'all' AND v.user_id = d.user_id''',
+        ],
+    ),
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute(
+        '''CREATE TABLE IF NOT EXISTS schema_migrations (
+            version int NOT NULL,
+            description varchar(255) NOT NULL,
+            applied_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (version)
+        )'''
+    )
+
+
+def applied_versions():
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row["version"] for row in cursor.fetchall()}
+
+
+def pending_migrations():
+    if db_helper.STORAGE_BACKEND == "sqlite":
+        return []
+    applied = applied_versions()
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def migrate(target=None):
+    """Apply pending migrations up to and including target (all of them by default)."""
+    if db_helper.STORAGE_BACKEND == "sqlite":
+        # the embedded engine has no history to replay: it is always created at the latest version
+        import sqlite_backend
+        with db_helper.get_pool().connection() as connection:
+            sqlite_backend.create_schema(connection)
+        return
+
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        # serialise concurrent runners, e.g. several workers starting at once
+        cursor.execute("SELECT GET_LOCK(%s, %s) as acquired", (LOCK_NAME, LOCK_TIMEOUT))
+        if not cursor.fetchall()[0]["acquired"]:
+            raise RuntimeError("Could not acquire the schema migration lock")
+        try:
+            _ensure_migrations_table(cursor)
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row["version"] for row in cursor.fetchall()}
+
+            for version, description, statements in MIGRATIONS:
+                if version in applied or (target is not None and version > target):
+                    continue
+                logger.info("applying migration %s: %s", version, description)
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                cursor.execute("COMMIT")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply expense_manager schema migrations")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    parser.add_argument("--status", action="store_true", help="only list pending migrations")
+    args = parser.parse_args()
+
+    if args.status:
+        for version, description, _ in pending_migrations():
+            print(f"pending {version}: {description}")
+    else:
+        migrate(args.target)
+        print("Migrations applied successfully")
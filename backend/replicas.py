@@ -0,0 +1,120 @@
+"""
+Read-replica routing shared by db_helper and async_db_helper.
+
+Writes always go to the primary. Read-only queries go to a replica when one is configured and
+healthy, chosen per tenant (user_id modulo the healthy replicas) so every read of one request
+lands on the same copy and its ETag version never runs ahead of its rows.
+
+    EXPENSE_DB_REPLICAS             comma-separated MySQL hosts (same user, password and database)
+    EXPENSE_SQLITE_REPLICA_PATHS    comma-separated SQLite files, for local stand-ins
+    EXPENSE_REPLICA_MAX_LAG         seconds a replica may trail the primary and still serve reads (2)
+    EXPENSE_REPLICA_CHECK_INTERVAL  seconds between lag checks of one replica (1)
+    EXPENSE_REPLICA_STICKY_SECONDS  seconds a client's reads stay on the primary after it wrote (5)
+
+Lag is measured with the replication_heartbeat row: every check interval the replicas' copy of
+the row is compared with the stamp last written to the primary, then the primary is stamped
+again. A replica that has the last stamp is current; one that does not trails by the age of the
+stamp it has. A replica that cannot be reached counts as infinitely behind until its next check.
+
+Read-your-writes: the API pins a client's reads to the primary for STICKY_SECONDS after one of
+its writes (a cookie, so it holds across workers) by setting read_from_primary for the request.
+"""
+import contextvars
+import os
+import threading
+import time
+
+REPLICA_HOSTS = [host.strip() for host in os.getenv("EXPENSE_DB_REPLICAS", "").split(",") if host.strip()]
+SQLITE_REPLICA_PATHS = [path.strip() for path in os.getenv("EXPENSE_SQLITE_REPLICA_PATHS", "").split(",") if path.strip()]
+MAX_LAG = float(os.getenv("EXPENSE_REPLICA_MAX_LAG", "2"))
+CHECK_INTERVAL = float(os.getenv("EXPENSE_REPLICA_CHECK_INTERVAL", "1"))
+STICKY_SECONDS = float(os.getenv("EXPENSE_REPLICA_STICKY_SECONDS", "5"))
+
+BEAT_SQL = "replace into replication_heartbeat (id, beat_at) values (1, %s)"
+FETCH_BEAT_SQL = "select beat_at from replication_heartbeat where id = 1"
+
+# set per request by the API; copied into asyncio.to_thread workers with the rest of the context
+read_from_primary = contextvars.ContextVar("read_from_primary", default=False)
+
+
+def targets(backend):
+    """The configured replicas of a storage backend: MySQL hosts or SQLite paths."""
+    return SQLITE_REPLICA_PATHS if backend == "sqlite" else REPLICA_HOSTS
+
+
+def lag_from_beats(primary_beat, replica_beat, now):
+    """Seconds the replica trails; unknown (nothing stamped yet by this process) counts as infinite."""
+    if primary_beat is None or replica_beat is None:
+        return float("inf")
+    if replica_beat >= primary_beat:
+        return 0.0
+    return now - replica_beat
+
+
+class ReplicaSet:
+    """
+    Lag bookkeeping and routing for `count` replicas. The probing itself (sync or async) is
+    done by the caller: claim_checks() hands out the replicas due for a check, record() stores
+    the result.
+    """
+
+    def __init__(self, count, max_lag=MAX_LAG, check_interval=CHECK_INTERVAL):
+        self.count = count
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lags = [float("inf")] * count
+        self._checked_at = [float("-inf")] * count
+        self._beat = None  # (time.time() of the last primary stamp, monotonic time it was written)
+        self._reads = [0] * count
+        self._primary_reads = 0
+        self._lock = threading.Lock()
+
+    def claim_beat(self):
+        """Return the timestamp to stamp on the primary if a new heartbeat is due, else None."""
+        with self._lock:
+            now = time.monotonic()
+            if self._beat is not None and now - self._beat[1] < self.check_interval:
+                return None
+            beat_at = time.time()
+            self._beat = (beat_at, now)
+            return beat_at
+
+    def primary_beat(self):
+        with self._lock:
+            return self._beat[0] if self._beat is not None else None
+
+    def claim_checks(self):
+        """Replicas whose lag is due for a check; claiming them keeps concurrent readers from probing too."""
+        with self._lock:
+            now = time.monotonic()
+            due = [i for i in range(self.count) if now - self._checked_at[i] >= self.check_interval]
+            for i in due:
+                self._checked_at[i] = now
+            return due
+
+    def record(self, index, lag):
+        with self._lock:
+            self._lags[index] = lag
+
+    def choose(self, user_id):
+        """Index of the replica for the tenant's reads, or None for the primary."""
+        with self._lock:
+            healthy = [] if read_from_primary.get() else [i for i in range(self.count) if self._lags[i] <= self.max_lag]
+            if not healthy:
+                self._primary_reads += 1
+                return None
+            index = healthy[user_id % len(healthy)]
+            self._reads[index] += 1
+            return index
+
+    def stats(self):
+        with self._lock:
+            reachable = [lag for lag in self._lags if lag != float("inf")]
+            return {
+                "replicas": self.count,
+                "healthy": sum(lag <= self.max_lag for lag in self._lags),
+                "unreachable": self.count - len(reachable),
+                "max_lag_seconds": max(reachable, default=0.0),
+                "reads_on_primary": self._primary_reads,
+                "reads_on_replicas": sum(self._reads),
+            }
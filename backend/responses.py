@@ -0,0 +1,124 @@
+"""
+Fast JSON responses and response compression.
+
+With EXPENSE_FAST_JSON=1 the API returns FastJSONResponse bodies directly for payloads it built
+itself from database rows and analytics results. That skips FastAPI's revalidation of the rows
+against the response model and its jsonable_encoder walk over every nested value, and encodes
+once with orjson (an optional dependency; compact stdlib json is used without it).
+
+CompressionMiddleware compresses bodies of at least EXPENSE_COMPRESS_MIN_BYTES (1000): brotli
+when the client accepts it and the optional brotli package is installed, gzip otherwise. The
+ETag of a compressed body is made weak (W/"..."): the identity, gzip and br bodies differ byte
+for byte, so they must not share one strong validator. If-None-Match compares weakly.
+
+BrotliResponder plugs into Starlette's IdentityResponder.apply_compression, which is not public
+API; requirments.txt pins starlette for that reason.
+
+    EXPENSE_GZIP_LEVEL       gzip compression level (6)
+    EXPENSE_BROTLI_QUALITY   brotli quality (5; 11 is much slower for a few percent less)
+"""
+import json
+import os
+from decimal import Decimal
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("EXPENSE_COMPRESS_MIN_BYTES", "1000"))
+GZIP_LEVEL = int(os.getenv("EXPENSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("EXPENSE_BROTLI_QUALITY", "5"))
+
+
+def _default(value):
+    # MySQL DECIMAL columns
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Compact JSON bytes of content: dicts, lists, str/int/float/bool/None, dates and Decimals."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """A JSONResponse for trusted content: encoded as is, without validation."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def accepted_encodings(header):
+    """Content codings the Accept-Encoding header allows (q=0 excluded), lower-case."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding, params = coding.strip().lower(), params.strip()
+        q = params.removeprefix("q=") if params.startswith("q=") else "1"
+        try:
+            if coding and float(q) > 0:
+                accepted.add(coding)
+        except ValueError:
+            pass
+    return accepted
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size, quality=BROTLI_QUALITY):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body, *, more_body):
+        compressed = self.compressor.process(body)
+        # flush every streamed chunk so the client gets it now, not when the stream ends
+        return compressed + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+class CompressionMiddleware:
+    """Starlette's GZipMiddleware with brotli preferred when both sides support it."""
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif "gzip" in accepted:
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+
+        async def send_with_weak_etag(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                etag = headers.get("etag")
+                if etag and "content-encoding" in headers and not etag.startswith("W/"):
+                    headers["etag"] = f"W/{etag}"
+            await send(message)
+
+        await responder(scope, receive, send_with_weak_etag)
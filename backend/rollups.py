@@ -0,0 +1,68 @@
+"""
+Maintenance commands for the expense_rollups table.
+
+    python backend/rollups.py check      # list (day, category) rows that disagree with expenses
+    python backend/rollups.py rebuild    # recompute every rollup row from expenses
+
+db_helper keeps the rollups up to date on every write; these commands are for backfills and
+for repairing rows after data was changed outside of db_helper.
+"""
+import argparse
+import db_helper
+from logging_setup import setup_logger
+
+logger = setup_logger('rollups')
+
+RAW_DAILY_TOTALS = '''SELECT user_id, expense_date as day, category, sum(amount) as total, count(*) as expense_count
+    FROM expenses
+    GROUP BY user_id, expense_date, category'''
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from the raw expenses table in one transaction."""
+    logger.info("rebuild_rollups called")
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("DELETE FROM expense_rollups")
+        cursor.execute(
+            f'''INSERT INTO expense_rollups (user_id, day, category, total, expense_count)
+            SELECT user_id, day, category, total, expense_count FROM ({RAW_DAILY_TOTALS}) raw'''
+        )
+        return cursor.rowcount
+
+
+def find_rollup_mismatches():
+    """
+    Compare expense_rollups with the raw table and return the rows that disagree as
+    dicts of user_id, day, category, raw_total, rollup_total, raw_count and rollup_count.
+    """
+    logger.info("find_rollup_mismatches called")
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(
+            f'''SELECT raw.user_id as user_id, raw.day as day, raw.category as category, raw.total as raw_total, r.total as rollup_total,
+                raw.expense_count as raw_count, r.expense_count as rollup_count
+            FROM ({RAW_DAILY_TOTALS}) raw
+            LEFT JOIN expense_rollups r ON r.user_id = raw.user_id AND r.day = raw.day AND r.category = raw.category
+            WHERE r.day IS NULL OR r.total <> raw.total OR r.expense_count <> raw.expense_count
+            UNION ALL
+            SELECT r.user_id, r.day, r.category, NULL, r.total, NULL, r.expense_count
+            FROM expense_rollups r
+            LEFT JOIN ({RAW_DAILY_TOTALS}) raw ON r.user_id = raw.user_id AND r.day = raw.day AND r.category = raw.category
+            WHERE raw.day IS NULL
+            ORDER BY user_id, day, category'''
+        )
+        return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the expense_rollups table")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        print(f"Rebuilt {rebuild_rollups()} rollup rows")
+    else:
+        mismatches = find_rollup_mismatches()
+        for row in mismatches:
+            print(row)
+        print(f"{len(mismatches)} mismatched rollup rows")
+        raise SystemExit(1 if mismatches else 0)
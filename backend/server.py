@@ -5,15 +5,67 @@
 # from typing import List, Dict, Any
 # from pydantic import BaseModel
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any, Tuple
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional, Tuple
 from datetime import date, datetime
+from email.utils import formatdate
+import base64
 import calendar
-import db_helper
+import functools
+import hashlib
+import math
+import os
+import time
+import analytics_engine
+import expense_export
+import expense_import
+import job_tasks
+import jobs
+import metrics
+import replicas
+import responses
+from analytics_cache import CacheBackend, InProcessCache
+from analytics_engine import breakdown_from_rows
+from storage import DEFAULT_USER_ID, ExpenseStorage, get_storage
 
-app = FastAPI()
+# MySQL through aiomysql by default, or the embedded SQLite engine with EXPENSE_STORAGE=sqlite
+storage: ExpenseStorage = get_storage()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await job_manager.close()
+    await storage.close()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+# outermost, so the request metrics time the handler and not the compression
+app.add_middleware(responses.CompressionMiddleware)
+
+# opt-in: encode our own payloads with orjson, skipping response-model revalidation (see responses)
+FAST_JSON = os.getenv("EXPENSE_FAST_JSON", "0") == "1"
+
+# analytics responses are pure functions of the range and the table contents; writes invalidate them
+analytics_cache: CacheBackend = InProcessCache(
+    max_entries=int(os.getenv("EXPENSE_ANALYTICS_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("EXPENSE_ANALYTICS_CACHE_TTL", "60")),
+)
+
+# long monthly analytics and Excel exports run as background jobs, polled through /jobs
+job_manager = jobs.JobManager()
+
+# X-User-Id is not authenticated here: it is only honoured from these client hosts (the
+# authenticating reverse proxy, the Streamlit server), which must set it for a user they identified
+TRUSTED_PROXIES = frozenset(host.strip() for host in os.getenv("EXPENSE_TRUSTED_PROXIES", "").split(",") if host.strip())
+
+def configure_analytics_cache(backend: CacheBackend):
+    """Swap the in-process analytics cache for another backend, e.g. one shared by all workers."""
+    global analytics_cache
+    analytics_cache = backend
 
 class Expense(BaseModel):
     # expense_date: date
@@ -21,21 +73,72 @@ class Expense(BaseModel):
     category : str
     notes : str
 
+class ImportedExpense(Expense):
+    expense_date : date
+
 class Daterange(BaseModel):
     start_date : date
     end_date : date
 
-# # --------- helpers ----------
-# def _to_iso(d: date) -> str:
-#     """Return YYYY-MM-DD string for date object."""
-#     return d.isoformat()
-#
+class AnalyticsQuery(Daterange):
+    granularity : Literal["day", "week", "month", "year"] = "month"
+    moving_average_window : int = Field(3, ge=1, le=366)
+    top_n : int = Field(5, ge=1)
+
+class JobRequest(Daterange):
+    kind : Literal["analytics_monthly", "monthly_excel"]
+    percent : bool = False  # monthly_excel: each month's percentages instead of totals
+
+# --------- helpers ----------
+# set on write responses when reads go to replicas: until then the client reads from the primary
+STICKY_COOKIE = "expense_read_primary_until"
+
+async def tenant(request: Request, x_user_id: Optional[int] = Header(None, ge=1)) -> int:
+    """
+    The household every query of the request is scoped to, from the X-User-Id header of a trusted
+    proxy (EXPENSE_DEFAULT_USER_ID without one). Also pins the request's reads to the primary
+    while the client's stickiness cookie is live.
+    """
+    if x_user_id is None:
+        x_user_id = DEFAULT_USER_ID
+    elif request.client is None or request.client.host not in TRUSTED_PROXIES:
+        raise HTTPException(status_code=403, detail="X-User-Id is only accepted from EXPENSE_TRUSTED_PROXIES")
+    try:
+        pinned = float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        pinned = False
+    # async, so the value is set in the request's own context, not a threadpool copy of it
+    replicas.read_from_primary.set(pinned)
+    return x_user_id
+
+def stick_to_primary(response: Response):
+    """Read-your-writes: keep this client's reads on the primary until replicas have caught up."""
+    if storage.has_replicas():
+        until = time.time() + replicas.STICKY_SECONDS
+        response.set_cookie(STICKY_COOKIE, f"{until:.3f}", max_age=math.ceil(replicas.STICKY_SECONDS), httponly=True)
+
+def _to_iso(d: date) -> str:
+    """Return YYYY-MM-DD string for date object."""
+    return d.isoformat()
+
 def month_start_end(year: int, month: int) -> Tuple[date, date]:
     first = date(year, month, 1)
     last_day = calendar.monthrange(year, month)[1]
     last = date(year, month, last_day)
     return first, last
 
+def whole_months(date_range: Daterange) -> Tuple[date, date]:
+    """The range widened to the first day of its first month and the last day of its last month."""
+    start = month_start_end(date_range.start_date.year, date_range.start_date.month)[0]
+    end = month_start_end(date_range.end_date.year, date_range.end_date.month)[1]
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must be before or equal to end_date")
+    return start, end
+
+def month_labels(start_date: date, end_date: date) -> List[str]:
+    """YYYY-MM labels of every month from start_date's to end_date's, inclusive."""
+    return [f"{y:04d}-{m:02d}" for y, m in months_between(start_date, end_date)]
+
 def months_between(start_date: date, end_date: date):
     """Yield (year, month) tuples from start_date's month up to end_date's month inclusive."""
     y, m = start_date.year, start_date.month
@@ -45,47 +148,236 @@ def months_between(start_date: date, end_date: date):
         if m > 12:
             m = 1
             y += 1
-#
-def build_breakdown_from_db(start: date, end: date) -> Dict[str, Dict[str, Any]]:
+
+async def build_breakdown_from_db(start: date, end: date, user_id: int = DEFAULT_USER_ID) -> Dict[str, Dict[str, Any]]:
     """
-    Query db_helper.fetch_expense_summary and convert result to:
+    Query storage.fetch_expense_summary and convert result to:
     { category: {"total": float, "percentage": float}, ... }
     """
-    # Ensure we send ISO strings to db_helper
-    data = db_helper.fetch_expense_summary(_to_iso(start), _to_iso(end))
+    # Ensure we send ISO strings to the storage backend
+    data = await storage.fetch_expense_summary(_to_iso(start), _to_iso(end), user_id=user_id)
     if data is None:
         return None
+    return breakdown_from_rows(data)
 
-    # data is expected as list of dicts like [{"category": "Food", "total": 120.0}, ...]
-    total_sum = sum(row.get("total", 0) for row in data)
-    breakdown: Dict[str, Dict[str, Any]] = {}
-    for row in data:
-        cat = row.get("category", "Uncategorized")
-        total = float(row.get("total", 0) or 0)
-        percentage = round((total / total_sum) * 100, 2) if total_sum != 0 else 0.0
-        breakdown[cat] = {"total": total, "percentage": percentage}
-    return breakdown
+async def cached_analytics(endpoint: str, start: date, end: date, compute, user_id: int = DEFAULT_USER_ID, version: int = 0):
+    # keyed by the range's version too: a result computed on a lagging replica (or cached by a
+    # worker that never saw the write) is never served under the newer version's ETag
+    key = (endpoint, _to_iso(start), _to_iso(end), user_id, version)
+    value = analytics_cache.get(key)
+    if value is None:
+        # a write that lands while compute() runs bumps the generation and the result is not stored
+        generation = analytics_cache.current_generation()
+        value = await compute()
+        analytics_cache.set(key, value, generation)
+    return value
+
+def validators(etag: str, version: Dict[str, Any]) -> Dict[str, str]:
+    # versions are per tenant, so shared caches must not hand one household's body to another
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "X-User-Id"}
+    if version["modified_at"]:
+        headers["Last-Modified"] = formatdate(version["modified_at"], usegmt=True)
+    return headers
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True if If-None-Match lists etag (weak comparison) or is *."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+async def conditional_analytics(request: Request, response: Response, endpoint: str, start: date, end: date, compute, user_id: int):
+    """
+    cached_analytics behind an ETag made of the range's write version and the query, so a client
+    that already has the current result gets a 304 after one indexed lookup.
+
+    The analytics endpoints are POSTs only because their range travels in a JSON body: they are
+    read-only queries, and the frontend revalidates them with If-None-Match like a GET. The 304
+    for a POST is deliberate and limited to these endpoints; writes never answer 304.
+    """
+    version = await storage.fetch_version(_to_iso(start), _to_iso(end), user_id=user_id)
+    query = hashlib.sha1(f"{user_id}:{endpoint}:{_to_iso(start)}:{_to_iso(end)}".encode()).hexdigest()[:16]
+    headers = validators(f'"{version["version"]}-{query}"', version)
+    if not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    value = await cached_analytics(endpoint, start, end, compute, user_id, version["version"])
+    if FAST_JSON:
+        return responses.FastJSONResponse(value, headers=headers)
+    response.headers.update(headers)
+    return value
+
+def encode_cursor(key: Tuple[date, int]) -> str:
+    """Opaque page cursor for the (expense_date, id) keyset key."""
+    return base64.urlsafe_b64encode(f"{_to_iso(key[0])}|{key[1]}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        day, expense_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split("|")
+        return date.fromisoformat(day), int(expense_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/expenses")
+async def list_expenses(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    user_id: int = Depends(tenant),
+):
+    """
+    List expenses ordered by date, filtered by range, category and a full-text search on notes.
+    Pass next_cursor back as ?after= for the next page; it is null on the last page.
+    """
+    rows, next_key = await storage.list_expenses(
+        start, end, category, q, decode_cursor(after) if after else None, limit, user_id=user_id
+    )
+    page = {
+        "items": [
+            {
+                "id": row["id"],
+                "expense_date": _to_iso(row["expense_date"]),
+                "amount": float(row["amount"]),
+                "category": row["category"],
+                "notes": row["notes"],
+            }
+            for row in rows
+        ],
+        "next_cursor": encode_cursor(next_key) if next_key else None,
+    }
+    return responses.FastJSONResponse(page) if FAST_JSON else page
+
+MAX_BATCH_DATES = int(os.getenv("EXPENSE_BATCH_MAX_DATES", "1000"))
+
+# registered before /expenses/{expense_date} so "batch" is not parsed as a date
+@app.post("/expenses/batch")
+async def replace_expenses_batch(days: Dict[date, List[Expense]], response: Response, user_id: int = Depends(tenant)):
+    """
+    Replace several days in one request: {"2024-08-01": [expense, ...], ...}. Every day is
+    replaced in a single transaction (all or none), an empty list clears the day. Returns per
+    date the rows written and the ETag GET /expenses/{date} now has.
+    """
+    if not days:
+        raise HTTPException(status_code=400, detail="Send at least one date")
+    if len(days) > MAX_BATCH_DATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_DATES} dates per batch")
+
+    version = await storage.replace_expenses_for_dates(
+        {day: [(expense.amount, expense.category, expense.notes) for expense in expenses] for day, expenses in days.items()},
+        user_id=user_id,
+    )
+    for day in days:
+        analytics_cache.invalidate_date(_to_iso(day), user_id)
+    stick_to_primary(response)
+    return {
+        "rows_written": sum(len(expenses) for expenses in days.values()),
+        "results": {
+            _to_iso(day): {"rows": len(expenses), "etag": f'"{version}"'}
+            for day, expenses in sorted(days.items())
+        },
+    }
+
+IMPORT_CONTENT_TYPES = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/ndjson": "ndjson"}
+
+# registered before /expenses/{expense_date} so "import" is not parsed as a date
+@app.post("/expenses/import")
+async def import_expenses(request: Request, response: Response, format: Optional[str] = None, user_id: int = Depends(tenant)):
+    """
+    Stream a CSV (header: expense_date,amount,category,notes) or NDJSON body into the expenses
+    table in batches, appending to existing days. The format comes from ?format=csv|ndjson or
+    the Content-Type header. Returns rows imported/rejected, per-row errors and rows per second.
+
+    Not all-or-nothing: each batch commits on its own. If the body or a write fails part way, the
+    500 response's detail is the report so far plus "error" and "last_committed_line", the last
+    input line whose batch was committed (null if none was); resend the lines after it.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    fmt = format or IMPORT_CONTENT_TYPES.get(content_type)
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson")
+
+    def validate(record):
+        expense = ImportedExpense.model_validate(record)
+        return (expense.expense_date, expense.amount, expense.category, expense.notes)
+
+    write_batch = functools.partial(storage.insert_expenses, user_id=user_id)
+    interrupted = None
+    try:
+        report = await expense_import.import_expenses(request.stream(), fmt, validate, write_batch)
+    except expense_import.ImportInterrupted as e:
+        report, interrupted = e.report, e
+    if report["rows_imported"]:
+        # an import can touch any number of days, so drop every cached range
+        analytics_cache.clear()
+        stick_to_primary(response)
+    if interrupted is not None:
+        raise HTTPException(status_code=500, detail=report, headers=dict(response.headers)) from interrupted
+    return report
+
+@app.get("/expenses/export")
+async def export_expenses(start: date, end: date, format: str = "ndjson", user_id: int = Depends(tenant)):
+    """
+    Stream every expense between start and end (inclusive) as NDJSON, CSV or Parquet
+    (one row group per batch). Rows come from a server-side cursor and are never buffered whole.
+    """
+    if format not in expense_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(expense_export.FORMATS)}")
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before or equal to end")
+    if format == "parquet" and not expense_export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export needs the optional pyarrow package")
+
+    media_type, extension, encode = expense_export.FORMATS[format]
+    return StreamingResponse(
+        encode(storage.iter_expenses(start, end, user_id=user_id)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="expenses_{_to_iso(start)}_{_to_iso(end)}.{extension}"'},
+    )
 
 @app.get("/expenses/{expense_date}", response_model = List[Expense])
 
-def get_expenses(expense_date: date):
-    expenses = db_helper.fetch_expenses_for_date(expense_date)
+async def get_expenses(expense_date: date, request: Request, response: Response, user_id: int = Depends(tenant)):
+    # the version is read before the rows, so a concurrent write can only make the ETag older
+    version = await storage.fetch_version(_to_iso(expense_date), _to_iso(expense_date), user_id=user_id)
+    headers = validators(f'"{version["version"]}"', version)
+    if not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    expenses = await storage.fetch_expenses_for_date(expense_date, user_id=user_id)
     if expenses is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve expense from the database")
+    if FAST_JSON:
+        # our own rows: project them onto Expense instead of validating each one against it
+        body = [{"amount": float(row["amount"]), "category": row["category"], "notes": row["notes"]} for row in expenses]
+        return responses.FastJSONResponse(body, headers=headers)
+    response.headers.update(headers)
     return expenses
 
 @app.post("/expenses/{expense_date}")
 
-def add_or_update_expense(expense_date: date, expenses: List[Expense]):
-    db_helper.delete_expenses_for_date(expense_date)
-    for expense in expenses:
-        db_helper.insert_expense(expense_date, expense.amount, expense.category, expense.notes)
+async def add_or_update_expense(expense_date: date, expenses: List[Expense], response: Response, user_id: int = Depends(tenant)):
+    await storage.replace_expenses_for_date(
+        expense_date,
+        [(expense.amount, expense.category, expense.notes) for expense in expenses],
+        user_id=user_id,
+    )
+    analytics_cache.invalidate_date(_to_iso(expense_date), user_id)
+    stick_to_primary(response)
     return {"message" : "Expenses updated successfully"}
 
 @app.post("/analytics/")
 
-def get_analytics(date_range: Daterange):
-    data = db_helper.fetch_expense_summary(date_range.start_date, date_range.end_date)
+async def get_analytics(date_range: Daterange, request: Request, response: Response, user_id: int = Depends(tenant)):
+    return await conditional_analytics(
+        request, response, "analytics", date_range.start_date, date_range.end_date,
+        lambda: compute_analytics(date_range.start_date, date_range.end_date, user_id), user_id
+    )
+
+async def compute_analytics(start_date: date, end_date: date, user_id: int = DEFAULT_USER_ID):
+    data = await storage.fetch_expense_summary(start_date, end_date, user_id=user_id)
     if data is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve expense summary from the database")
     total = 0
@@ -102,7 +394,13 @@ def get_analytics(date_range: Daterange):
     return breakdown
 
 @app.post("/analytics/monthly")
-def get_analytics_monthly(date_range: Daterange):
+async def get_analytics_monthly(
+    date_range: Daterange,
+    request: Request,
+    response: Response,
+    shape: Literal["nested", "columnar"] = "nested",
+    user_id: int = Depends(tenant),
+):
     """
     Return month-by-month breakdown between start_date and end_date inclusive.
 
@@ -115,25 +413,32 @@ def get_analytics_monthly(date_range: Daterange):
       "2024-09": { ... },
       ...
     }
-    """
-    start = date(date_range.start_date.year, date_range.start_date.month, 1)
-    last_day = calendar.monthrange(date_range.end_date.year, date_range.end_date.month)[1]
-    end = date(date_range.end_date.year, date_range.end_date.month, last_day)
 
-    if start > end:
-        raise HTTPException(status_code=400, detail="start_date must be before or equal to end_date")
+    With ?shape=columnar every category name is sent once (see analytics_engine.monthly_columnar):
+    {"months": [...], "categories": [...], "totals": [[per month] per category],
+     "percentages": [[...]], "month_totals": [...]}
+    """
+    start, end = whole_months(date_range)
+    if shape == "columnar":
+        async def compute():
+            data = await storage.fetch_monthly_expense_summary(_to_iso(start), _to_iso(end), user_id=user_id)
+            if data is None:
+                raise HTTPException(status_code=500, detail="Failed to fetch monthly analytics")
+            return analytics_engine.monthly_columnar(data, month_labels(start, end))
+        return await conditional_analytics(request, response, "analytics_monthly_columnar", start, end, compute, user_id)
 
-    response: Dict[str, Dict[str, Any]] = {}
+    return await conditional_analytics(
+        request, response, "analytics_monthly", start, end, lambda: compute_analytics_monthly(start, end, user_id), user_id
+    )
 
+async def compute_analytics_monthly(start: date, end: date, user_id: int = DEFAULT_USER_ID) -> Dict[str, Dict[str, Any]]:
     try:
-        for y, m in months_between(start, end):
-            s, e = month_start_end(y, m)
-            label = s.strftime("%Y-%m")
-            breakdown = build_breakdown_from_db(s, e)
-            # If DB call failed, return error (you can decide to skip instead)
-            if breakdown is None:
-                raise HTTPException(status_code=500, detail=f"Failed to fetch analytics for {label}")
-            response[label] = breakdown
+        # one grouped query for the whole range instead of one query per month
+        data = await storage.fetch_monthly_expense_summary(_to_iso(start), _to_iso(end), user_id=user_id)
+        if data is None:
+            raise HTTPException(status_code=500, detail="Failed to fetch monthly analytics")
+
+        response = analytics_engine.monthly_breakdown(data, month_labels(start, end))
     except HTTPException:
         raise
     except Exception as e:
@@ -141,7 +446,130 @@ def get_analytics_monthly(date_range: Daterange):
 
     return response
 
+@app.post("/analytics/query")
+async def query_analytics(query: AnalyticsQuery, request: Request, response: Response, user_id: int = Depends(tenant)):
+    """
+    Category x period pivot at day/week/month/year granularity with running totals, a trailing
+    moving average and the top_n categories, as a columnar payload (see analytics_engine.run_query).
+    """
+    if query.start_date > query.end_date:
+        raise HTTPException(status_code=400, detail="start_date must be before or equal to end_date")
+
+    async def compute():
+        rows = await storage.fetch_daily_category_totals(_to_iso(query.start_date), _to_iso(query.end_date), user_id=user_id)
+        try:
+            return analytics_engine.run_query(
+                rows, query.start_date, query.end_date,
+                query.granularity, query.moving_average_window, query.top_n
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    endpoint = f"analytics_query:{query.granularity}:{query.moving_average_window}:{query.top_n}"
+    return await conditional_analytics(request, response, endpoint, query.start_date, query.end_date, compute, user_id)
+
+# months of summary rows a job fetches per query, so it can report progress between them
+JOB_FETCH_MONTHS = 12
+
+async def fetch_monthly_rows(job: jobs.Job, start: date, end: date, user_id: int) -> List[Dict[str, Any]]:
+    months = list(months_between(start, end))
+    rows: List[Dict[str, Any]] = []
+    for i in range(0, len(months), JOB_FETCH_MONTHS):
+        chunk = months[i:i + JOB_FETCH_MONTHS]
+        data = await storage.fetch_monthly_expense_summary(
+            _to_iso(month_start_end(*chunk[0])[0]), _to_iso(month_start_end(*chunk[-1])[1]), user_id=user_id
+        )
+        if data is None:
+            raise HTTPException(status_code=500, detail="Failed to fetch monthly analytics")
+        # plain floats: the rows are pickled to the job pool
+        rows.extend({"month": row["month"], "category": row["category"], "total": float(row["total"])} for row in data)
+        job.report(0.8 * (i + len(chunk)) / len(months))
+    return rows
+
+def describe_job(job: jobs.Job) -> Dict[str, Any]:
+    body = job.describe()
+    body["result_url"] = f"/jobs/{job.id}/result" if job.status == "done" else None
+    return body
+
+@app.post("/jobs", status_code=202)
+async def submit_job(job_request: JobRequest, response: Response, user_id: int = Depends(tenant)):
+    """
+    Start a background job and return its id at once; poll GET /jobs/{job_id} until it is done.
+    analytics_monthly produces the body of POST /analytics/monthly, monthly_excel the same
+    breakdown as an .xlsx workbook. A job whose range was not written to since the last identical
+    job is answered from the result cache.
+    """
+    start, end = whole_months(job_request)
+    if job_request.kind == "monthly_excel" and not job_tasks.excel_available():
+        raise HTTPException(status_code=501, detail="Excel export needs the optional openpyxl package")
+
+    version = await storage.fetch_version(_to_iso(start), _to_iso(end), user_id=user_id)
+    key = jobs.cache_key(
+        kind=job_request.kind, start=_to_iso(start), end=_to_iso(end), percent=job_request.percent,
+        user_id=user_id, version=version["version"],
+    )
+    months = month_labels(start, end)
+
+    async def run(job: jobs.Job) -> bytes:
+        rows = await fetch_monthly_rows(job, start, end, user_id)
+        if job_request.kind == "analytics_monthly":
+            return await job_manager.run_cpu(job_tasks.monthly_analytics_json, rows, months)
+        return await job_manager.run_cpu(job_tasks.monthly_excel, rows, months, job_request.percent)
+
+    suffix, media_type = ("json", "application/json") if job_request.kind == "analytics_monthly" else ("xlsx", job_tasks.XLSX_MEDIA_TYPE)
+    try:
+        job = job_manager.submit(job_request.kind, user_id, key, suffix, media_type, run)
+    except jobs.TooManyJobsError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return describe_job(job)
+
+def tenant_job(job_id: str, user_id: int) -> jobs.Job:
+    job = job_manager.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, user_id: int = Depends(tenant)):
+    """Status (queued, running, done, failed, cancelled) and progress; polling keeps the job alive."""
+    return describe_job(tenant_job(job_id, user_id))
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, user_id: int = Depends(tenant)):
+    job = tenant_job(job_id, user_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not os.path.exists(job.path):
+        raise HTTPException(status_code=410, detail="The result was evicted from the cache; submit the job again")
+    filename = f"{job.kind}.{job.path.rsplit('.', 1)[1]}"
+    return FileResponse(job.path, media_type=job.media_type, filename=filename)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, user_id: int = Depends(tenant)):
+    job = tenant_job(job_id, user_id)
+    job_manager.cancel(job)
+    return describe_job(job)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text format: request and query metrics plus the pool and analytics cache stats."""
+    pool_stats = storage.pool_stats()
+    extra = metrics.gauge_lines("expense_db_pool", pool_stats)
+    extra += metrics.gauge_lines("expense_db_replication", pool_stats.get("replication", {}))
+    extra += metrics.gauge_lines("expense_analytics_cache", analytics_cache.stats())
+    extra += metrics.gauge_lines("expense_jobs", job_manager.stats())
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/pool")
+async def get_pool_metrics():
+    return storage.pool_stats()
+
+@app.get("/metrics/cache")
+async def get_cache_metrics():
+    return analytics_cache.stats()
+
 # optional simple root endpoint
 @app.get("/")
-def root():
+async def root():
     return {"message": "Expense Manager API is running"}
\ No newline at end of file
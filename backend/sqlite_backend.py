@@ -0,0 +1,247 @@
+"""
+Embedded SQLite engine for db_helper.
+
+Connections are wrapped so db_helper can keep using the MySQL-flavoured DB-API it was written
+for: `%s` placeholders, `cursor(dictionary=True)` and DATE_FORMAT(). The database runs in WAL
+mode so readers never block the writer, which suits single-node, read-heavy deployments.
+"""
+import re
+import sqlite3
+from datetime import date
+
+SCHEMA = [
+    # user_id is the tenant (household); rows written without one belong to tenant 1
+    '''CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL DEFAULT 1,
+        expense_date DATE NOT NULL,
+        amount REAL NOT NULL,
+        category VARCHAR(255) NOT NULL,
+        notes TEXT
+    )''',
+    # every index leads with (user_id, expense_date), so a tenant's queries never touch other tenants' rows
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_date_category_amount ON expenses (user_id, expense_date, category, amount)",
+    # keyset pagination on (expense_date, id), with and without a category filter
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_date_id ON expenses (user_id, expense_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date_id ON expenses (user_id, category, expense_date, id)",
+    # full-text search on notes: an external-content FTS5 index kept in sync by triggers
+    "CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(notes, content='expenses', content_rowid='id')",
+    '''CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts (rowid, notes) VALUES (new.id, new.notes);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, notes) VALUES ('delete', old.id, old.notes);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, notes) VALUES ('delete', old.id, old.notes);
+        INSERT INTO expenses_fts (rowid, notes) VALUES (new.id, new.notes);
+    END''',
+    '''CREATE TABLE IF NOT EXISTS expense_rollups (
+        user_id INTEGER NOT NULL DEFAULT 1,
+        day DATE NOT NULL,
+        category VARCHAR(255) NOT NULL,
+        total REAL NOT NULL,
+        expense_count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day, category)
+    )''',
+    # scope is a date or 'all', the tenant's write counter
+    '''CREATE TABLE IF NOT EXISTS expense_versions (
+        user_id INTEGER NOT NULL DEFAULT 1,
+        scope VARCHAR(10) NOT NULL,
+        version INTEGER NOT NULL,
+        modified_at REAL NOT NULL,
+        PRIMARY KEY (user_id, scope)
+    )''',
+    # stamped on the primary by replicas-aware readers to measure how far each replica trails
+    '''CREATE TABLE IF NOT EXISTS replication_heartbeat (
+        id INTEGER PRIMARY KEY,
+        beat_at REAL NOT NULL
+    )''',
+]
+
+# databases created before user_id: their rows become tenant 1's; the keyed tables are rebuilt
+LEGACY_UPGRADE = [
+    "ALTER TABLE expenses ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1",
+    "DROP INDEX IF EXISTS idx_expenses_date_category_amount",
+    "DROP INDEX IF EXISTS idx_expenses_date_id",
+    "DROP INDEX IF EXISTS idx_expenses_category_date_id",
+    "ALTER TABLE expense_rollups RENAME TO expense_rollups_legacy",
+    "ALTER TABLE expense_versions RENAME TO expense_versions_legacy",
+]
+LEGACY_COPY = [
+    '''INSERT INTO expense_rollups (user_id, day, category, total, expense_count)
+        SELECT 1, day, category, total, expense_count FROM expense_rollups_legacy''',
+    '''INSERT INTO expense_versions (user_id, scope, version, modified_at)
+        SELECT 1, scope, version, modified_at FROM expense_versions_legacy''',
+    "DROP TABLE expense_rollups_legacy",
+    "DROP TABLE expense_versions_legacy",
+]
+
+# dates whose rows were written around db_helper's write paths (a loaded dump, a database from
+# before expense_versions) have no version row, so their ranges would keep their ETag: stamp them
+# with their tenant's next version. Only tenants with such dates are bumped, so this is a no-op
+# on a database every row of which was written through db_helper.
+STAMP_UNVERSIONED_DATES = [
+    "DROP TABLE IF EXISTS temp.unversioned_dates",
+    '''CREATE TEMP TABLE unversioned_dates AS
+        SELECT DISTINCT user_id, expense_date AS day FROM expenses e
+        WHERE NOT EXISTS (SELECT 1 FROM expense_versions v WHERE v.user_id = e.user_id AND v.scope = e.expense_date)''',
+    '''INSERT OR IGNORE INTO expense_versions (user_id, scope, version, modified_at)
+        SELECT DISTINCT user_id, 'all', 0, 0 FROM unversioned_dates''',
+    '''UPDATE expense_versions SET version = version + 1, modified_at = (julianday('now') - 2440587.5) * 86400.0
+        WHERE scope = 'all' AND user_id IN (SELECT user_id FROM unversioned_dates)''',
+    '''INSERT INTO expense_versions (user_id, scope, version, modified_at)
+        SELECT d.user_id, d.day, v.version, v.modified_at
+        FROM unversioned_dates d JOIN expense_versions v ON v.scope = 'all' AND v.user_id = d.user_id''',
+    "DROP TABLE unversioned_dates",
+]
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+
+def _date_format(value, fmt):
+    """The subset of MySQL's DATE_FORMAT used by db_helper (%Y, %m, %d map straight to strftime)."""
+    if value is None:
+        return None
+    return date.fromisoformat(str(value)[:10]).strftime(fmt)
+
+
+class SQLiteCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _translate(operation):
+        return operation.replace("%s", "?")
+
+    def execute(self, operation, params=()):
+        self._cursor.execute(self._translate(operation), params)
+
+    def executemany(self, operation, seq_params):
+        self._cursor.executemany(self._translate(operation), seq_params)
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, connection):
+        self._connection = connection
+        self._closed = False
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._connection.cursor(), dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        return not self._closed
+
+    def close(self):
+        self._closed = True
+        self._connection.close()
+
+
+def connect(path):
+    connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA busy_timeout=5000")
+    connection.create_function("DATE_FORMAT", 2, _date_format, deterministic=True)
+    return SQLiteConnection(connection)
+
+
+def create_schema(connection):
+    """Create the embedded schema at the latest version; safe to call on an existing database."""
+    cursor = connection.cursor()
+    cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = 'expenses_fts'")
+    has_search_index = cursor.fetchone()[0]
+    cursor.execute("SELECT count(*) FROM pragma_table_info('expenses') WHERE name = 'user_id'")
+    has_user_id = cursor.fetchone()[0]
+    cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = 'expenses'")
+    legacy = cursor.fetchone()[0] and not has_user_id
+    if legacy:
+        for statement in LEGACY_UPGRADE:
+            cursor.execute(statement)
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    if legacy:
+        for statement in LEGACY_COPY:
+            cursor.execute(statement)
+    if not has_search_index:
+        # a database created before the search index: index the rows it already has
+        cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+    for statement in STAMP_UNVERSIONED_DATES:
+        cursor.execute(statement)
+    connection.commit()
+    cursor.close()
+
+
+def replicate(source_path, replica_path):
+    """Copy the whole database at source_path onto replica_path: stand-in replication for local setups and tests."""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def seed_from_mysql_dump(connection, dump_path):
+    """Load the `INSERT INTO expenses` statements of a mysqldump file as tenant 1, rebuild the rollups and version the loaded dates."""
+    with open(dump_path, encoding="utf-8") as dump:
+        inserts = re.findall(r"^INSERT INTO `expenses` VALUES .*;$", dump.read(), flags=re.MULTILINE)
+    cursor = connection.cursor()
+    for statement in inserts:
+        # the dump predates user_id, so name its columns and let user_id take its default
+        statement = statement.replace("INSERT INTO `expenses` VALUES", "INSERT INTO expenses (id, expense_date, amount, category, notes) VALUES", 1)
+        # mysqldump escapes quotes as \' while SQLite expects ''
+        cursor.execute(statement.replace("\\'", "''"))
+    cursor.execute("DELETE FROM expense_rollups")
+    cursor.execute(
+        '''INSERT INTO expense_rollups (user_id, day, category, total, expense_count)
+        SELECT user_id, expense_date, category, sum(amount), count(*)
+        FROM expenses
+        GROUP BY user_id, expense_date, category'''
+    )
+    for statement in STAMP_UNVERSIONED_DATES:
+        cursor.execute(statement)
+    connection.commit()
+    cursor.close()
@@ -0,0 +1,176 @@
+"""
+Storage interface used by the API, selected with the EXPENSE_STORAGE environment variable.
+
+    EXPENSE_STORAGE=mysql   MySQLStorage: async_db_helper on aiomysql (default)
+    EXPENSE_STORAGE=sqlite  SQLiteStorage: db_helper on the embedded engine, file EXPENSE_SQLITE_PATH
+
+Every data method is scoped to one tenant by its user_id keyword (DEFAULT_USER_ID if omitted).
+"""
+import asyncio
+import db_helper
+import replicas
+
+DEFAULT_USER_ID = db_helper.DEFAULT_USER_ID
+
+
+class ExpenseStorage:
+    async def fetch_expenses_for_date(self, expense_date, user_id=DEFAULT_USER_ID):
+        raise NotImplementedError
+
+    async def replace_expenses_for_date(self, expense_date, rows, user_id=DEFAULT_USER_ID):
+        """Replace a day with rows of (amount, category, notes) in one transaction."""
+        raise NotImplementedError
+
+    async def replace_expenses_for_dates(self, days, user_id=DEFAULT_USER_ID):
+        """Replace every day of {expense_date: rows} in one transaction; returns the version they now have."""
+        raise NotImplementedError
+
+    async def insert_expenses(self, rows, user_id=DEFAULT_USER_ID):
+        """Append rows of (expense_date, amount, category, notes) in one batched transaction."""
+        raise NotImplementedError
+
+    async def list_expenses(self, start_date=None, end_date=None, category=None, q=None, after=None, limit=50, user_id=DEFAULT_USER_ID):
+        """Return (rows, next_key): one keyset page ordered by (expense_date, id), see db_helper.list_expenses_query."""
+        raise NotImplementedError
+
+    async def iter_expenses(self, start_date, end_date, batch_size=db_helper.EXPORT_BATCH_SIZE, user_id=DEFAULT_USER_ID):
+        """Async generator of row batches for the inclusive range, streamed without buffering."""
+        raise NotImplementedError
+        yield
+
+    async def fetch_version(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        """Return {"version", "modified_at"} of the last write to the inclusive range, for ETags."""
+        raise NotImplementedError
+
+    async def fetch_expense_summary(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        """Return [{"category", "total"}] for the inclusive range."""
+        raise NotImplementedError
+
+    async def fetch_monthly_expense_summary(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        """Return [{"month" (YYYY-MM), "category", "total"}] for the inclusive range."""
+        raise NotImplementedError
+
+    async def fetch_daily_category_totals(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        """Return [{"day", "category", "total"}] for the inclusive range, ordered by day."""
+        raise NotImplementedError
+
+    def pool_stats(self):
+        raise NotImplementedError
+
+    def has_replicas(self):
+        """True if reads may be served by a replica, i.e. writers need read-your-writes stickiness."""
+        return False
+
+    async def close(self):
+        pass
+
+
+class MySQLStorage(ExpenseStorage):
+    def __init__(self):
+        import async_db_helper
+        self._db = async_db_helper
+
+    async def fetch_expenses_for_date(self, expense_date, user_id=DEFAULT_USER_ID):
+        return await self._db.fetch_expenses_for_date(expense_date, user_id=user_id)
+
+    async def replace_expenses_for_date(self, expense_date, rows, user_id=DEFAULT_USER_ID):
+        await self._db.replace_expenses_for_date(expense_date, rows, user_id=user_id)
+
+    async def replace_expenses_for_dates(self, days, user_id=DEFAULT_USER_ID):
+        return await self._db.replace_expenses_for_dates(days, user_id=user_id)
+
+    async def insert_expenses(self, rows, user_id=DEFAULT_USER_ID):
+        await self._db.insert_expenses(rows, user_id=user_id)
+
+    async def list_expenses(self, start_date=None, end_date=None, category=None, q=None, after=None, limit=50, user_id=DEFAULT_USER_ID):
+        return await self._db.list_expenses(start_date, end_date, category, q, after, limit, user_id=user_id)
+
+    async def iter_expenses(self, start_date, end_date, batch_size=db_helper.EXPORT_BATCH_SIZE, user_id=DEFAULT_USER_ID):
+        async for rows in self._db.iter_expenses(start_date, end_date, batch_size, user_id=user_id):
+            yield rows
+
+    async def fetch_version(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        return await self._db.fetch_version(start_date, end_date, user_id=user_id)
+
+    async def fetch_expense_summary(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        return await self._db.fetch_expense_summary(start_date, end_date, user_id=user_id)
+
+    async def fetch_monthly_expense_summary(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        return await self._db.fetch_monthly_expense_summary(start_date, end_date, user_id=user_id)
+
+    async def fetch_daily_category_totals(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        return await self._db.fetch_daily_category_totals(start_date, end_date, user_id=user_id)
+
+    def pool_stats(self):
+        return self._db.pool_stats()
+
+    def has_replicas(self):
+        return bool(replicas.targets("mysql"))
+
+    async def close(self):
+        await self._db.close_pool()
+
+
+class SQLiteStorage(ExpenseStorage):
+    """
+    Runs the db_helper functions against the embedded SQLite engine. SQLite calls are short and
+    local, so they are pushed to worker threads instead of needing an async driver.
+    """
+
+    def __init__(self):
+        import sqlite_backend
+        connection = sqlite_backend.connect(db_helper.SQLITE_PATH)
+        sqlite_backend.create_schema(connection)
+        connection.close()
+
+    async def fetch_expenses_for_date(self, expense_date, user_id=DEFAULT_USER_ID):
+        return await asyncio.to_thread(db_helper.fetch_expenses_for_date, expense_date, user_id=user_id)
+
+    async def replace_expenses_for_date(self, expense_date, rows, user_id=DEFAULT_USER_ID):
+        await asyncio.to_thread(db_helper.replace_expenses_for_date, expense_date, rows, user_id=user_id)
+
+    async def replace_expenses_for_dates(self, days, user_id=DEFAULT_USER_ID):
+        return await asyncio.to_thread(db_helper.replace_expenses_for_dates, days, user_id=user_id)
+
+    async def insert_expenses(self, rows, user_id=DEFAULT_USER_ID):
+        await asyncio.to_thread(db_helper.insert_expenses, rows, user_id=user_id)
+
+    async def list_expenses(self, start_date=None, end_date=None, category=None, q=None, after=None, limit=50, user_id=DEFAULT_USER_ID):
+        return await asyncio.to_thread(db_helper.list_expenses, start_date, end_date, category, q, after, limit, user_id=user_id)
+
+    async def iter_expenses(self, start_date, end_date, batch_size=db_helper.EXPORT_BATCH_SIZE, user_id=DEFAULT_USER_ID):
+        batches = db_helper.iter_expenses(start_date, end_date, batch_size, user_id)
+        try:
+            while True:
+                rows = await asyncio.to_thread(next, batches, None)
+                if rows is None:
+                    return
+                yield rows
+        finally:
+            await asyncio.to_thread(batches.close)
+
+    async def fetch_version(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        return await asyncio.to_thread(db_helper.fetch_version, start_date, end_date, user_id=user_id)
+
+    async def fetch_expense_summary(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        return await asyncio.to_thread(db_helper.fetch_expense_summary, start_date, end_date, user_id=user_id)
+
+    async def fetch_monthly_expense_summary(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        return await asyncio.to_thread(db_helper.fetch_monthly_expense_summary, start_date, end_date, user_id=user_id)
+
+    async def fetch_daily_category_totals(self, start_date, end_date, user_id=DEFAULT_USER_ID):
+        return await asyncio.to_thread(db_helper.fetch_daily_category_totals, start_date, end_date, user_id=user_id)
+
+    def pool_stats(self):
+        return db_helper.pool_stats()
+
+    def has_replicas(self):
+        return db_helper.get_replicas()[0].count > 0
+
+
+def get_storage():
+    if db_helper.STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage()
+    if db_helper.STORAGE_BACKEND == "mysql":
+        return MySQLStorage()
+    raise ValueError(f"Unknown EXPENSE_STORAGE backend: {db_helper.STORAGE_BACKEND}")
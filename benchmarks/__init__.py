@@ -0,0 +1,14 @@
+"""
+Benchmarks for the backend hot paths.
+
+    python -m benchmarks.run [--rows 100000] [--output benchmarks/results/<commit>.json]
+    python -m benchmarks.compare OLD.json NEW.json [--threshold 0.10]
+
+The bench_*.py and load_test_async.py scripts next to this package measure single changes
+and can still be run directly.
+"""
+import os
+import sys
+
+# the backend modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
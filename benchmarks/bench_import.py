@@ -0,0 +1,97 @@
+"""
+Benchmark the streaming import behind POST /expenses/import.
+
+    python benchmarks/bench_import.py [--rows 1000000] [--format csv|ndjson] [--keep] [--trace-memory]
+
+Feeds a generated body through the same parser, validation and batched writes as the endpoint
+against the configured storage (EXPENSE_STORAGE). It reports rows per second and peak RSS,
+which should stay flat as --rows grows; --trace-memory also reports the peak Python heap, at
+the cost of a much slower run. Rows are dated from BASE_DATE on and are deleted afterwards
+unless --keep is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import datagen
+import expense_import
+from server import ImportedExpense
+from storage import get_storage
+
+BASE_DATE = date(2100, 1, 1)
+CATEGORIES = ["Rent", "Food", "Shopping", "Entertainment", "Other"]
+CHUNK_BYTES = 64 * 1024
+
+
+async def generate_body(rows, fmt, seed=42):
+    """Yield the upload in CHUNK_BYTES pieces, the way an HTTP body arrives."""
+    rng = random.Random(seed)
+    buffer = ["expense_date,amount,category,notes\n"] if fmt == "csv" else []
+    size = 0
+    for i in range(rows):
+        day = (BASE_DATE + timedelta(days=i // 50)).isoformat()
+        amount = rng.randrange(100, 50000) / 100
+        category = CATEGORIES[i % len(CATEGORIES)]
+        if fmt == "csv":
+            line = f"{day},{amount},{category},bench row {i}\n"
+        else:
+            line = json.dumps({"expense_date": day, "amount": amount, "category": category, "notes": f"bench row {i}"}) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def validate(record):
+    expense = ImportedExpense.model_validate(record)
+    return (expense.expense_date, expense.amount, expense.category, expense.notes)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--keep", action="store_true")
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    storage = get_storage()
+    if args.trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        report = await expense_import.import_expenses(
+            generate_body(args.rows, args.format), args.format, validate, storage.insert_expenses
+        )
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak_heap = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await storage.close()
+        if not args.keep:
+            datagen.clear_database(BASE_DATE)
+
+    print(f"rows imported   {report['rows_imported']:>12,}")
+    print(f"rows rejected   {report['rows_rejected']:>12,}")
+    print(f"elapsed         {elapsed:>12.2f} s")
+    print(f"rows/second     {report['rows_imported'] / elapsed:>12,.0f}")
+    # ru_maxrss is in KiB on Linux
+    print(f"peak RSS        {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:>12.1f} MiB")
+    if args.trace_memory:
+        print(f"peak heap       {peak_heap / 1024 / 1024:>12.1f} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Compare /analytics/monthly latency: one summary query per month versus the single GROUP BY query.
+
+    python benchmarks/bench_monthly_analytics.py [--start 2020-01-01] [--months 12 60] [--repeat 10]
+
+Runs against the database configured in backend/db_helper.py (read only).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from server import build_breakdown_from_db, compute_analytics_monthly, month_start_end, months_between
+
+
+def add_months(start, months):
+    index = start.year * 12 + start.month - 1 + months - 1
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def monthly_per_month_queries(start, end):
+    """The old endpoint: one fetch_expense_summary round trip per month."""
+    response = {}
+    for y, m in months_between(start, end):
+        s, e = month_start_end(y, m)
+        response[s.strftime("%Y-%m")] = await build_breakdown_from_db(s, e)
+    return response
+
+
+async def monthly_single_query(start, end):
+    # the endpoint body without the response cache, which would hide the query cost
+    return await compute_analytics_monthly(start, end)
+
+
+async def measure(func, start, end, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func(start, end)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2020, 1, 1))
+    parser.add_argument("--months", type=int, nargs="+", default=[12, 60])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'months':>6} {'per-month p50 ms':>18} {'grouped p50 ms':>16} {'speedup':>8}")
+    for months in args.months:
+        last_month = add_months(args.start, months)
+        end = month_start_end(last_month.year, last_month.month)[1]
+        assert await monthly_per_month_queries(args.start, end) == await monthly_single_query(args.start, end)
+        old_p50 = await measure(monthly_per_month_queries, args.start, end, args.repeat)
+        new_p50 = await measure(monthly_single_query, args.start, end, args.repeat)
+        print(f"{months:>6} {old_p50:>18.2f} {new_p50:>16.2f} {old_p50 / new_p50:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
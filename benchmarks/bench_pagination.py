@@ -0,0 +1,96 @@
+"""
+Benchmark GET /expenses pagination: keyset page latency at page 1 and deep pages, against OFFSET.
+
+    python benchmarks/bench_pagination.py [--pages 10000] [--limit 50] [--repeat 20] [--keep]
+
+Seeds pages * limit rows dated from BASE_DATE on (skipped if they are already there), then
+times db_helper.list_expenses at page 1 and at the requested deep pages, and the equivalent
+LIMIT/OFFSET query for comparison. Keyset latency should stay flat; OFFSET grows with depth.
+Rows are deleted afterwards unless --keep is given.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import datagen
+import db_helper
+import migrations
+
+BASE_DATE = date(2200, 1, 1)
+CATEGORIES = ["Rent", "Food", "Shopping", "Entertainment", "Other"]
+ROWS_PER_DAY = 200
+OFFSET_SQL = db_helper.LIST_EXPENSES_SQL + " where user_id = %s and expense_date >= %s order by expense_date, id limit %s offset %s"
+
+
+def seed(rows):
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("select count(*) as n from expenses where user_id = %s and expense_date >= %s", (db_helper.DEFAULT_USER_ID, BASE_DATE))
+        existing = cursor.fetchall()[0]["n"]
+    if existing >= rows:
+        return
+    batch = []
+    for i in range(existing, rows):
+        day = BASE_DATE + timedelta(days=i // ROWS_PER_DAY)
+        batch.append((day, 10 + i % 90, CATEGORIES[i % len(CATEGORIES)], f"bench row {i}"))
+        if len(batch) == 10_000:
+            db_helper.insert_expenses(batch)
+            batch = []
+    if batch:
+        db_helper.insert_expenses(batch)
+
+
+def key_at(offset):
+    """(expense_date, id) of the row just before `offset`, i.e. the cursor of that page."""
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(OFFSET_SQL, (db_helper.DEFAULT_USER_ID, BASE_DATE, 1, offset - 1))
+        row = cursor.fetchall()[0]
+    return row["expense_date"], row["id"]
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def offset_page(offset, limit):
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(OFFSET_SQL, (db_helper.DEFAULT_USER_ID, BASE_DATE, limit, offset))
+        return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    migrations.migrate()
+    seed(args.pages * args.limit)
+    try:
+        print(f"{'page':>8} {'keyset ms':>10} {'offset ms':>10}")
+        for page in sorted({1, 10, 100, 1000, args.pages}):
+            if page > args.pages:
+                continue
+            offset = (page - 1) * args.limit
+            after = key_at(offset) if offset else None
+            keyset = timed(lambda: db_helper.list_expenses(start_date=BASE_DATE, after=after, limit=args.limit), args.repeat)
+            offset_ms = timed(lambda: offset_page(offset, args.limit), args.repeat)
+            print(f"{page:>8} {keyset:>10.2f} {offset_ms:>10.2f}")
+    finally:
+        if not args.keep:
+            datagen.clear_database(BASE_DATE)
+
+
+if __name__ == "__main__":
+    main()
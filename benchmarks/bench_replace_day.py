@@ -0,0 +1,63 @@
+"""
+Compare save latency of POST /expenses/{expense_date} before and after the single-transaction upsert.
+
+    python benchmarks/bench_replace_day.py [--repeat 20]
+
+Runs against the database configured in backend/db_helper.py and only touches BENCH_DATE.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import db_helper
+
+BENCH_DATE = "2099-12-31"
+ROW_COUNTS = (1, 10, 100)
+
+
+def make_rows(count):
+    return [(float(i + 1), "Food", f"bench row {i}") for i in range(count)]
+
+
+def save_per_row(rows):
+    """The old endpoint: one delete plus one connection and commit per row."""
+    db_helper.delete_expenses_for_date(BENCH_DATE)
+    for amount, category, notes in rows:
+        db_helper.insert_expense(BENCH_DATE, amount, category, notes)
+
+
+def save_batched(rows):
+    db_helper.replace_expenses_for_date(BENCH_DATE, rows)
+
+
+def measure(func, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(rows)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'per-row p50 ms':>16} {'batched p50 ms':>16} {'speedup':>8}")
+    try:
+        for count in ROW_COUNTS:
+            rows = make_rows(count)
+            old_p50, _ = measure(save_per_row, rows, args.repeat)
+            new_p50, _ = measure(save_batched, rows, args.repeat)
+            print(f"{count:>6} {old_p50:>16.2f} {new_p50:>16.2f} {old_p50 / new_p50:>7.1f}x")
+    finally:
+        db_helper.delete_expenses_for_date(BENCH_DATE)
+
+
+if __name__ == "__main__":
+    main()
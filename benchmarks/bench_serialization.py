@@ -0,0 +1,90 @@
+"""
+Benchmark response serialization: FastAPI's default path against the EXPENSE_FAST_JSON path, and
+the nested against the columnar /analytics/monthly shape, with encoded and compressed sizes.
+
+    python -m benchmarks.bench_serialization [--day-rows 500] [--months 120] [--repeat 200]
+
+Needs no database: payloads are built from benchmarks.datagen rows. "default" is what FastAPI
+does with an endpoint's return value (validation against the response model where there is one,
+jsonable_encoder otherwise, then json.dumps); "fast" is responses.dumps (orjson if installed).
+Sizes are given raw, gzipped at EXPENSE_GZIP_LEVEL and, with the brotli package, as brotli.
+"""
+import argparse
+import gzip
+from collections import defaultdict
+from typing import List
+
+import benchmarks  # noqa: F401  (puts backend/ on sys.path)
+import analytics_engine
+import responses
+import server  # for the Expense response model of GET /expenses/{date}
+from benchmarks import datagen
+from benchmarks.run import time_callable
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+_json_response = JSONResponse(None)
+
+
+def day_rows(count):
+    """count rows shaped like fetch_expenses_for_date's dict rows, all on one day."""
+    return [
+        {"id": i, "user_id": 1, "expense_date": datagen.BASE_DATE, "amount": amount, "category": category, "notes": notes}
+        for i, (_, amount, category, notes) in enumerate(datagen.generate_expenses(count, days=1))
+    ]
+
+
+def monthly_rows(months):
+    """fetch_monthly_expense_summary rows over `months` months, and the month labels."""
+    days = (datagen.BASE_DATE.replace(year=datagen.BASE_DATE.year + months // 12) - datagen.BASE_DATE).days
+    totals = defaultdict(float)
+    for day, amount, category, _ in datagen.generate_expenses(months * 100, days=max(days, 1)):
+        totals[(day.strftime("%Y-%m"), category)] += amount
+    labels = sorted({month for month, _ in totals})
+    return [{"month": month, "category": category, "total": total} for (month, category), total in sorted(totals.items())], labels
+
+
+def sizes(body):
+    row = {"bytes": len(body), "gzip": len(gzip.compress(body, compresslevel=responses.GZIP_LEVEL))}
+    if responses.brotli is not None:
+        row["brotli"] = len(responses.brotli.compress(body, quality=responses.BROTLI_QUALITY))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--day-rows", type=int, default=500)
+    parser.add_argument("--months", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    expenses = TypeAdapter(List[server.Expense])
+    rows = day_rows(args.day_rows)
+    summary, months = monthly_rows(args.months)
+    nested = analytics_engine.monthly_breakdown(summary, months)
+    columnar = analytics_engine.monthly_columnar(summary, months)
+
+    def project(rows):
+        return [{"amount": float(row["amount"]), "category": row["category"], "notes": row["notes"]} for row in rows]
+
+    cases = {
+        "day rows, default": lambda: _json_response.render(expenses.dump_python(expenses.validate_python(rows), mode="json")),
+        "day rows, fast": lambda: responses.dumps(project(rows)),
+        "monthly nested, default": lambda: _json_response.render(jsonable_encoder(nested)),
+        "monthly nested, fast": lambda: responses.dumps(nested),
+        "monthly columnar, default": lambda: _json_response.render(jsonable_encoder(columnar)),
+        "monthly columnar, fast": lambda: responses.dumps(columnar),
+    }
+    print(f"{args.day_rows} expense rows; {len(months)} months x {len(columnar['categories'])} categories; "
+          f"orjson {'on' if responses.orjson is not None else 'not installed'}")
+    columns = ["bytes", "gzip"] + (["brotli"] if responses.brotli is not None else [])
+    print(f"{'payload':<28} {'median ms':>10} {'p95 ms':>8} " + " ".join(f"{column:>8}" for column in columns))
+    for name, encode in cases.items():
+        timing = time_callable(encode, args.repeat)
+        size = sizes(encode())
+        print(f"{name:<28} {timing['median']:>10.3f} {timing['p95']:>8.3f} " + " ".join(f"{size[column]:>8}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
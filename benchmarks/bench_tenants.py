@@ -0,0 +1,99 @@
+"""
+Benchmark per-tenant query cost as the number of tenants sharing the tables grows.
+
+    python -m benchmarks.bench_tenants [--tenants 10000] [--rows-per-tenant 100] [--days 365]
+                                       [--repeat 50] [--keep]
+
+Seeds tenants FIRST_TENANT, FIRST_TENANT + 1, ... with --rows-per-tenant synthetic expenses each
+(benchmarks.datagen, seeded by tenant id) in stages of 1, 10, 100, ... up to --tenants, and after
+each stage times the same tenant's day lookup, month summary, monthly analytics, first list page
+and ETag version lookup. With every query led by user_id the latencies should stay flat while the
+table grows by four orders of magnitude. Bench tenants are deleted afterwards unless --keep is given.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import timedelta
+
+import benchmarks  # noqa: F401  (puts backend/ on sys.path)
+import db_helper
+import migrations
+from benchmarks import datagen
+from benchmarks.run import time_callable
+
+FIRST_TENANT = 1_000_000
+QUERIES = ["day", "month_summary", "monthly_analytics", "list_page", "version"]
+
+
+def seed_tenants(first, last, rows_per_tenant, days):
+    """Give tenants first..last-1 their rows; each insert_expenses call is one tenant's transaction."""
+    for user_id in range(first, last):
+        db_helper.insert_expenses(datagen.generate_expenses(rows_per_tenant, days, seed=user_id), user_id=user_id)
+
+
+def count_rows():
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("select count(*) as n from expenses")
+        return cursor.fetchall()[0]["n"]
+
+
+def probe_queries(user_id, days, rng):
+    first_day = datagen.BASE_DATE
+    last_day = first_day + timedelta(days=days - 1)
+
+    def random_day():
+        return first_day + timedelta(days=rng.randrange(days))
+
+    def month():
+        start = random_day().replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+    return {
+        "day": lambda: db_helper.fetch_expenses_for_date(random_day(), user_id=user_id),
+        "month_summary": lambda: db_helper.fetch_expense_summary(*month(), user_id=user_id),
+        "monthly_analytics": lambda: db_helper.fetch_monthly_expense_summary(first_day, last_day, user_id=user_id),
+        "list_page": lambda: db_helper.list_expenses(limit=50, user_id=user_id),
+        "version": lambda: db_helper.fetch_version(*month(), user_id=user_id),
+    }
+
+
+def clear_tenants():
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("delete from expenses where user_id >= %s", (FIRST_TENANT,))
+        cursor.execute("delete from expense_rollups where user_id >= %s", (FIRST_TENANT,))
+        cursor.execute("delete from expense_versions where user_id >= %s", (FIRST_TENANT,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tenants", type=int, default=10_000)
+    parser.add_argument("--rows-per-tenant", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    stages = [n for n in (1, 10, 100, 1000, 10_000, 100_000) if n < args.tenants] + [args.tenants]
+    migrations.migrate()
+    clear_tenants()
+    seeded = 0
+    try:
+        print(f"{'tenants':>8} {'rows':>10} " + " ".join(f"{name + ' ms':>20}" for name in QUERIES))
+        for stage in stages:
+            started = time.perf_counter()
+            seed_tenants(FIRST_TENANT + seeded, FIRST_TENANT + stage, args.rows_per_tenant, args.days)
+            print(f"seeded {stage - seeded:,} tenants in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            seeded = stage
+
+            # always the first tenant, replaying the same dates at every stage
+            queries = probe_queries(FIRST_TENANT, args.days, random.Random(FIRST_TENANT))
+            medians = [time_callable(queries[name], args.repeat)["median"] for name in QUERIES]
+            print(f"{stage:>8} {count_rows():>10} " + " ".join(f"{median:>20.3f}" for median in medians))
+    finally:
+        if not args.keep:
+            clear_tenants()
+
+
+if __name__ == "__main__":
+    main()
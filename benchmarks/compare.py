@@ -0,0 +1,51 @@
+"""
+Compare two benchmark result files written by benchmarks.run.
+
+    python -m benchmarks.compare OLD.json NEW.json [--threshold 0.10] [--metric median|min|p95]
+
+Prints the chosen statistic of every benchmark in both runs and the ratio new/old. Exits with
+status 1 when any got slower by more than --threshold (10% by default), so it can gate CI.
+Sub-millisecond benchmarks are noisy on shared machines; `--metric min` is the steadier signal.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold, metric="median"):
+    """Return [(name, old value, new value, ratio, regressed)] for benchmarks present in both."""
+    rows = []
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        before, after = old["results"][name][metric], new["results"][name][metric]
+        ratio = after / before if before else float("inf")
+        rows.append((name, before, after, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--metric", choices=["median", "min", "p95"], default="median")
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    for key in ("storage", "rows", "days", "seed"):
+        if old.get(key) != new.get(key):
+            print(f"warning: runs differ in {key}: {old.get(key)} vs {new.get(key)}", file=sys.stderr)
+
+    rows = compare(old, new, args.threshold, args.metric)
+    print(f"{'benchmark':<40} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for name, before, after, ratio, regressed in rows:
+        print(f"{name:<40} {before:>10.3f} {after:>10.3f} {ratio:>7.2f}{'  REGRESSION' if regressed else ''}")
+    sys.exit(1 if any(row[4] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
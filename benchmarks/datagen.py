@@ -0,0 +1,101 @@
+"""
+Seeded synthetic expenses for benchmarks, from 10k to 10M rows.
+
+Rows are dated from BASE_DATE on, far from real data, and follow a skew close to real use:
+later days and weekends see more expenses, Food and Shopping are frequent small amounts,
+Rent is one large payment on the first of each month.
+"""
+import random
+from itertools import accumulate
+from datetime import date, timedelta
+
+import db_helper
+
+BASE_DATE = date(2300, 1, 1)
+# category -> (relative frequency, median amount, spread of log amount)
+CATEGORIES = {
+    "Food": (0.45, 12.0, 0.6),
+    "Shopping": (0.25, 35.0, 0.9),
+    "Entertainment": (0.15, 25.0, 0.8),
+    "Other": (0.15, 20.0, 1.0),
+}
+RENT = ("Rent", 1200.0)
+NOTES = {
+    "Food": ["Lunch", "Groceries", "Coffee", "Dinner out", "Bought potatoes"],
+    "Shopping": ["Clothes", "Electronics", "Household items", "Gift"],
+    "Entertainment": ["Movie", "Concert tickets", "Streaming subscription", "Games"],
+    "Other": ["Transport", "Pharmacy", "Haircut", "Repairs"],
+}
+BATCH_SIZE = 10_000
+
+
+def day_weights(days):
+    """Later days weigh up to 3x the first one, weekends 1.5x."""
+    weights = []
+    for offset in range(days):
+        weekend = (BASE_DATE + timedelta(days=offset)).weekday() >= 5
+        weights.append((1 + 2 * offset / max(days - 1, 1)) * (1.5 if weekend else 1.0))
+    return weights
+
+
+def generate_expenses(rows, days=730, seed=42):
+    """Yield rows of (expense_date, amount, category, notes), sorted by date, deterministic for a seed."""
+    rng = random.Random(seed)
+    names = list(CATEGORIES)
+    frequencies = [CATEGORIES[name][0] for name in names]
+
+    # one Rent payment per month, the rest of the rows spread over the days with the skew
+    rent_days = sorted({(BASE_DATE + timedelta(days=offset)).replace(day=1) for offset in range(days)})
+    rent_days = [day for day in rent_days if day >= BASE_DATE][:rows]
+    counts = [0] * days
+    weights = list(accumulate(day_weights(days)))
+    remaining = rows - len(rent_days)
+    while remaining:
+        # sampled in chunks so 10M rows never need a 10M-element list
+        chunk = min(remaining, 1_000_000)
+        for offset in rng.choices(range(days), cum_weights=weights, k=chunk):
+            counts[offset] += 1
+        remaining -= chunk
+
+    rent_by_day = set(rent_days)
+    for offset, count in enumerate(counts):
+        day = BASE_DATE + timedelta(days=offset)
+        if day in rent_by_day:
+            yield day, RENT[1], RENT[0], "Monthly rent"
+        for category in rng.choices(names, weights=frequencies, k=count):
+            _, median, spread = CATEGORIES[category]
+            amount = round(median * rng.lognormvariate(0, spread), 2)
+            yield day, amount, category, rng.choice(NOTES[category])
+
+
+def seed_database(rows, days=730, seed=42):
+    """Write generate_expenses() through db_helper.insert_expenses in batches; returns the row count."""
+    clear_database()
+    batch, written = [], 0
+    for row in generate_expenses(rows, days, seed):
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db_helper.insert_expenses(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db_helper.insert_expenses(batch)
+        written += len(batch)
+    return written
+
+
+def clear_database(base_date=BASE_DATE):
+    """
+    Delete every tenant's rows dated from base_date on. Their dates are stamped with the tenant's
+    next version, as a write through db_helper would do, so ranges a client cached with an ETag
+    change version instead of answering 304 with the deleted rows.
+    """
+    with db_helper.get_db_cursor(commit=True) as cursor:
+        cursor.execute("select distinct user_id, expense_date from expenses where expense_date >= %s", (base_date,))
+        dates = {}
+        for row in cursor.fetchall():
+            dates.setdefault(row["user_id"], []).append(row["expense_date"])
+        cursor.execute("delete from expenses where expense_date >= %s", (base_date,))
+        cursor.execute("delete from expense_rollups where day >= %s", (base_date,))
+        for user_id, days in dates.items():
+            db_helper._bump_versions(cursor, days, user_id)
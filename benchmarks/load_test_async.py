@@ -0,0 +1,84 @@
+"""
+Load test: blocking db_helper on a 40-thread pool versus async_db_helper on one event loop.
+
+    python benchmarks/load_test_async.py [--requests 2000] [--concurrency 40 200 500]
+
+The sync path mimics a sync FastAPI endpoint, which runs on a threadpool that defaults to 40
+threads per worker. The async path mimics the async endpoints: every request is a coroutine
+and concurrency is only bounded by the async connection pool. Each request is a
+GET /expenses/{expense_date} worth of work against the local database.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import async_db_helper
+import db_helper
+
+THREADPOOL_SIZE = 40
+EXPENSE_DATE = "2024-08-02"
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label, concurrency, timings, elapsed):
+    print(
+        f"{label:>6} {concurrency:>11} {statistics.median(timings):>9.2f} "
+        f"{percentile(timings, 99):>9.2f} {len(timings) / elapsed:>10.0f}"
+    )
+
+
+async def run_clients(request, total, concurrency):
+    """Closed loop: `concurrency` clients each send requests back to back until `total` are done."""
+    remaining = iter(range(total))
+    timings = []
+
+    async def client():
+        for _ in remaining:
+            started = time.perf_counter()
+            await request()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return timings, time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[40, 200, 500])
+    args = parser.parse_args()
+
+    # the sync pool must not be the bottleneck of the sync path
+    db_helper.POOL_SIZE = THREADPOOL_SIZE
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=THREADPOOL_SIZE)
+
+    async def sync_request():
+        # this is how Starlette runs a sync endpoint: queued on a bounded threadpool
+        await loop.run_in_executor(executor, db_helper.fetch_expenses_for_date, EXPENSE_DATE)
+
+    async def async_request():
+        await async_db_helper.fetch_expenses_for_date(EXPENSE_DATE)
+
+    print(f"{'mode':>6} {'concurrency':>11} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>10}")
+    for concurrency in args.concurrency:
+        report("sync", concurrency, *await run_clients(sync_request, args.requests, concurrency))
+        report("async", concurrency, *await run_clients(async_request, args.requests, concurrency))
+
+    executor.shutdown()
+    await async_db_helper.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,253 @@
+"""
+Run the backend benchmark suite against the configured storage and write the results as JSON.
+
+    python -m benchmarks.run [--rows 100000] [--days 730] [--seed 42] [--repeat 50]
+                             [--only NAME ...] [--skip-seed] [--keep] [--output PATH]
+
+Seeds --rows synthetic expenses (benchmarks.datagen), then times each registered benchmark
+after a short warm-up, and finally runs an HTTP load scenario against the FastAPI app in
+process. Results go to benchmarks/results/<commit>.json unless --output is given; compare two
+runs with `python -m benchmarks.compare`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import benchmarks  # noqa: F401  (puts backend/ on sys.path)
+import db_helper
+import httpx
+import migrations
+from benchmarks import datagen
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+WARMUP = 3
+
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    """Register function(ctx) -> callable; the returned callable is what gets timed."""
+    BENCHMARKS[function.__name__.removeprefix("bench_")] = function
+    return function
+
+
+class Context:
+    def __init__(self, days, seed):
+        self.days = days
+        self.rng = random.Random(seed)
+        self.loop = asyncio.new_event_loop()
+        self.first_day = datagen.BASE_DATE
+        self.last_day = datagen.BASE_DATE + timedelta(days=days - 1)
+
+    def random_day(self):
+        return self.first_day + timedelta(days=self.rng.randrange(self.days))
+
+    def random_month(self):
+        day = self.random_day()
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return start, min(end, self.last_day)
+
+
+def stats_ms(timings):
+    timings = sorted(t * 1000 for t in timings)
+    return {
+        "unit": "ms",
+        "repeat": len(timings),
+        "min": round(timings[0], 4),
+        "median": round(statistics.median(timings), 4),
+        "mean": round(statistics.fmean(timings), 4),
+        "p95": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        "stdev": round(statistics.stdev(timings), 4) if len(timings) > 1 else 0.0,
+    }
+
+
+def time_callable(call, repeat):
+    for _ in range(WARMUP):
+        call()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return stats_ms(timings)
+
+
+@benchmark
+def bench_fetch_expenses_for_date(ctx):
+    return lambda: db_helper.fetch_expenses_for_date(ctx.random_day())
+
+
+@benchmark
+def bench_fetch_expense_summary_month(ctx):
+    def call():
+        start, end = ctx.random_month()
+        db_helper.fetch_expense_summary(start, end)
+    return call
+
+
+@benchmark
+def bench_fetch_expense_summary_full_range(ctx):
+    return lambda: db_helper.fetch_expense_summary(ctx.first_day, ctx.last_day)
+
+
+@benchmark
+def bench_monthly_analytics(ctx):
+    # the endpoint's work without HTTP or the response cache: one grouped query plus breakdowns
+    import server
+    start = ctx.first_day
+    end = (ctx.last_day.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return lambda: ctx.loop.run_until_complete(server.compute_analytics_monthly(start, end))
+
+
+@benchmark
+def bench_replace_day(ctx):
+    # a day after the synthetic range, so the data the read benchmarks see does not change
+    day = ctx.last_day + timedelta(days=1)
+    rows = [(float(10 + i), "Food", f"bench row {i}") for i in range(10)]
+    return lambda: db_helper.replace_expenses_for_date(day, rows)
+
+
+def week_after_range(ctx):
+    # like bench_replace_day, past the synthetic range so the read benchmarks are unaffected
+    first = ctx.last_day + timedelta(days=2)
+    rows = [(float(10 + i), "Food", f"bench row {i}") for i in range(10)]
+    return {first + timedelta(days=offset): rows for offset in range(7)}
+
+
+@benchmark
+def bench_replace_week_per_day(ctx):
+    days = week_after_range(ctx)
+
+    def call():
+        for day, rows in days.items():
+            db_helper.replace_expenses_for_date(day, rows)
+    return call
+
+
+@benchmark
+def bench_replace_week_batch(ctx):
+    days = week_after_range(ctx)
+    return lambda: db_helper.replace_expenses_for_dates(days)
+
+
+async def http_load(ctx, requests_total, concurrency):
+    """
+    Closed-loop clients against the ASGI app in process (no sockets): 70% GET /expenses/{date},
+    20% POST /analytics/ for a month, 10% POST /analytics/monthly for a quarter.
+    """
+    import server
+    transport = httpx.ASGITransport(app=server.app)
+    timings, statuses = [], {}
+    remaining = iter(range(requests_total))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_request():
+            roll = ctx.rng.random()
+            if roll < 0.7:
+                return await client.get(f"/expenses/{ctx.random_day()}")
+            start, end = ctx.random_month()
+            if roll < 0.9:
+                return await client.post("/analytics/", json={"start_date": str(start), "end_date": str(end)})
+            end = min(ctx.last_day, start + timedelta(days=90))
+            return await client.post("/analytics/monthly", json={"start_date": str(start), "end_date": str(end)})
+
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await one_request()
+                timings.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    result = stats_ms(timings)
+    result.update(
+        concurrency=concurrency,
+        requests_per_second=round(len(timings) / elapsed, 1),
+        p99=round(sorted(timings)[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000, 4),
+        statuses={str(code): count for code, count in sorted(statuses.items())},
+    )
+    return result
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS) + ["http_load"])
+    parser.add_argument("--http-requests", type=int, default=2000)
+    parser.add_argument("--http-concurrency", type=int, default=50)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse rows seeded by an earlier --keep run")
+    parser.add_argument("--keep", action="store_true", help="leave the synthetic rows in the database")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    migrations.migrate()
+    if not args.skip_seed:
+        started = time.perf_counter()
+        written = datagen.seed_database(args.rows, args.days, args.seed)
+        print(f"seeded {written:,} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    ctx = Context(args.days, args.seed)
+    selected = args.only or sorted(BENCHMARKS) + ["http_load"]
+    results = {}
+    try:
+        for name in selected:
+            # each benchmark replays the same dates whichever others are selected
+            ctx.rng = random.Random(f"{args.seed}:{name}")
+            if name == "http_load":
+                results[name] = ctx.loop.run_until_complete(http_load(ctx, args.http_requests, args.http_concurrency))
+            else:
+                results[name] = time_callable(BENCHMARKS[name](ctx), args.repeat)
+            print(f"{name:<40} median {results[name]['median']:>9.3f} ms  p95 {results[name]['p95']:>9.3f} ms", file=sys.stderr)
+    finally:
+        if "server" in sys.modules:
+            ctx.loop.run_until_complete(sys.modules["server"].storage.close())
+        ctx.loop.close()
+        if not args.keep:
+            datagen.clear_database()
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "storage": db_helper.STORAGE_BACKEND,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "rows": args.rows,
+        "days": args.days,
+        "seed": args.seed,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit[:12]}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Multi-process deployment of the API behind gunicorn with uvicorn workers:
+
+    cd backend && gunicorn -c ../deploy/gunicorn.conf.py server:app
+
+Every worker is its own process with its own connection pools, analytics cache and metrics, so
+the app is not preloaded: pools (and aiomysql's event loop) must be created inside the worker.
+State that has to agree across workers (ETag versions, read-your-writes stickiness) lives in the
+database and in a client cookie, not in a worker.
+
+    EXPENSE_BIND     address to listen on (0.0.0.0:8000)
+    EXPENSE_WORKERS  worker processes (one per CPU; each serves many requests concurrently)
+
+Backend logs go to stderr (EXPENSE_LOG_FILE=-), next to gunicorn's own: several processes must
+not rotate one server.log. Set EXPENSE_LOG_FILE=/var/log/expense/api-{pid}.log for a file per worker.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("EXPENSE_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("EXPENSE_WORKERS", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = False
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then so a slow leak cannot grow without bound
+max_requests = 10_000
+max_requests_jitter = 1_000
+
+# read by every worker's logging_setup; the workers inherit this process's environment
+os.environ.setdefault("EXPENSE_LOG_FILE", "-")
+
+accesslog = "-"
+errorlog = "-"
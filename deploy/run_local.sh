@@ -0,0 +1,21 @@
+#!/bin/sh
+# Local horizontally scaled stack on SQLite: gunicorn workers on one primary database file and
+# two stand-in replicas refreshed every second. Needs `pip install gunicorn`.
+#
+#     sh deploy/run_local.sh
+set -e
+cd "$(dirname "$0")/../backend"
+
+export EXPENSE_STORAGE=sqlite
+export EXPENSE_SQLITE_PATH="${EXPENSE_SQLITE_PATH:-$PWD/../expense_manager.sqlite3}"
+export EXPENSE_SQLITE_REPLICA_PATHS="$PWD/../replica1.sqlite3,$PWD/../replica2.sqlite3"
+REPLICAS=$(echo "$EXPENSE_SQLITE_REPLICA_PATHS" | tr ',' ' ')
+
+python migrations.py
+# the replicas must exist before the first worker reads from them
+python ../deploy/sqlite_replicas.py --once "$EXPENSE_SQLITE_PATH" $REPLICAS
+python ../deploy/sqlite_replicas.py --every 1 "$EXPENSE_SQLITE_PATH" $REPLICAS &
+REPLICATOR=$!
+trap 'kill $REPLICATOR' EXIT INT TERM
+
+gunicorn -c ../deploy/gunicorn.conf.py server:app
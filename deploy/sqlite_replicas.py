@@ -0,0 +1,37 @@
+"""
+Stand-in read replicas for local multi-process runs on the embedded SQLite engine.
+
+    python deploy/sqlite_replicas.py [--every 1.0] [--once] PRIMARY REPLICA [REPLICA ...]
+
+Copies the primary database onto every replica file, then again every --every seconds, so the
+replicas trail the primary the way asynchronous MySQL replicas do. Point the API at them with
+EXPENSE_SQLITE_REPLICA_PATHS.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import sqlite_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("primary")
+    parser.add_argument("replicas", nargs="+")
+    parser.add_argument("--every", type=float, default=1.0)
+    parser.add_argument("--once", action="store_true", help="copy once and exit")
+    args = parser.parse_args()
+
+    while True:
+        for replica in args.replicas:
+            sqlite_backend.replicate(args.primary, replica)
+        if args.once:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,13 @@
-import requests
 import streamlit as st
 from datetime import datetime
-from fastapi import Response
-from hypothesis.internal.charmap import categories
-from openpyxl.xml.constants import MIN_ROW
-
-# from jsonschema.benchmarks.const_vs_enum import value
-
-API_URL = "http://localhost:8000/"
+import api_client
 
 def add_update_tab():
     selected_date = st.date_input("Enter Date", datetime(2024,8,2), label_visibility="collapsed")
-    response = requests.get(f"{API_URL}/expenses/{selected_date}")
-
-    if response.status_code == 200:
-        existing_expenses = response.json()
-        # st.write(existing_expenses)
-    else:
+    try:
+        # served from api_client's cache on reruns until this date is saved
+        existing_expenses = api_client.get_expenses(selected_date)
+    except Exception:
         st.error("Failed to retrive expenses")
         existing_expenses = []
 
@@ -74,9 +65,9 @@ def add_update_tab():
         submit_button = st.form_submit_button(label="Submit")
         if submit_button:
             filtered_expenses = [expense for expense in expenses if expense['amount'] > 0]
-            requests.post(f"{API_URL}/expenses/{selected_date}", json=filtered_expenses)
-            if response.status_code == 200:
+            try:
+                api_client.save_expenses(selected_date, filtered_expenses)
                 st.success("Expenses undated/submitted successfully")
-            else:
+            except Exception:
                 st.error("Failed to undate/submit expenses")
             pass
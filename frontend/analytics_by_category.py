@@ -1,14 +1,7 @@
-import requests
 import streamlit as st
 from datetime import datetime
 import pandas as pd
-from fastapi import Response
-from hypothesis.internal.charmap import categories
-from openpyxl.xml.constants import MIN_ROW
-
-# from jsonschema.benchmarks.const_vs_enum import value
-
-API_URL = "http://localhost:8000/"
+import api_client
 
 def analytics_tab():
     col1, col2 = st.columns(2)
@@ -18,12 +11,11 @@ def analytics_tab():
         end_date = st.date_input("End Date", datetime(2024,8,5))
 
     if st.button("Get Analytics"):
-        payload = {
-            "start_date": start_date.strftime("%Y-%m-%d"),
-            "end_date": end_date.strftime("%Y-%m-%d"),
-        }
-        response = requests.post(f"{API_URL}/analytics", json=payload)
-        response = response.json()
+        try:
+            response = api_client.get_analytics(start_date, end_date)
+        except Exception as e:
+            st.error(f"Failed to retrieve analytics: {e}")
+            return
 
         data = {
             "Category" : list(response.keys()),
@@ -1,81 +1,73 @@
-import requests
 import streamlit as st
 import pandas as pd
 from datetime import date, datetime
 import calendar
-import io
-
-API_URL = "http://localhost:8000"  # no trailing slash
+import json
+import api_client
 
 st.set_page_config(page_title="Monthly Analytics", layout="wide")
 
-def month_start_end(year: int, month: int):
-    start = date(year, month, 1)
-    last_day = calendar.monthrange(year, month)[1]
-    end = date(year, month, last_day)
-    return start, end
-
-def months_between(start_date: date, end_date: date):
-    """Yield (year, month) pairs from start_date's month up to end_date's month inclusive."""
-    y, m = start_date.year, start_date.month
-    while (y < end_date.year) or (y == end_date.year and m <= end_date.month):
-        yield y, m
-        m += 1
-        if m > 12:
-            m = 1
-            y += 1
-
-def call_analytics_api(start_date: date, end_date: date):
-    payload = {
-        "start_date": start_date.strftime("%Y-%m-%d"),
-        "end_date": end_date.strftime("%Y-%m-%d")
-    }
+# ranges up to this many months are one direct request; longer ones run as a server-side job
+DIRECT_MONTHS = 24
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_monthly_analytics(start_date: date, end_date: date, data_version: int):
+    """One POST /analytics/monthly, cached per range until an expense is saved (data_version changes)."""
+    return api_client.get_monthly_analytics(start_date, end_date)
+
+def call_monthly_analytics_api(start_date: date, end_date: date):
+    """
+    The monthly breakdown {"2024-08": {"Food": {"total": ..., "percentage": ...}, ...}, ...} with
+    every month present. Long ranges are computed by a server-side job while a progress bar
+    follows its polls; repeats of an unchanged range are answered from the server's result cache.
+    """
+    months = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    if months <= DIRECT_MONTHS:
+        return fetch_monthly_analytics(start_date, end_date, api_client.data_version())
+
+    progress = st.progress(0.0, text="Computing monthly analytics...")
+    try:
+        body = api_client.run_job(
+            "analytics_monthly", start_date, end_date,
+            on_progress=lambda fraction: progress.progress(fraction, text="Computing monthly analytics..."),
+        )
+    finally:
+        progress.empty()
+    return json.loads(body)
+
+def build_monthly_dataframe(start_date: date, end_date: date):
     try:
-        resp = requests.post(f"{API_URL}/analytics/", json=payload, timeout=10)
-        resp.raise_for_status()
-        return resp.json()
+        data = call_monthly_analytics_api(start_date, end_date)
     except Exception as e:
-        st.error(f"API request failed for {payload['start_date']} -> {payload['end_date']}: {e}")
+        st.error(f"API request failed for {start_date} -> {end_date}: {e}")
         return None
 
-def build_monthly_dataframe(start_date: date, end_date: date):
-    # Collect results per month
-    month_labels = []
-    month_results = []  # list of dicts: {category: total, ...}
-
-    for y, m in months_between(start_date, end_date):
-        start, end = month_start_end(y, m)
-        label = start.strftime("%b %Y")
-        month_labels.append(label)
-
-        data = call_analytics_api(start, end)
-        if data is None:
-            # return None to indicate failure
-            return None
-
-        # convert {"Food": {"total": 100, "percentage": 50}, ...} --> {"Food": 100, ...}
-        totals = {cat: payload["total"] for cat, payload in data.items()}
-        month_results.append(totals)
-
-    # Make combined DataFrame: rows = categories, cols = months
-    # first collect all categories
-    categories = sorted({cat for d in month_results for cat in d.keys()})
-    df = pd.DataFrame(index=categories, columns=month_labels).fillna(0.0)
-
-    for label, res in zip(month_labels, month_results):
-        for cat, total in res.items():
-            df.at[cat, label] = float(total)
-
-    # Add a "Total" row/column if desired. We'll also produce monthly totals series
+    # {month: {category: {"total", "percentage"}}} -> rows = categories, cols = months, in one step
+    df = (
+        pd.DataFrame.from_dict(data, orient="columns")
+        .map(lambda cell: cell["total"] if isinstance(cell, dict) else 0.0)
+        .astype(float)
+        .sort_index()
+    )
+    df.columns = pd.to_datetime(df.columns, format="%Y-%m").strftime("%b %Y")
+
     monthly_totals = df.sum(axis=0)
     df.index.name = "Category"
     return df, monthly_totals
 
-def to_excel_bytes(df: pd.DataFrame):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name="Monthly Breakdown")
-    return output.getvalue()
+def fetch_excel_bytes(start_date: date, end_date: date, percent: bool):
+    """The breakdown as an .xlsx workbook, built by a server-side job; None if that failed."""
+    progress = st.progress(0.0, text="Preparing the Excel file...")
+    try:
+        return api_client.run_job(
+            "monthly_excel", start_date, end_date, percent=percent,
+            on_progress=lambda fraction: progress.progress(fraction, text="Preparing the Excel file..."),
+        )
+    except Exception as e:
+        st.warning(f"Could not prepare the Excel file: {e}")
+        return None
+    finally:
+        progress.empty()
 
 # --- UI ---
 def analytics_by_month_ui():
@@ -93,20 +85,22 @@ def analytics_by_month_ui():
         show_stack = st.checkbox("Show stacked bar chart by category", value=True)
         show_table = st.checkbox("Show table", value=True)
 
-    if st.button("Get monthly analytics"):
-        # normalize start/end to first/last day of month
-        s_date = date(start_month.year, start_month.month, 1)
-        last_day = calendar.monthrange(end_month.year, end_month.month)[1]
-        e_date = date(end_month.year, end_month.month, last_day)
+    # normalize start/end to first/last day of month
+    s_date = date(start_month.year, start_month.month, 1)
+    last_day = calendar.monthrange(end_month.year, end_month.month)[1]
+    e_date = date(end_month.year, end_month.month, last_day)
 
+    # the Excel button reruns the page, so the requested range outlives the click that set it
+    if st.button("Get monthly analytics"):
+        st.session_state["monthly_range"] = (s_date, e_date)
+    if st.session_state.get("monthly_range") == (s_date, e_date):
         if s_date > e_date:
             st.error("Start month must be before or equal to end month.")
         else:
-            with st.spinner("Fetching analytics for each month..."):
-                result = build_monthly_dataframe(s_date, e_date)
+            result = build_monthly_dataframe(s_date, e_date)
 
             if result is None:
-                st.error("One or more API calls failed. See messages above.")
+                st.error("The analytics API call failed. See the message above.")
             else:
                 df, monthly_totals = result
 
@@ -151,13 +145,17 @@ def analytics_by_month_ui():
                     except Exception as e:
                         st.warning(f"Could not render stacked chart with Altair: {e}")
 
-                # Download as Excel
-                excel_bytes = to_excel_bytes(display_df)
-                st.download_button(
-                    label="Download monthly breakdown as Excel",
-                    data=excel_bytes,
-                    file_name="monthly_breakdown.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                # Download as Excel: the workbook is only built when asked for
+                excel_key = (s_date, e_date, view_percent, api_client.data_version())
+                if st.button("Prepare Excel file"):
+                    st.session_state["monthly_excel"] = (excel_key, fetch_excel_bytes(s_date, e_date, view_percent))
+                prepared_key, excel_bytes = st.session_state.get("monthly_excel", (None, None))
+                if prepared_key == excel_key and excel_bytes is not None:
+                    st.download_button(
+                        label="Download monthly breakdown as Excel",
+                        data=excel_bytes,
+                        file_name="monthly_breakdown.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
 
                 st.success("Done.")
@@ -0,0 +1,178 @@
+"""
+Shared HTTP client for the Streamlit pages.
+
+One pooled requests.Session (keep-alive, retries with backoff) is reused across reruns, and
+responses are kept for CACHE_TTL seconds: expenses per date, analytics per range. Once stale, an
+entry is revalidated with its ETag (If-None-Match), so an unchanged date or range costs a 304
+instead of a full body. Saving a date drops its cached expenses and every cached range that
+covers it, and bumps data_version() so callers with their own caches (st.cache_data) can key on it.
+Every request is made as the household EXPENSE_USER_ID (the API's default tenant if unset); the
+API only accepts that from hosts in its EXPENSE_TRUSTED_PROXIES.
+
+Slow work (long monthly ranges, the Excel export) runs as a server-side job: run_job() submits it
+(through job_session, which never retries a POST, so a gateway error cannot start a job twice)
+and polls it, first after POLL_MIN seconds and then backing off to every POLL_MAX, so no single
+request comes near TIMEOUT and short jobs are not kept waiting.
+"""
+import os
+import threading
+import time
+from datetime import date
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.getenv("EXPENSE_API_URL", "http://localhost:8000").rstrip("/")
+USER_ID = os.getenv("EXPENSE_USER_ID")
+TIMEOUT = 10
+CACHE_TTL = 10.0
+POLL_MIN = 0.1
+POLL_MAX = 1.0
+
+
+def _session(retried_methods):
+    """A pooled session retrying retried_methods on gateway errors, with backoff."""
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(retried_methods),
+    )
+    new = requests.Session()
+    new.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry))
+    new.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry))
+    if USER_ID:
+        new.headers["X-User-Id"] = USER_ID
+    return new
+
+
+# the expense and analytics endpoints the frontend posts to replace or read data, so a retried
+# POST there does no harm
+session = _session({"GET", "POST"})
+# POST /jobs is not idempotent: a retry after a gateway error may start a second job, so the
+# job calls never retry a POST
+job_session = _session({"GET", "DELETE"})
+
+_cache = {}  # key -> (expires_at, value, etag); keys are ("expenses", day) or (endpoint, start, end)
+_lock = threading.Lock()
+_data_version = 0
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+def _cached(key, send):
+    """send(headers) performs the request; stale entries are revalidated with their ETag."""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    headers = {"If-None-Match": entry[2]} if entry is not None and entry[2] else {}
+    response = send(headers)
+    if response.status_code == 304:
+        value, etag = entry[1], entry[2]
+    else:
+        response.raise_for_status()
+        value, etag = response.json(), response.headers.get("ETag")
+    with _lock:
+        _cache[key] = (now + CACHE_TTL, value, etag)
+    return value
+
+
+def invalidate_date(day):
+    """Forget the cached expenses of day and every cached range that covers it."""
+    global _data_version
+    day = _iso(day)
+    with _lock:
+        _data_version += 1
+        stale = [key for key in _cache if key == ("expenses", day) or (len(key) == 3 and key[1] <= day <= key[2])]
+        for key in stale:
+            del _cache[key]
+
+
+def data_version():
+    return _data_version
+
+
+def get_expenses(day):
+    def send(headers):
+        return session.get(f"{API_URL}/expenses/{_iso(day)}", headers=headers, timeout=TIMEOUT)
+    return _cached(("expenses", _iso(day)), send)
+
+
+def save_expenses(day, expenses):
+    response = session.post(f"{API_URL}/expenses/{_iso(day)}", json=expenses, timeout=TIMEOUT)
+    response.raise_for_status()
+    invalidate_date(day)
+    return response.json()
+
+
+def save_expenses_batch(days):
+    """Replace several days in one request; days maps a date to its list of expenses."""
+    response = session.post(f"{API_URL}/expenses/batch", json={_iso(day): expenses for day, expenses in days.items()}, timeout=TIMEOUT)
+    response.raise_for_status()
+    for day in days:
+        invalidate_date(day)
+    return response.json()
+
+
+def _post_range(endpoint, start_date, end_date, timeout=TIMEOUT):
+    payload = {"start_date": _iso(start_date), "end_date": _iso(end_date)}
+
+    def send(headers):
+        return session.post(f"{API_URL}{endpoint}", json=payload, headers=headers, timeout=timeout)
+    return _cached((endpoint, payload["start_date"], payload["end_date"]), send)
+
+
+def get_analytics(start_date, end_date):
+    return _post_range("/analytics/", start_date, end_date)
+
+
+def get_monthly_analytics(start_date, end_date):
+    return _post_range("/analytics/monthly", start_date, end_date, timeout=30)
+
+
+def submit_job(kind, start_date, end_date, **params):
+    payload = {"kind": kind, "start_date": _iso(start_date), "end_date": _iso(end_date), **params}
+    response = job_session.post(f"{API_URL}/jobs", json=payload, timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_job(job_id):
+    response = job_session.get(f"{API_URL}/jobs/{job_id}", timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def cancel_job(job_id):
+    response = job_session.delete(f"{API_URL}/jobs/{job_id}", timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def run_job(kind, start_date, end_date, on_progress=None, **params):
+    """
+    Submit a job, poll it until it finishes and return the result's bytes. on_progress(fraction)
+    is called after every poll. If the caller stops polling (e.g. Streamlit reruns the page), the
+    server cancels the job by itself.
+    """
+    job = submit_job(kind, start_date, end_date, **params)
+    interval = POLL_MIN
+    while job["status"] in ("queued", "running"):
+        if on_progress is not None:
+            on_progress(job["progress"])
+        time.sleep(interval)
+        interval = min(interval * 2, POLL_MAX)
+        job = get_job(job["job_id"])
+    if job["status"] != "done":
+        raise RuntimeError(f"{kind} job {job['status']}: {job['error'] or 'no result'}")
+    if on_progress is not None:
+        on_progress(1.0)
+    response = job_session.get(f"{API_URL}{job['result_url']}", timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.content
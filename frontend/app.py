@@ -1,24 +1,15 @@
-import requests
 import streamlit as st
-from datetime import datetime
-from fastapi import Response
-from hypothesis.internal.charmap import categories
-from openpyxl.xml.constants import MIN_ROW
 from add_update_ui import add_update_tab
 from analytics_by_category import analytics_tab
 from analytics_by_months import analytics_by_month_ui
 
-# from jsonschema.benchmarks.const_vs_enum import value
-
-API_URL = "http://localhost:8000/"
-
 st.title('Expense Tracking System')
 
-tab1, tab2, tab3 = st.tabs(["Add/Update" , "Analytics by Category", "Analytics by month"])
-
-with tab1:
-    add_update_tab()
-with tab2:
-    analytics_tab()
-with tab3:
-    analytics_by_month_ui()
\ No newline at end of file
+# st.tabs runs every tab's code on each rerun; only the selected view is rendered here
+TABS = {
+    "Add/Update": add_update_tab,
+    "Analytics by Category": analytics_tab,
+    "Analytics by month": analytics_by_month_ui,
+}
+selected_tab = st.radio("View", list(TABS), horizontal=True, key="active_tab", label_visibility="collapsed")
+TABS[selected_tab]()
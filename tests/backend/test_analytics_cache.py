@@ -0,0 +1,60 @@
+from backend.analytics_cache import InProcessCache
+
+
+def test_cache_hit_and_miss():
+    cache = InProcessCache()
+    assert cache.get(("analytics", "2024-08-01", "2024-08-31")) is None
+    cache.set(("analytics", "2024-08-01", "2024-08-31"), {"Food": {"total": 1.0, "percentage": 100.0}})
+
+    assert cache.get(("analytics", "2024-08-01", "2024-08-31")) == {"Food": {"total": 1.0, "percentage": 100.0}}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = InProcessCache(max_entries=2)
+    cache.set(("analytics", "2024-01-01", "2024-01-31"), {})
+    cache.set(("analytics", "2024-02-01", "2024-02-29"), {})
+    cache.get(("analytics", "2024-01-01", "2024-01-31"))
+    cache.set(("analytics", "2024-03-01", "2024-03-31"), {})
+
+    assert cache.get(("analytics", "2024-02-01", "2024-02-29")) is None
+    assert cache.get(("analytics", "2024-01-01", "2024-01-31")) == {}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_entries_expire():
+    cache = InProcessCache(ttl=0)
+    cache.set(("analytics", "2024-01-01", "2024-01-31"), {})
+    assert cache.get(("analytics", "2024-01-01", "2024-01-31")) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_invalidate_date_only_drops_covering_ranges():
+    cache = InProcessCache()
+    cache.set(("analytics", "2024-08-01", "2024-08-31"), {})
+    cache.set(("analytics_monthly", "2024-01-01", "2024-12-31"), {})
+    cache.set(("analytics", "2024-09-01", "2024-09-30"), {})
+
+    assert cache.invalidate_date("2024-08-15") == 2
+    assert cache.get(("analytics", "2024-09-01", "2024-09-30")) == {}
+    assert cache.get(("analytics", "2024-08-01", "2024-08-31")) is None
+
+
+def test_invalidate_date_for_one_tenant():
+    cache = InProcessCache()
+    cache.set(("analytics", "2024-08-01", "2024-08-31", 1), {})
+    cache.set(("analytics", "2024-08-01", "2024-08-31", 2), {})
+
+    assert cache.invalidate_date("2024-08-15", 2) == 1
+    assert cache.get(("analytics", "2024-08-01", "2024-08-31", 1)) == {}
+    assert cache.get(("analytics", "2024-08-01", "2024-08-31", 2)) is None
+
+
+def test_stale_generation_is_not_stored():
+    cache = InProcessCache()
+    generation = cache.current_generation()
+    cache.invalidate_date("2024-08-15")
+    cache.set(("analytics", "2024-08-01", "2024-08-31"), {}, generation)
+
+    assert cache.get(("analytics", "2024-08-01", "2024-08-31")) is None
@@ -0,0 +1,32 @@
+from datetime import date
+from backend import analytics_engine
+
+
+ROWS = [
+    {"day": date(2024, 8, 5), "category": "Food", "total": 10.0},
+    {"day": date(2024, 8, 6), "category": "Rent", "total": 100.0},
+    {"day": date(2024, 8, 12), "category": "Food", "total": 30.0},
+    {"day": date(2024, 8, 25), "category": "Food", "total": 20.0},
+]
+
+
+def test_weekly_pivot_and_derived_series():
+    result = analytics_engine.run_query(ROWS, date(2024, 8, 5), date(2024, 8, 25), "week", moving_average_window=2, top_n=1)
+
+    assert result["periods"] == ["2024-08-05", "2024-08-12", "2024-08-19"]
+    assert result["categories"] == ["Rent", "Food"]
+    assert result["values"] == [[100.0, 0.0, 0.0], [10.0, 30.0, 20.0]]
+    assert result["period_totals"] == [110.0, 30.0, 20.0]
+    assert result["running_totals"] == [110.0, 140.0, 160.0]
+    assert result["moving_average"] == [110.0, 70.0, 25.0]
+    assert result["category_percentages"] == [62.5, 37.5]
+    assert result["top_categories"] == ["Rent"]
+
+
+def test_empty_range_keeps_every_period():
+    result = analytics_engine.run_query([], date(2024, 1, 1), date(2026, 12, 31), "year")
+
+    assert result["periods"] == ["2024", "2025", "2026"]
+    assert result["categories"] == []
+    assert result["period_totals"] == [0.0, 0.0, 0.0]
+    assert result["total"] == 0.0
@@ -1,3 +1,4 @@
+import pytest
 from backend import db_helper
 
 def test_fetch_expenses_for_date_aug_15():
@@ -15,4 +16,31 @@ def test_fetch_expenses_for_date_invalid_date():
 
 def test_fetch_expense_summary_invalid_range():
     summary = db_helper.fetch_expense_summary("2099-01-01", "2099-12-31")
-    assert len(summary) == 0
\ No newline at end of file
+    assert len(summary) == 0
+
+def test_replace_expenses_for_date():
+    db_helper.replace_expenses_for_date("2099-06-01", [(25.0, "Food", "Lunch"), (5.0, "Other", "Bus")])
+    expenses = db_helper.fetch_expenses_for_date("2099-06-01")
+    assert sorted(expense['category'] for expense in expenses) == ["Food", "Other"]
+
+    db_helper.replace_expenses_for_date("2099-06-01", [])
+    assert len(db_helper.fetch_expenses_for_date("2099-06-01")) == 0
+
+
+def test_replace_expenses_for_dates_rolls_back_every_day_on_error():
+    db_helper.replace_expenses_for_dates({"2099-06-10": [(1.0, "Food", "Gum")]})
+
+    with pytest.raises(Exception):
+        # category is NOT NULL, so the batched insert fails after the deletes ran
+        db_helper.replace_expenses_for_dates({"2099-06-10": [], "2099-06-11": [(2.0, None, "Broken")]})
+
+    assert [expense['notes'] for expense in db_helper.fetch_expenses_for_date("2099-06-10")] == ["Gum"]
+    assert db_helper.fetch_expenses_for_date("2099-06-11") == []
+
+
+def test_fetch_monthly_expense_summary():
+    summary = db_helper.fetch_monthly_expense_summary("2024-08-01", "2024-09-30")
+
+    assert {row['month'] for row in summary} == {"2024-08", "2024-09"}
+    rent_aug = [row for row in summary if row['month'] == "2024-08" and row['category'] == "Rent"]
+    assert rent_aug[0]['total'] == 2777
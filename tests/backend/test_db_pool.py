@@ -0,0 +1,71 @@
+import threading
+import time
+import pytest
+from backend.db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+    def is_connected(self):
+        return self.healthy
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_connections():
+    pool = ConnectionPool(FakeConnection, size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+
+
+def test_pool_is_bounded():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection():
+                pass
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_pool_replaces_unhealthy_idle_connection():
+    pool = ConnectionPool(FakeConnection, size=1, ping_after=0)
+    with pool.connection() as first:
+        pass
+    first.healthy = False
+    with pool.connection() as second:
+        pass
+
+    assert second is not first
+    assert first.closed
+    assert pool.stats()["discarded"] == 1
+
+
+def test_pool_waiters_get_released_connection():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=2)
+    seen = []
+
+    def worker():
+        with pool.connection() as connection:
+            seen.append(connection)
+
+    with pool.connection() as held:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.05)
+    thread.join()
+
+    assert seen == [held]
+    assert pool.stats()["wait_seconds_max"] > 0
@@ -0,0 +1,163 @@
+import asyncio
+import io
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from backend import jobs, server
+
+RANGE = {"start_date": "2024-08-01", "end_date": "2024-10-31"}
+
+
+def wait_for(client, job, timeout=60):
+    deadline = time.monotonic() + timeout
+    while job["status"] in jobs.ACTIVE:
+        assert time.monotonic() < deadline, job
+        time.sleep(0.05)
+        job = client.get(f"/jobs/{job['job_id']}").json()
+    return job
+
+
+def test_monthly_analytics_job_matches_the_endpoint_and_is_cached():
+    with TestClient(server.app) as client:
+        response = client.post("/jobs", json={"kind": "analytics_monthly", **RANGE})
+        assert response.status_code == 202
+        assert response.headers["Location"] == f"/jobs/{response.json()['job_id']}"
+
+        job = wait_for(client, response.json())
+        assert job["status"] == "done" and job["progress"] == 1.0 and not job["cached"]
+        result = client.get(job["result_url"])
+        assert result.headers["content-type"] == "application/json"
+        assert result.json() == client.post("/analytics/monthly", json=RANGE).json()
+
+        again = client.post("/jobs", json={"kind": "analytics_monthly", **RANGE}).json()
+        assert again["status"] == "done" and again["cached"]
+
+        # a write to the range changes its version, so the cached result is not reused
+        client.post("/expenses/2024-09-30", json=client.get("/expenses/2024-09-30").json())
+        assert client.post("/jobs", json={"kind": "analytics_monthly", **RANGE}).json()["cached"] is False
+
+
+def test_jobs_are_private_to_their_tenant():
+    with TestClient(server.app) as client:
+        job = client.post("/jobs", json={"kind": "analytics_monthly", **RANGE}).json()
+        assert client.get(f"/jobs/{job['job_id']}", headers={"X-User-Id": "2"}).status_code == 404
+        assert client.get(f"/jobs/{job['job_id']}/result", headers={"X-User-Id": "2"}).status_code == 404
+        wait_for(client, job)
+
+
+def test_monthly_excel_job():
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("openpyxl")
+    with TestClient(server.app) as client:
+        job = wait_for(client, client.post("/jobs", json={"kind": "monthly_excel", **RANGE}).json())
+        workbook = client.get(job["result_url"]).content
+
+    sheet = pd.read_excel(io.BytesIO(workbook), index_col="Category")
+    assert list(sheet.columns) == ["Aug 2024", "Sep 2024", "Oct 2024"]
+    assert sheet.loc["Rent", "Aug 2024"] == 2777.0
+
+
+def run_manager(tmp_path, scenario, **settings):
+    async def main():
+        manager = jobs.JobManager(cache_dir=str(tmp_path), **settings)
+        try:
+            return await scenario(manager)
+        finally:
+            await manager.close()
+    return asyncio.run(main())
+
+
+def test_unpolled_job_is_cancelled_and_polled_job_finishes(tmp_path):
+    async def slow(job):
+        for step in range(10):
+            job.report(step / 10)
+            await asyncio.sleep(0.05)
+        return b"{}"
+
+    async def scenario(manager):
+        abandoned = manager.submit("slow", 1, "abandoned", "json", "application/json", slow)
+        watched = manager.submit("slow", 1, "watched", "json", "application/json", slow)
+        while watched.status in jobs.ACTIVE:
+            await asyncio.sleep(0.02)
+            manager.get(watched.id, 1)
+        return abandoned, watched
+
+    abandoned, watched = run_manager(tmp_path, scenario, abandon_seconds=0.2)
+    assert abandoned.status == "cancelled"
+    assert watched.status == "done"
+    assert (tmp_path / "watched.json").read_bytes() == b"{}"
+    assert not (tmp_path / "abandoned.json").exists()
+
+
+def test_failed_job_reports_its_error_and_limit_is_enforced(tmp_path):
+    async def broken(job):
+        raise ValueError("no rows")
+
+    async def idle(job):
+        await asyncio.sleep(10)
+
+    async def scenario(manager):
+        failed = manager.submit("broken", 1, "broken", "json", "application/json", broken)
+        await asyncio.sleep(0.05)
+        manager.submit("idle", 1, "idle", "json", "application/json", idle)
+        with pytest.raises(jobs.TooManyJobsError):
+            manager.submit("idle", 1, "other", "json", "application/json", idle)
+        # the same parameters join the job under way instead of counting against the limit
+        assert manager.submit("idle", 1, "idle", "json", "application/json", idle).kind == "idle"
+        return failed, manager.stats()
+
+    failed, stats = run_manager(tmp_path, scenario, max_active=1)
+    assert failed.describe()["status"] == "failed" and failed.error == "no rows"
+    assert stats["failed"] == 1 and stats["queued"] + stats["running"] == 1
+
+
+def test_jobs_of_another_worker_are_polled_and_cancelled_through_the_cache_dir(tmp_path):
+    async def slow(job):
+        for step in range(10):
+            job.report(step / 10)
+            await asyncio.sleep(0.05)
+        return b"{}"
+
+    async def idle(job):
+        await asyncio.sleep(10)
+
+    async def scenario(owner):
+        # a second worker: its own JobManager over the same cache directory
+        other = jobs.JobManager(cache_dir=str(tmp_path), abandon_seconds=0.4)
+        watched = owner.submit("slow", 1, "watched", "json", "application/json", slow)
+        stopped = owner.submit("idle", 1, "idle", "json", "application/json", idle)
+        assert other.get(watched.id, 2) is None and other.get("../jobs", 1) is None
+
+        seen = []
+        while (polled := other.get(watched.id, 1)).status in jobs.ACTIVE:
+            seen.append(polled.progress)
+            if other.get(stopped.id, 1).status in jobs.ACTIVE:
+                assert other.cancel(other.get(stopped.id, 1)) is None
+            await asyncio.sleep(0.02)
+        return watched, stopped, polled, other.get(stopped.id, 1), seen
+
+    watched, stopped, polled, stopped_elsewhere, seen = run_manager(tmp_path, scenario, abandon_seconds=0.4)
+    # only the other worker polled, and that kept the job alive in its owner
+    assert watched.status == "done" and polled.describe() == watched.describe()
+    assert polled.path == watched.path and (tmp_path / "watched.json").read_bytes() == b"{}"
+    assert any(0 < progress < 1 for progress in seen)
+    assert stopped.status == "cancelled" and stopped_elsewhere.status == "cancelled"
+
+
+def test_job_of_a_worker_that_exited_is_reported_failed(tmp_path):
+    async def idle(job):
+        await asyncio.sleep(10)
+
+    async def scenario(owner):
+        job = owner.submit("idle", 1, "idle", "json", "application/json", idle)
+        await asyncio.sleep(0.05)
+        other = jobs.JobManager(cache_dir=str(tmp_path), abandon_seconds=0.4)
+        assert other.get(job.id, 1).status == "running"
+        # the owner is gone: nothing rewrites the state file any more
+        state = tmp_path / "jobs" / f"{job.id}.json"
+        os.utime(state, (time.time() - 1, time.time() - 1))
+        return other.get(job.id, 1)
+
+    lost = run_manager(tmp_path, scenario, abandon_seconds=0.4)
+    assert lost.status == "failed" and "exited" in lost.error
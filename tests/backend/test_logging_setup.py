@@ -0,0 +1,51 @@
+import json
+import logging
+import os
+import time
+from backend import logging_setup
+
+
+def read_lines(path, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        lines = path.read_text().splitlines() if path.exists() else []
+        if len(lines) >= count:
+            return lines
+        time.sleep(0.01)
+    return lines
+
+
+def test_json_lines_written_once_in_background(tmp_path):
+    log_file = tmp_path / "app.log"
+    logger = logging_setup.setup_logger("test_json", log_file=str(log_file))
+    logging_setup.setup_logger("test_json", log_file=str(log_file))
+
+    logger.info("replaced %s with %s rows", "2024-08-15", 3)
+
+    lines = read_lines(log_file, 1)
+    assert len(logger.handlers) == 1
+    assert len(lines) == 1
+    entry = json.loads(lines[0])
+    assert entry["message"] == "replaced 2024-08-15 with 3 rows"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "test_json"
+
+
+def test_debug_records_are_sampled():
+    sampler = logging_setup.DebugSampler(0.0)
+    debug = logging.LogRecord("x", logging.DEBUG, __file__, 1, "trace", (), None)
+    warning = logging.LogRecord("x", logging.WARNING, __file__, 1, "slow", (), None)
+
+    assert not sampler.filter(debug)
+    assert sampler.filter(warning)
+
+
+def test_log_file_per_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging_setup, "LOG_FILE", str(tmp_path / "api-{pid}.log"))
+    logger = logging_setup.setup_logger("test_per_process", log_file="ignored.log")
+
+    logger.warning("worker started")
+
+    lines = read_lines(tmp_path / f"api-{os.getpid()}.log", 1)
+    assert json.loads(lines[0])["message"] == "worker started"
+    assert not (tmp_path / "ignored.log").exists()
@@ -0,0 +1,72 @@
+import pytest
+from backend import db_helper, migrations
+
+pytestmark = pytest.mark.skipif(
+    db_helper.STORAGE_BACKEND != "mysql", reason="checks MySQL migrations and EXPLAIN output"
+)
+
+@pytest.fixture(scope="module", autouse=True)
+def migrated_schema():
+    migrations.migrate()
+
+
+def explain(sql, params):
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("EXPLAIN " + sql, params)
+        return cursor.fetchall()[0]
+
+
+# both start with (user_id, expense_date), so either serves an exact-date lookup
+DATE_INDEXES = ("idx_expenses_user_date_category_amount", "idx_expenses_user_date_id")
+
+
+def test_all_migrations_applied():
+    assert migrations.pending_migrations() == []
+
+
+def test_fetch_by_date_uses_date_index():
+    plan = explain(db_helper.FETCH_EXPENSES_FOR_DATE_SQL, (1, "2024-08-15"))
+    assert plan['key'] in DATE_INDEXES
+    assert plan['type'] == "ref"
+
+
+def test_delete_by_date_uses_date_index():
+    plan = explain(db_helper.DELETE_EXPENSES_FOR_DATE_SQL, (1, "2099-01-01"))
+    assert plan['key'] in DATE_INDEXES
+
+
+@pytest.mark.parametrize("sql, params", [
+    (db_helper.EXPENSE_SUMMARY_SQL, (1, "2024-08-01", "2024-08-05")),
+    (db_helper.MONTHLY_EXPENSE_SUMMARY_SQL, (db_helper.MONTH_FORMAT, 1, "2024-08-01", "2024-10-31")),
+    (db_helper.DAILY_CATEGORY_TOTALS_SQL, (1, "2024-08-01", "2024-10-31")),
+])
+def test_summaries_are_a_range_scan_of_the_rollup_key(sql, params):
+    # summaries read expense_rollups; (user_id, day, category) confines them to the tenant's range
+    plan = explain(sql, params)
+    assert plan['table'] == "expense_rollups"
+    assert plan['key'] == "PRIMARY"
+    assert plan['type'] == "range"
+
+
+def test_rollup_refresh_is_answered_from_covering_index():
+    # the one query still summing expenses: a write re-aggregating its day into expense_rollups
+    select = db_helper.INSERT_ROLLUPS_FOR_DATE_SQL[db_helper.INSERT_ROLLUPS_FOR_DATE_SQL.index("SELECT"):]
+    plan = explain(select, (1, "2024-08-15"))
+    assert plan['key'] == "idx_expenses_user_date_category_amount"
+    assert "Using index" in plan['Extra']
+
+
+def test_amount_is_decimal():
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = 'expenses' AND column_name = 'amount'"
+        )
+        assert cursor.fetchall()[0]['DATA_TYPE'].lower() == "decimal"
+
+
+def test_keyset_page_is_an_index_range():
+    sql, params = db_helper.list_expenses_query("mysql", after=("2024-08-15", 62), limit=51)
+    plan = explain(sql, params)
+    assert plan['key'] == "idx_expenses_user_date_id"
+    assert "filesort" not in (plan['Extra'] or "")
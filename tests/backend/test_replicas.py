@@ -0,0 +1,137 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from backend import server
+# the modules the app itself imports top-level (backend/ is on sys.path), not backend.* copies:
+# the replica pools and read_from_primary have to be the ones server reads through
+import db_helper
+import replicas
+import sqlite_backend
+
+PRIMARY = os.environ.get("EXPENSE_SQLITE_PATH")
+
+
+@pytest.fixture
+def replica_paths(tmp_path):
+    """Two SQLite stand-in replicas of the test database, checked on every read and refreshed by sync()."""
+    paths = [str(tmp_path / "replica1.sqlite3"), str(tmp_path / "replica2.sqlite3")]
+    for path in paths:
+        sqlite_backend.replicate(PRIMARY, path)
+    db_helper.configure_replicas([lambda path=path: sqlite_backend.connect(path) for path in paths])
+    replica_set, _ = db_helper.get_replicas()
+    replica_set.check_interval = 0
+    # the first read stamps the primary; replicas that copy it afterwards are current
+    db_helper.fetch_version("2024-08-01", "2024-08-31")
+    sync(paths)
+    yield paths
+    db_helper.configure_replicas([])
+
+
+def sync(paths):
+    for path in paths:
+        sqlite_backend.replicate(PRIMARY, path)
+
+
+def fetch(day, user_id=db_helper.DEFAULT_USER_ID):
+    return [row["notes"] for row in db_helper.fetch_expenses_for_date(day, user_id=user_id)]
+
+
+def test_lag_from_beats():
+    assert replicas.lag_from_beats(None, 10.0, 12.0) == float("inf")
+    assert replicas.lag_from_beats(10.0, None, 12.0) == float("inf")
+    assert replicas.lag_from_beats(10.0, 10.0, 99.0) == 0.0
+    assert replicas.lag_from_beats(10.0, 7.0, 12.0) == 5.0
+
+
+def test_replica_set_spreads_tenants_over_healthy_replicas():
+    replica_set = replicas.ReplicaSet(2, max_lag=2)
+    assert replica_set.choose(1) is None  # nothing checked yet
+    replica_set.record(0, 0.0)
+    replica_set.record(1, 0.5)
+    assert [replica_set.choose(user_id) for user_id in (1, 2, 3)] == [1, 0, 1]
+
+    replica_set.record(1, 30.0)
+    assert [replica_set.choose(user_id) for user_id in (1, 2)] == [0, 0]
+
+    token = replicas.read_from_primary.set(True)
+    try:
+        assert replica_set.choose(1) is None
+    finally:
+        replicas.read_from_primary.reset(token)
+    assert replica_set.stats() == {
+        "replicas": 2, "healthy": 1, "unreachable": 0, "max_lag_seconds": 30.0,
+        "reads_on_primary": 2, "reads_on_replicas": 5,
+    }
+
+
+@pytest.mark.skipif(PRIMARY is None or db_helper.STORAGE_BACKEND != "sqlite", reason="stand-in replicas are SQLite files")
+def test_reads_go_to_a_current_replica_and_fall_back_when_it_lags(replica_paths):
+    db_helper.replace_expenses_for_date("2099-06-01", [(12.0, "Food", "Unreplicated")])
+
+    # the replicas have the last heartbeat, so they are current and serve the (stale) read
+    assert fetch("2099-06-01") == []
+    assert db_helper.pool_stats()["replication"]["healthy"] == 2
+
+    token = replicas.read_from_primary.set(True)
+    try:
+        assert fetch("2099-06-01") == ["Unreplicated"]
+    finally:
+        replicas.read_from_primary.reset(token)
+
+    # the primary has been stamped since the copy: with no lag allowed, reads fall back to it
+    replica_set, _ = db_helper.get_replicas()
+    replica_set.max_lag = 0
+    assert fetch("2099-06-01") == ["Unreplicated"]
+    assert db_helper.pool_stats()["replication"]["healthy"] == 0
+
+    replica_set.max_lag = 2
+    sync(replica_paths)
+    assert fetch("2099-06-01") == ["Unreplicated"]
+    db_helper.replace_expenses_for_date("2099-06-01", [])
+
+
+@pytest.mark.skipif(PRIMARY is None or db_helper.STORAGE_BACKEND != "sqlite", reason="stand-in replicas are SQLite files")
+def test_unreachable_replica_is_skipped(replica_paths):
+    db_helper.configure_replicas([lambda: sqlite_backend.connect(replica_paths[0]), lambda: 1 / 0])
+    replica_set, _ = db_helper.get_replicas()
+    replica_set.check_interval = 0
+    fetch("2024-08-15")
+    sync(replica_paths)
+
+    for user_id in (1, 2):
+        fetch("2024-08-15", user_id=user_id)
+    stats = db_helper.pool_stats()["replication"]
+    assert stats["healthy"] == 1 and stats["unreachable"] == 1
+    assert stats["reads_on_replicas"] == 2
+
+
+@pytest.mark.skipif(PRIMARY is None or db_helper.STORAGE_BACKEND != "sqlite", reason="stand-in replicas are SQLite files")
+def test_writer_reads_its_writes_while_others_see_the_replica(replica_paths):
+    writer, reader = TestClient(server.app), TestClient(server.app)
+
+    response = writer.post("/expenses/2099-06-02", json=[{"amount": 5.0, "category": "Food", "notes": "Tea"}])
+    assert response.status_code == 200
+    assert server.STICKY_COOKIE in response.cookies
+
+    assert writer.get("/expenses/2099-06-02").json() == [{"amount": 5.0, "category": "Food", "notes": "Tea"}]
+    assert reader.get("/expenses/2099-06-02").json() == []
+
+    sync(replica_paths)
+    assert reader.get("/expenses/2099-06-02").json() == [{"amount": 5.0, "category": "Food", "notes": "Tea"}]
+    writer.post("/expenses/2099-06-02", json=[])
+
+
+@pytest.mark.skipif(PRIMARY is None or db_helper.STORAGE_BACKEND != "sqlite", reason="stand-in replicas are SQLite files")
+def test_analytics_cached_from_a_replica_are_not_served_to_a_pinned_writer(replica_paths):
+    writer, reader = TestClient(server.app), TestClient(server.app)
+    payload = {"start_date": "2099-07-01", "end_date": "2099-07-31"}
+
+    writer.post("/expenses/2099-07-15", json=[{"amount": 1000.0, "category": "Food", "notes": "Feast"}])
+    # the lagging replica's result is cached under the replica's version of the range
+    stale = reader.post("/analytics/", json=payload)
+    assert stale.json() == {}
+
+    fresh = writer.post("/analytics/", json=payload)
+    assert fresh.json() == {"Food": {"total": 1000.0, "percentage": 100.0}}
+    assert fresh.headers["etag"] != stale.headers["etag"]
+    writer.post("/expenses/2099-07-15", json=[])
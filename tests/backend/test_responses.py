@@ -0,0 +1,18 @@
+from datetime import date
+from decimal import Decimal
+from backend import responses
+
+
+def test_dumps_handles_database_values(monkeypatch):
+    rows = [{"amount": Decimal("12.50"), "day": date(2024, 8, 15), "notes": "Café"}]
+    fast = responses.dumps(rows)
+    monkeypatch.setattr(responses, "orjson", None)
+    fallback = responses.dumps(rows)
+
+    assert fast == fallback == '[{"amount":12.5,"day":"2024-08-15","notes":"Café"}]'.encode()
+
+
+def test_accepted_encodings_honours_q_values():
+    assert responses.accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert responses.accepted_encodings("br;q=0, GZIP;q=0.5") == {"gzip"}
+    assert responses.accepted_encodings("") == set()
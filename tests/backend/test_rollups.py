@@ -0,0 +1,29 @@
+import pytest
+from backend import db_helper, migrations, rollups
+
+
+@pytest.fixture(scope="module", autouse=True)
+def migrated_schema():
+    migrations.migrate()
+
+
+def test_rollups_match_raw_table():
+    assert rollups.find_rollup_mismatches() == []
+
+
+def test_write_paths_keep_rollups_in_sync():
+    db_helper.replace_expenses_for_date("2099-07-01", [(10.0, "Food", "Lunch"), (2.5, "Food", "Coffee")])
+    db_helper.insert_expense("2099-07-01", 4.0, "Other", "Bus")
+
+    summary = {row['category']: row['total'] for row in db_helper.fetch_expense_summary("2099-07-01", "2099-07-01")}
+    assert summary == {"Food": 12.5, "Other": 4.0}
+    assert rollups.find_rollup_mismatches() == []
+
+    db_helper.delete_expenses_for_date("2099-07-01")
+    assert db_helper.fetch_expense_summary("2099-07-01", "2099-07-01") == []
+    assert rollups.find_rollup_mismatches() == []
+
+
+def test_rebuild_rollups():
+    rollups.rebuild_rollups()
+    assert rollups.find_rollup_mismatches() == []
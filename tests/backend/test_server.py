@@ -0,0 +1,370 @@
+import asyncio
+import csv
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+from backend import server
+
+client = TestClient(server.app)
+
+
+def test_get_expenses():
+    response = client.get("/expenses/2024-08-15")
+
+    assert response.status_code == 200
+    assert response.json() == [{"amount": 10.0, "category": "Shopping", "notes": "Bought potatoes"}]
+
+
+def test_post_expenses_replaces_day_and_invalidates_analytics():
+    payload = {"start_date": "2099-04-01", "end_date": "2099-04-30"}
+    assert client.post("/analytics/", json=payload).json() == {}
+
+    response = client.post("/expenses/2099-04-02", json=[{"amount": 40.0, "category": "Food", "notes": "Pizza"}])
+    assert response.status_code == 200
+
+    assert client.get("/expenses/2099-04-02").json() == [{"amount": 40.0, "category": "Food", "notes": "Pizza"}]
+    assert client.post("/analytics/", json=payload).json() == {"Food": {"total": 40.0, "percentage": 100.0}}
+
+
+def test_analytics_monthly_includes_empty_months():
+    response = client.post("/analytics/monthly", json={"start_date": "2024-08-01", "end_date": "2024-10-31"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body) == ["2024-08", "2024-09", "2024-10"]
+    assert body["2024-10"] == {}
+    assert body["2024-08"]["Rent"]["total"] == 2777.0
+
+
+def test_import_csv_streams_rows_and_reports_errors():
+    body = (
+        "expense_date,amount,category,notes\n"
+        "2099-05-01,12.5,Food,\"Lunch, with \"\"friends\"\"\"\n"
+        "2099-05-01,not-a-number,Food,Broken\n"
+        "2099-05-02,7,Other,\"two\nlines\"\n"
+    )
+    response = client.post("/expenses/import", content=body, headers={"Content-Type": "text/csv"})
+
+    report = response.json()
+    assert report["rows_imported"] == 2
+    assert report["rows_rejected"] == 1
+    assert report["errors"][0]["line"] == 3
+    assert client.get("/expenses/2099-05-01").json() == [
+        {"amount": 12.5, "category": "Food", "notes": 'Lunch, with "friends"'}
+    ]
+    assert client.get("/expenses/2099-05-02").json()[0]["notes"] == "two\nlines"
+    summary = client.post("/analytics/", json={"start_date": "2099-05-01", "end_date": "2099-05-31"}).json()
+    assert summary["Food"]["total"] == 12.5
+
+
+def test_import_rejects_undecodable_lines_and_stray_quotes_alone():
+    body = (
+        "expense_date,amount,category,notes\n".encode()
+        + "2099-05-20,4,Food,café\n".encode("latin-1")
+        + b'2099-05-20,3,Shopping,6" ruler\n'
+        + b'2099-05-21,1,Food,"never closed\n'
+        + b"".join(f"2099-05-21,{amount},Food,Snack\n".encode() for amount in range(2, 7))
+    )
+    response = client.post("/expenses/import", content=body, headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == 200
+    report = response.json()
+    assert report["rows_imported"] == 6
+    assert [error["line"] for error in report["errors"]] == [2, 4]
+    assert "not valid utf-8" in report["errors"][0]["error"]
+    assert "unterminated quoted field" in report["errors"][1]["error"]
+    assert client.get("/expenses/2099-05-20").json() == [{"amount": 3.0, "category": "Shopping", "notes": '6" ruler'}]
+    assert len(client.get("/expenses/2099-05-21").json()) == 5
+
+
+def test_import_caps_the_lines_of_a_quoted_record():
+    from backend import expense_import
+
+    async def lines():
+        yield ["expense_date,amount,category,notes", '2099-05-22,1,Food,"open']
+        yield [f"2099-05-22,{i},Food,Row" for i in range(2, 2 + expense_import.MAX_RECORD_LINES)]
+
+    async def collect():
+        return [record async for batch in expense_import.iter_csv_records(lines()) for record in batch]
+
+    records = asyncio.run(collect())
+    assert isinstance(records[0][1], ValueError) and records[0][0] == 2
+    assert [number for number, record in records[1:]] == list(range(3, 3 + expense_import.MAX_RECORD_LINES))
+    assert all(isinstance(record, dict) for _, record in records[1:])
+
+
+def test_import_ndjson():
+    body = '{"expense_date": "2099-05-10", "amount": 3, "category": "Other", "notes": "Bus"}\n[1, 2]\n'
+    response = client.post("/expenses/import?format=ndjson", content=body)
+
+    assert response.json()["rows_imported"] == 1
+    assert response.json()["rows_rejected"] == 1
+
+
+def test_export_ndjson_and_csv():
+    ndjson = client.get("/expenses/export", params={"start": "2024-08-15", "end": "2024-08-15"})
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in ndjson.text.splitlines()] == [
+        {"id": 62, "expense_date": "2024-08-15", "amount": 10.0, "category": "Shopping", "notes": "Bought potatoes"}
+    ]
+
+    exported = client.get("/expenses/export", params={"start": "2024-08-01", "end": "2024-08-31", "format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(exported.text)))
+    assert len(rows) == 28
+    assert rows[0]["expense_date"] == "2024-08-01"
+
+
+def test_export_parquet_writes_row_groups():
+    pq = pytest.importorskip("pyarrow.parquet")
+    params = {"start": "2024-08-01", "end": "2024-09-30"}
+    response = client.get("/expenses/export", params={**params, "format": "parquet"})
+    expected = client.get("/expenses/export", params=params).text.splitlines()
+
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == len(expected)
+    assert table.column_names == ["id", "expense_date", "amount", "category", "notes"]
+
+
+def test_export_rejects_unknown_format():
+    response = client.get("/expenses/export", params={"start": "2024-08-01", "end": "2024-08-31", "format": "xml"})
+    assert response.status_code == 400
+
+
+def test_analytics_query_pivots_by_month():
+    payload = {"start_date": "2024-08-01", "end_date": "2024-10-31", "granularity": "month", "top_n": 2}
+    body = client.post("/analytics/query", json=payload).json()
+
+    assert body["periods"] == ["2024-08", "2024-09", "2024-10"]
+    monthly = client.post("/analytics/monthly", json=payload).json()
+    rent = body["values"][body["categories"].index("Rent")]
+    assert rent == [monthly[month].get("Rent", {"total": 0.0})["total"] for month in body["periods"]]
+    assert body["running_totals"][-1] == body["total"]
+    assert body["top_categories"] == body["categories"][:2]
+    assert body["category_totals"] == sorted(body["category_totals"], reverse=True)
+
+
+def test_conditional_get_for_a_date():
+    first = client.get("/expenses/2099-07-01")
+    etag = first.headers["etag"]
+    assert client.get("/expenses/2099-07-01", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/expenses/2099-07-01", json=[{"amount": 12.0, "category": "Food", "notes": "Lunch"}])
+    changed = client.get("/expenses/2099-07-01", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert "last-modified" in changed.headers
+
+
+def test_conditional_analytics_only_changes_with_its_range():
+    payload = {"start_date": "2099-08-01", "end_date": "2099-08-31"}
+    etag = client.post("/analytics/", json=payload).headers["etag"]
+    assert client.post("/analytics/", json=payload, headers={"If-None-Match": etag}).status_code == 304
+    assert client.post("/analytics/monthly", json=payload).headers["etag"] != etag
+
+    client.post("/expenses/2099-09-01", json=[{"amount": 5.0, "category": "Food", "notes": "Tea"}])
+    assert client.post("/analytics/", json=payload, headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/expenses/2099-08-15", json=[{"amount": 5.0, "category": "Food", "notes": "Tea"}])
+    assert client.post("/analytics/", json=payload, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_metrics_exposes_routes_and_queries():
+    client.get("/expenses/2024-08-15")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/expenses/{expense_date}",status="200"}' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/expenses/{expense_date}",le="+Inf"}' in text
+    assert 'db_query_rows_total{statement="select * from expenses where user_id = %s and expense_date = %s"}' in text
+    assert "db_connection_wait_seconds_count" in text
+    assert "expense_db_pool_checkouts" in text
+
+
+def test_list_expenses_walks_keyset_pages():
+    params = {"start": "2024-08-01", "end": "2024-08-31", "limit": 10}
+    seen, cursor = [], None
+    while True:
+        page = client.get("/expenses", params={**params, **({"after": cursor} if cursor else {})}).json()
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 28
+    keys = [(item["expense_date"], item["id"]) for item in seen]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_list_expenses_filters_and_searches_notes():
+    response = client.get("/expenses", params={"category": "Shopping", "q": "potato", "end": "2024-08-31"})
+    items = response.json()["items"]
+
+    assert items
+    assert all(item["category"] == "Shopping" and "potato" in item["notes"].lower() for item in items)
+    assert client.get("/expenses", params={"after": "not-a-cursor"}).status_code == 400
+
+
+def test_tenants_only_see_their_own_expenses():
+    household = {"X-User-Id": "2"}
+    payload = {"start_date": "2024-08-01", "end_date": "2024-08-31"}
+    assert client.get("/expenses/2024-08-15", headers=household).json() == []
+    assert client.post("/analytics/", json=payload, headers=household).json() == {}
+
+    client.post("/expenses/2024-08-15", json=[{"amount": 7.0, "category": "Food", "notes": "Bagel"}], headers=household)
+    assert client.get("/expenses/2024-08-15", headers=household).json() == [{"amount": 7.0, "category": "Food", "notes": "Bagel"}]
+    assert client.post("/analytics/", json=payload, headers=household).json() == {"Food": {"total": 7.0, "percentage": 100.0}}
+    assert [item["notes"] for item in client.get("/expenses", headers=household).json()["items"]] == ["Bagel"]
+
+    # the default tenant's day is untouched
+    assert client.get("/expenses/2024-08-15").json() == [{"amount": 10.0, "category": "Shopping", "notes": "Bought potatoes"}]
+    assert client.get("/expenses/2024-08-15", headers={"X-User-Id": "0"}).status_code == 422
+
+
+def test_tenant_header_is_only_trusted_from_the_proxy(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", frozenset({"10.0.0.2"}))
+    response = client.get("/expenses/2024-08-15", headers={"X-User-Id": "2"})
+    assert response.status_code == 403
+    # without the header a client is the default tenant, as before
+    assert client.get("/expenses/2024-08-15").json() == [{"amount": 10.0, "category": "Shopping", "notes": "Bought potatoes"}]
+
+
+def test_batch_replaces_several_days_in_one_request():
+    payload = {"start_date": "2099-10-01", "end_date": "2099-10-31"}
+    client.post("/expenses/2099-10-03", json=[{"amount": 99.0, "category": "Other", "notes": "Old"}])
+    assert client.post("/analytics/", json=payload).json() == {"Other": {"total": 99.0, "percentage": 100.0}}
+
+    response = client.post("/expenses/batch", json={
+        "2099-10-01": [{"amount": 10.0, "category": "Food", "notes": "Lunch"}, {"amount": 5.0, "category": "Food", "notes": "Tea"}],
+        "2099-10-02": [{"amount": 30.0, "category": "Rent", "notes": "Garage"}],
+        "2099-10-03": [],
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["rows_written"] == 3
+    assert {day: result["rows"] for day, result in body["results"].items()} == {"2099-10-01": 2, "2099-10-02": 1, "2099-10-03": 0}
+
+    day = client.get("/expenses/2099-10-01")
+    assert [expense["notes"] for expense in day.json()] == ["Lunch", "Tea"]
+    assert day.headers["etag"] == body["results"]["2099-10-01"]["etag"]
+    assert client.get("/expenses/2099-10-03").json() == []
+    assert client.post("/analytics/", json=payload).json() == {
+        "Food": {"total": 15.0, "percentage": 33.33}, "Rent": {"total": 30.0, "percentage": 66.67}
+    }
+
+
+def test_batch_is_all_or_nothing():
+    response = client.post("/expenses/batch", json={
+        "2099-10-20": [{"amount": 1.0, "category": "Food", "notes": "Gum"}],
+        "2099-10-21": [{"amount": "lots", "category": "Food", "notes": "Bad"}],
+    })
+    assert response.status_code == 422
+    assert client.get("/expenses/2099-10-20").json() == []
+    assert client.post("/expenses/batch", json={}).status_code == 400
+
+
+def test_monthly_analytics_columnar_shape_matches_nested():
+    payload = {"start_date": "2024-08-01", "end_date": "2024-10-31"}
+    nested = client.post("/analytics/monthly", json=payload).json()
+    columnar = client.post("/analytics/monthly?shape=columnar", json=payload).json()
+
+    assert columnar["months"] == list(nested)
+    for c, category in enumerate(columnar["categories"]):
+        for m, month in enumerate(columnar["months"]):
+            cell = nested[month].get(category, {"total": 0.0, "percentage": 0.0})
+            assert columnar["totals"][c][m] == pytest.approx(cell["total"])
+            assert columnar["percentages"][c][m] == pytest.approx(cell["percentage"])
+
+
+def test_fast_json_path_returns_the_same_bodies_and_validators(monkeypatch):
+    requests = [
+        ("get", "/expenses/2024-08-15", None),
+        ("get", "/expenses?start=2024-08-01&end=2024-08-31&limit=5", None),
+        ("post", "/analytics/", {"start_date": "2024-08-01", "end_date": "2024-08-31"}),
+        ("post", "/analytics/monthly", {"start_date": "2024-08-01", "end_date": "2024-10-31"}),
+        ("post", "/analytics/monthly?shape=columnar", {"start_date": "2024-08-01", "end_date": "2024-10-31"}),
+    ]
+    standard = [client.request(method, url, json=body) for method, url, body in requests]
+    monkeypatch.setattr(server, "FAST_JSON", True)
+    fast = [client.request(method, url, json=body) for method, url, body in requests]
+
+    for before, after in zip(standard, fast):
+        assert after.status_code == 200
+        assert after.json() == before.json()
+        assert after.headers.get("etag") == before.headers.get("etag")
+    etag = fast[0].headers["etag"]
+    assert client.get("/expenses/2024-08-15", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_large_responses_are_compressed():
+    url = "/expenses/export?start=2024-08-01&end=2024-09-30&format=ndjson"
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert compressed.text == plain.text
+
+    small = client.get("/expenses/2024-08-15", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_compressed_bodies_get_a_weak_etag():
+    payload = {"start_date": "2020-01-01", "end_date": "2024-12-31"}
+    plain = client.post("/analytics/monthly", json=payload, headers={"Accept-Encoding": "identity"})
+    compressed = client.post("/analytics/monthly", json=payload, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert not plain.headers["etag"].startswith("W/")
+    assert compressed.headers["etag"] == f"W/{plain.headers['etag']}"
+
+    revalidated = client.post("/analytics/monthly", json=payload, headers={"If-None-Match": compressed.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_brotli_is_preferred_when_installed():
+    brotli = pytest.importorskip("brotli")
+    url = "/expenses/export?start=2024-08-01&end=2024-09-30&format=ndjson"
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+    assert compressed.headers["content-encoding"] == "br"
+
+    # httpx decodes br itself when brotli is installed; check the raw bytes too
+    with client.stream("GET", url, headers={"Accept-Encoding": "br"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert brotli.decompress(raw).decode() == compressed.text == client.get(url, headers={"Accept-Encoding": "identity"}).text
+
+
+def test_interrupted_import_reports_what_was_committed():
+    from backend import expense_import
+
+    async def lines():
+        yield b"expense_date,amount,category,notes\n2099-05-25,1,Food,A\n2099-05-25,2,Food,B\n"
+        yield b"2099-05-25,x,Food,Bad\n2099-05-25,3,Food,C\n2099-05-25,4,Food,D\n"
+        yield b"2099-05-25,5,Food,E\n"
+
+    written = []
+
+    async def write_batch(rows):
+        if written:
+            raise ConnectionError("server has gone away")
+        written.append(rows)
+
+    with pytest.raises(expense_import.ImportInterrupted) as interrupted:
+        asyncio.run(expense_import.import_expenses(lines(), "csv", lambda record: (float(record["amount"]),), write_batch, batch_size=2))
+    report = interrupted.value.report
+    assert report["rows_imported"] == 2 and report["last_committed_line"] == 3
+    assert "server has gone away" in report["error"]
+
+
+def test_import_endpoint_returns_the_partial_report(monkeypatch):
+    async def broken(rows, user_id):
+        raise ConnectionError("server has gone away")
+    monkeypatch.setattr(server.storage, "insert_expenses", broken)
+
+    response = client.post("/expenses/import", content="expense_date,amount,category,notes\n2099-05-26,1,Food,A\n", headers={"Content-Type": "text/csv"})
+    assert response.status_code == 500
+    detail = response.json()["detail"]
+    assert detail["rows_imported"] == 0 and detail["last_committed_line"] is None
+    assert "server has gone away" in detail["error"]
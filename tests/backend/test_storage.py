@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from backend import db_helper, sqlite_backend
+from backend.storage import SQLiteStorage, get_storage
+
+pytestmark = pytest.mark.skipif(
+    db_helper.STORAGE_BACKEND != "sqlite", reason="checks the embedded SQLite storage and its seeded database"
+)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_storage_is_chosen_by_configuration():
+    assert db_helper.STORAGE_BACKEND == "sqlite"
+    assert isinstance(get_storage(), SQLiteStorage)
+
+
+def test_fetch_expenses_for_date():
+    expenses = run(SQLiteStorage().fetch_expenses_for_date("2024-08-15"))
+
+    assert len(expenses) == 1
+    assert expenses[0]['category'] == "Shopping"
+
+
+def test_replace_day_and_summaries():
+    storage = SQLiteStorage()
+    run(storage.replace_expenses_for_date("2099-03-10", [(30.0, "Food", "Dinner"), (20.0, "Rent", "Garage")]))
+
+    summary = run(storage.fetch_expense_summary("2099-03-01", "2099-03-31"))
+    assert {row['category']: row['total'] for row in summary} == {"Food": 30.0, "Rent": 20.0}
+
+    monthly = run(storage.fetch_monthly_expense_summary("2099-03-01", "2099-03-31"))
+    assert [(row['month'], row['category']) for row in monthly] == [("2099-03", "Food"), ("2099-03", "Rent")]
+
+    run(storage.replace_expenses_for_date("2099-03-10", []))
+    assert run(storage.fetch_expense_summary("2099-03-01", "2099-03-31")) == []
+
+
+def test_date_lookups_use_covering_index():
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + db_helper.FETCH_EXPENSES_FOR_DATE_SQL, (1, "2024-08-15"))
+        plan = " ".join(row['detail'] for row in cursor.fetchall())
+    # either (user_id, expense_date)-leading index serves the lookup
+    assert "USING INDEX idx_expenses_user_date_" in plan
+    assert "user_id=? AND expense_date=?" in plan
+
+
+def test_keyset_pages_use_the_date_id_index():
+    sql, params = db_helper.list_expenses_query("sqlite", after=("2024-08-15", 62), limit=51)
+    with db_helper.get_db_cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        plan = " ".join(row['detail'] for row in cursor.fetchall())
+    assert "idx_expenses_user_date_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_schema_upgrade_moves_existing_rows_to_tenant_one(tmp_path):
+    connection = sqlite_backend.connect(str(tmp_path / "legacy.sqlite3"))
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE expenses (id INTEGER PRIMARY KEY AUTOINCREMENT, expense_date DATE NOT NULL, amount REAL NOT NULL, category VARCHAR(255) NOT NULL, notes TEXT)")
+    cursor.execute("CREATE TABLE expense_rollups (day DATE NOT NULL, category VARCHAR(255) NOT NULL, total REAL NOT NULL, expense_count INTEGER NOT NULL, PRIMARY KEY (day, category))")
+    cursor.execute("CREATE TABLE expense_versions (scope VARCHAR(10) PRIMARY KEY, version INTEGER NOT NULL, modified_at REAL NOT NULL)")
+    cursor.execute("INSERT INTO expenses (expense_date, amount, category, notes) VALUES ('2024-08-15', 10, 'Food', 'Soup')")
+    cursor.execute("INSERT INTO expense_rollups VALUES ('2024-08-15', 'Food', 10, 1)")
+    cursor.execute("INSERT INTO expense_versions VALUES ('all', 3, 0), ('2024-08-15', 3, 0)")
+    connection.commit()
+
+    sqlite_backend.create_schema(connection)
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("SELECT user_id, notes FROM expenses")
+    assert cursor.fetchall() == [{"user_id": 1, "notes": "Soup"}]
+    cursor.execute("SELECT user_id, total FROM expense_rollups")
+    assert cursor.fetchall() == [{"user_id": 1, "total": 10.0}]
+    cursor.execute("SELECT user_id, scope, version FROM expense_versions ORDER BY scope")
+    assert cursor.fetchall() == [{"user_id": 1, "scope": "2024-08-15", "version": 3}, {"user_id": 1, "scope": "all", "version": 3}]
+    connection.close()
+
+
+def test_dates_written_around_db_helper_get_a_version(tmp_path):
+    connection = sqlite_backend.connect(str(tmp_path / "loaded.sqlite3"))
+    sqlite_backend.create_schema(connection)
+    cursor = connection.cursor()
+    # rows a dump or a hand-run script put there, without a version stamp
+    cursor.execute("INSERT INTO expenses (user_id, expense_date, amount, category, notes) VALUES (2, '2024-08-15', 10, 'Food', 'Soup')")
+    connection.commit()
+
+    versions = []
+    for _ in range(2):
+        sqlite_backend.create_schema(connection)
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT user_id, scope, version FROM expense_versions ORDER BY scope")
+        versions.append(cursor.fetchall())
+    # stamped once with the tenant's next version; a second start changes nothing
+    assert versions[0] == versions[1] == [{"user_id": 2, "scope": "2024-08-15", "version": 1}, {"user_id": 2, "scope": "all", "version": 1}]
+    connection.close()
@@ -1,7 +1,36 @@
 import os
 import sys
+import tempfile
+import pytest
 
 prject_root = os.path.join(os.path.dirname(__file__), '..')
 print("Project Root", prject_root)
 sys.path.insert(0, prject_root)
-print("sys.path", sys.path)
\ No newline at end of file
+# backend modules import each other as top-level modules (e.g. `import db_helper`)
+sys.path.insert(0, os.path.join(prject_root, 'backend'))
+print("sys.path", sys.path)
+
+# Run against the embedded engine unless EXPENSE_STORAGE=mysql points the suite at a live server
+os.environ.setdefault("EXPENSE_STORAGE", "sqlite")
+if os.environ["EXPENSE_STORAGE"] == "sqlite":
+    os.environ.setdefault("EXPENSE_SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "expense_manager.sqlite3"))
+
+# the TestClient's requests come from the host "testclient"; let them name a tenant
+os.environ.setdefault("EXPENSE_TRUSTED_PROXIES", "testclient")
+
+# job results are cached on disk by parameters; keep them out of the shared temp directory
+os.environ.setdefault("EXPENSE_JOB_CACHE_DIR", tempfile.mkdtemp())
+
+DUMP_PATH = os.path.join(prject_root, 'database', 'expense_db_creation.sql')
+
+
+@pytest.fixture(scope="session", autouse=True)
+def seeded_database():
+    """Load database/expense_db_creation.sql into a fresh embedded database once per test run."""
+    if os.environ["EXPENSE_STORAGE"] != "sqlite":
+        return
+    import sqlite_backend
+    connection = sqlite_backend.connect(os.environ["EXPENSE_SQLITE_PATH"])
+    sqlite_backend.create_schema(connection)
+    sqlite_backend.seed_from_mysql_dump(connection, DUMP_PATH)
+    connection.close()